@@ -0,0 +1,269 @@
+#! python 3
+# benchmark_suite.py - regression benchmarks of database build, data
+# loading and tabs building, on synthetic data at several scales.
+# Run from the repository root:
+# python -m data_scraping.scripts.benchmark_suite --save baseline.json
+# python -m data_scraping.scripts.benchmark_suite --compare baseline.json
+# Databases are written to the temp directory - set TMPDIR to a
+# memory file system (e.g. /dev/shm) to leave disk speed out.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_scraping.scripts import create_db, data_layer, synthetic_data, \
+    db_writer
+from data_scraping.scripts.standings import compute_standings
+from data_scraping.scripts.similarity import create_similarity_index
+from data_scraping.scripts.data_funcs import add_match_info, \
+    join_players_data, optimize_dtypes, get_rounds
+
+# Arguments of synthetic_data.create_dataset() per scale
+scales = {'small': {'n_seasons': 1},
+          'medium': {'n_seasons': 3},
+          'large': {'n_seasons': 10}}
+default_threshold = 1.3     # max ratio of time to baseline time
+min_delta = 0.005           # seconds, differences below are noise
+
+
+def prepare(scale, work_dir):
+    """Returns data of a scale that benchmarks run on.
+
+    :param scale: str. Key of scales.
+    :param work_dir: str. Directory for databases.
+    :return: dict with 'dataset', 'db_path', 'tables' (as read by
+    data_layer.read_tables()), 'data' (as returned by
+    data_layer.load_data()) and 'work_dir'.
+    """
+    dataset = synthetic_data.create_dataset(**scales[scale])
+    db_path = os.path.join(work_dir, f'{scale}.db')
+    synthetic_data.write_db(dataset, db_path)
+    tables = data_layer.read_tables(db_path)
+    team_stats_df, players_stats_df, players_info_df, results_df = tables
+    data = {'team_stats': add_match_info(team_stats_df, results_df,
+                                         columns=['result', 'Opponent'],
+                                         rename={'result': 'Match result'}),
+            'players_stats': players_stats_df,
+            'players_info': players_info_df,
+            'results': results_df,
+            'joined_players': join_players_data(
+                players_stats_df, players_info_df, results_df),
+            'standings': compute_standings(results_df)}
+    data = {name: optimize_dtypes(df) for name, df in data.items()}
+    data['similarity'] = create_similarity_index(data['joined_players'])
+    return {'dataset': dataset, 'db_path': db_path, 'tables': tables,
+            'data': data, 'work_dir': work_dir}
+
+
+def new_db_path(context):
+    """Returns path of a new database in the work directory."""
+    fd, path = tempfile.mkstemp(suffix='.db', dir=context['work_dir'])
+    os.close(fd)
+    os.remove(path)
+    return path
+
+
+def bench_db_build(context):
+    synthetic_data.write_db(context['dataset'], new_db_path(context))
+
+
+def bench_insert_stats(context):
+    conn = db_writer.connect_writer(new_db_path(context))
+    create_db.migrate(conn)
+    create_db.insert_data_to_stats_tables(
+        conn, context['dataset']['player_stats'], 'player')
+    create_db.insert_data_to_stats_tables(
+        conn, context['dataset']['team_stats'], 'team')
+    conn.close()
+
+
+def bench_read_tables(context):
+    data_layer.read_tables(context['db_path'])
+
+
+def bench_enrich(context):
+    team_stats_df, players_stats_df, players_info_df, results_df = \
+        context['tables']
+    add_match_info(team_stats_df, results_df, columns=['result', 'Opponent'],
+                   rename={'result': 'Match result'})
+    join_players_data(players_stats_df, players_info_df, results_df)
+
+
+def bench_standings(context):
+    compute_standings(context['tables'][3])
+
+
+def bench_similarity_index(context):
+    create_similarity_index(context['data']['joined_players'])
+
+
+def bench_optimize_dtypes(context):
+    for df in context['tables']:
+        optimize_dtypes(df)
+
+
+def bench_basic_teams_stats_tab(context):
+    from scripts.basic_team_stats import basic_teams_stats_tab
+
+    team_stats_df = context['data']['team_stats']
+    basic_teams_stats_tab(team_stats_df, get_rounds(team_stats_df))
+
+
+def bench_attacks_origin_tab(context):
+    from scripts.attacks_origin import attacks_origin_tab
+
+    team_stats_df = context['data']['team_stats']
+    attacks_origin_tab(team_stats_df, get_rounds(team_stats_df))
+
+
+def bench_players_performance_tab(context):
+    from scripts.players_performances import players_performance_tab
+
+    data = context['data']
+    players_performance_tab(data['players_info'], data['players_stats'],
+                            data['results'], data['joined_players'],
+                            get_rounds(data['team_stats']))
+
+
+def bench_league_table_tab(context):
+    from scripts.league_table import league_table_tab
+
+    league_table_tab(context['data']['standings'])
+
+
+def bench_players_similarity_tab(context):
+    from scripts.players_similarity import players_similarity_tab
+
+    players_similarity_tab(context['data']['joined_players'],
+                           context['data']['similarity'])
+
+
+# (name, function, number of runs). Tabs benchmarks need bokeh.
+benchmarks = [('db.build', bench_db_build, 1),
+              ('db.insert_stats', bench_insert_stats, 3),
+              ('data.read_tables', bench_read_tables, 5),
+              ('data.enrich', bench_enrich, 5),
+              ('data.standings', bench_standings, 5),
+              ('data.optimize_dtypes', bench_optimize_dtypes, 5),
+              ('data.similarity_index', bench_similarity_index, 5),
+              ('tab.basic_teams_stats', bench_basic_teams_stats_tab, 5),
+              ('tab.attacks_origin', bench_attacks_origin_tab, 5),
+              ('tab.players_performance', bench_players_performance_tab, 5),
+              ('tab.league_table', bench_league_table_tab, 5),
+              ('tab.players_similarity', bench_players_similarity_tab, 5)]
+
+
+def run_suite(scale_names=('small', 'medium'), names=None, repeat=None):
+    """Runs benchmarks at several scales.
+
+    :param scale_names: list of keys of scales.
+    :param names: list of str. Run only benchmarks whose names contain
+    one of them. Default: all benchmarks.
+    :param repeat: int. Number of runs of every benchmark, default:
+    as set in benchmarks.
+    :return: dict of {scale: {benchmark: {'min', 'median'}}}, times
+    in seconds.
+    """
+    results = dict()
+    for scale in scale_names:
+        work_dir = tempfile.mkdtemp(prefix='ipl_bench_')
+        try:
+            start = time.perf_counter()
+            context = prepare(scale, work_dir)
+            print(f'{scale}: {len(context["tables"][1])} player rows, '
+                  f'prepared in {time.perf_counter() - start:.1f}s')
+            results[scale] = dict()
+            for name, func, runs in benchmarks:
+                if names and not any(n in name for n in names):
+                    continue
+                times = []
+                try:
+                    for _ in range(repeat or runs):
+                        start = time.perf_counter()
+                        func(context)
+                        times.append(time.perf_counter() - start)
+                except ImportError as e:
+                    print(f'  {name}: skipped ({e})')
+                    continue
+                results[scale][name] = {'min': min(times),
+                                        'median': float(np.median(times))}
+                print(f'  {name}: {min(times) * 1e3:.1f}ms')
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+def compare(results, baseline, threshold=default_threshold):
+    """Prints results against a baseline, returns the regressions.
+
+    A benchmark regressed if its min time is more than threshold
+    times, and min_delta seconds, slower than the baseline's.
+
+    :return: list of (scale, benchmark, ratio) tuples.
+    """
+    regressions = []
+    print(f'{"scale":<8}{"benchmark":<26}{"baseline ms":>13}{"now ms":>10}'
+          f'{"ratio":>8}')
+    for scale, scale_results in results.items():
+        for name, times in scale_results.items():
+            base = baseline.get('results', {}).get(scale, {}).get(name)
+            if base is None:
+                print(f'{scale:<8}{name:<26}{"-":>13}'
+                      f'{times["min"] * 1e3:>10.1f}')
+                continue
+            ratio = times['min'] / base['min']
+            regressed = (ratio > threshold and
+                         times['min'] - base['min'] > min_delta)
+            print(f'{scale:<8}{name:<26}{base["min"] * 1e3:>13.1f}'
+                  f'{times["min"] * 1e3:>10.1f}{ratio:>8.2f}'
+                  f'{"  REGRESSION" if regressed else ""}')
+            if regressed:
+                regressions.append((scale, name, ratio))
+    return regressions
+
+
+def save(results, path):
+    """Saves results as a baseline JSON file, with the environment."""
+    baseline = {'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'python': platform.python_version(),
+                'numpy': np.__version__, 'pandas': pd.__version__,
+                'machine': platform.machine(), 'results': results}
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Run regression benchmarks on synthetic data.')
+    parser.add_argument('--scales', nargs='+', default=['small', 'medium'],
+                        choices=list(scales))
+    parser.add_argument('--filter', nargs='+',
+                        help='run benchmarks whose names contain one of '
+                             'these')
+    parser.add_argument('--repeat', type=int,
+                        help='runs per benchmark, the best one counts')
+    parser.add_argument('--save', help='save results as a baseline file')
+    parser.add_argument('--compare', help='baseline file to compare with')
+    parser.add_argument('--threshold', type=float, default=default_threshold,
+                        help='max slowdown ratio to the baseline')
+    args = parser.parse_args()
+
+    results = run_suite(args.scales, args.filter, args.repeat)
+    if args.save:
+        save(results, args.save)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regressions')
+            sys.exit(1)
@@ -0,0 +1,622 @@
+#! python 3
+# benchmarks.py - timing of data functions on synthetic data.
+# Run from the repository root:
+# python -m data_scraping.scripts.benchmarks
+
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from data_scraping.scripts import data_funcs, stats, html_cache, snapshots, \
+    synthetic_data, create_db, players_info, db_writer
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+
+def timeit(func, *args, **kwargs):
+    """Returns run time (seconds) and result of func."""
+
+    start = time.perf_counter()
+    res = func(*args, **kwargs)
+    return time.perf_counter() - start, res
+
+
+def benchmark_match_info(n_seasons=10):
+    """Compares per-row apply with add_match_info() merge."""
+
+    frames = synthetic_data.to_frames(
+        synthetic_data.create_dataset(n_seasons))
+    results_df = frames['matches_results']
+    stats_df = frames['teams_stats_by_gw'][['team', 'season', 'gameweek',
+                                            'goal']]
+
+    def per_row():
+        df = stats_df.copy()
+        df['Match result'] = df.apply(data_funcs.get_gw_match_result,
+                                      args=(results_df,), axis=1)
+        df['Opponent'] = df.apply(data_funcs.get_opponent,
+                                  args=(results_df,), axis=1)
+        return df
+
+    t_apply, _ = timeit(per_row)
+    t_merge, _ = timeit(data_funcs.add_match_info, stats_df, results_df,
+                        columns=['result', 'Opponent'],
+                        rename={'result': 'Match result'})
+    print(f'match info, {len(stats_df)} rows: apply {t_apply:.3f}s, '
+          f'merge {t_merge:.4f}s ({t_apply / t_merge:.0f}x)')
+
+
+def create_synthetic_stats_page(n_stats=45, n_items=300, item_type='player',
+                                seed=0):
+    """Returns a synthetic stats page source, structured as the site's.
+
+    :param n_stats: int. Number of stats tables.
+    :param n_items: int. Number of players/teams in each table.
+    :param item_type: str. 'player' or 'team'.
+    :param seed: int. Random seed.
+    """
+    rng = np.random.default_rng(seed)
+    tables = []
+    for i in range(n_stats):
+        items = []
+        for j in rng.permutation(n_items):
+            if item_type == 'player':
+                items.append(f'<li><a href="/en/player/{400000 + j}">'
+                             f'<img src="p.png"></a>'
+                             f'<span class="name">Player {j}</span>'
+                             f'<span class="score">{rng.integers(90)}'
+                             f'</span></li>')
+            else:
+                items.append(f'<li><img src="t.png">'
+                             f'<span class="name">Team {j}</span>'
+                             f'<span class="score">{rng.random() * 90:.2f}'
+                             f'</span></li>')
+        tables.append(f'<div class="stats-category"><div><img src="i.png">'
+                      f'<span>Stat {i}</span></div>'
+                      f'<ul>{"".join(items)}</ul></div>')
+    # rest of page - menus, scripts etc.
+    noise = ''.join(f'<div class="menu"><a href="/en/page/{i}">Page {i}'
+                    f'</a><script>var x{i} = {i};</script></div>'
+                    for i in range(2000))
+    return (f'<html><head><title>Stats</title></head><body>{noise}'
+            f'<div id="stats-page-widget-react"><div><ul class="filters">'
+            f'<li>filter</li></ul>{"".join(tables)}</div></div>'
+            f'{noise}</body></html>')
+
+
+def measure(func, *args, **kwargs):
+    """Returns run time (seconds), peak memory (bytes) and result of func.
+
+    Memory is traced with tracemalloc, so memory allocated by C
+    libraries (e.g. lxml's tree) is not counted.
+    """
+
+    tracemalloc.start()
+    run_time, res = timeit(func, *args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return run_time, peak, res
+
+
+def benchmark_stats_parsing(pages=None, item_type='player'):
+    """Compares BeautifulSoup and lxml stats page parsing.
+
+    :param pages: list of str. Pages sources. Default: a cached
+    gameweek page, or synthetic pages if cache is empty.
+    """
+    if pages is None:
+        cached = html_cache.load(f'{item_type}_stats', season='19/20',
+                                 gameweek=1, position='all')
+        if cached is not None:
+            pages = [cached]
+        else:
+            pages = [create_synthetic_stats_page(item_type=item_type)]
+
+    t_bs4, m_bs4, res_bs4 = measure(stats.parse_gameweek_pages, pages,
+                                    item_type, backend='bs4')
+    t_lxml, m_lxml, res_lxml = measure(stats.parse_gameweek_pages, pages,
+                                       item_type, backend='lxml')
+    assert res_bs4 == res_lxml
+    print(f'stats parsing, {sum(len(p) for p in pages) / 1e6:.1f}MB: '
+          f'bs4 {t_bs4:.3f}s / {m_bs4 / 1e6:.1f}MB peak, '
+          f'lxml {t_lxml:.3f}s / {m_lxml / 1e6:.1f}MB peak')
+
+
+def benchmark_callbacks_payload():
+    """Prints size of serialized document patches sent per callback.
+
+    Builds the app's tabs in a document and changes every widget
+    once, as a browser would.
+    """
+    from bokeh.core.json_encoder import serialize_json
+    from bokeh.document import Document
+    from bokeh.models.widgets import Tabs, Select, RadioButtonGroup, \
+        CheckboxButtonGroup
+    from bokeh.protocol import Protocol
+
+    from data_scraping.scripts import data_layer
+    from scripts.basic_team_stats import basic_teams_stats_tab
+    from scripts.attacks_origin import attacks_origin_tab
+    from scripts.players_performances import players_performance_tab
+
+    data = data_layer.get_data()
+    doc = Document()
+    doc.add_root(Tabs(tabs=[
+        basic_teams_stats_tab(data['team_stats']),
+        attacks_origin_tab(data['team_stats']),
+        players_performance_tab(data['players_info'], data['players_stats'],
+                                data['results'], data['joined_players'])]))
+    print(f'callbacks payload, full document: '
+          f'{len(serialize_json(doc.to_json())) / 1e3:.1f}kB')
+
+    events = []
+    doc.on_change(lambda event: events.append(event))
+    selects = {w.title: w for w in doc.select({'type': Select})}
+    changes = [(selects['Select a Stat for Comparison:'], 'value', 'passes'),
+               (list(doc.select({'type': RadioButtonGroup}))[0], 'active', 1),
+               (selects['Select a Team'], 'value', 'Maccabi Haifa'),
+               (selects['Filter by Team'], 'value', 'Maccabi Haifa'),
+               (list(doc.select({'type': CheckboxButtonGroup}))[0], 'active',
+                [1, 2]),
+               (selects['X Axis'], 'value', 'goals'),
+               (selects['Add Size Dimension'], 'value', 'goals'),
+               (selects['Add Color Segmentation'], 'value', 'result')]
+    for widget, attr, value in changes:
+        events.clear()
+        setattr(widget, attr, value)
+        # the widget change itself comes from the browser
+        patch_events = [e for e in events
+                        if getattr(e, 'model', None) is not widget]
+        msg = Protocol().create('PATCH-DOC', patch_events)
+        print(f'  {getattr(widget, "title", type(widget).__name__)}: '
+              f'{len(serialize_json(msg.content)) / 1e3:.1f}kB')
+
+
+def benchmark_players_lod(scales=(1, 10, 50)):
+    """Prints players tab build time and initial document size, with
+    players data repeated several times."""
+    from bokeh.core.json_encoder import serialize_json
+    from bokeh.document import Document
+
+    from data_scraping.scripts import data_layer
+    from scripts.players_performances import players_performance_tab
+
+    data = data_layer.get_data()
+    for scale in scales:
+        joined_df = pd.concat([data['joined_players']] * scale,
+                              ignore_index=True)
+
+        def build():
+            doc = Document()
+            doc.add_root(players_performance_tab(
+                data['players_info'], data['players_stats'],
+                data['results'], joined_df))
+            return serialize_json(doc.to_json())
+
+        seconds, doc_json = timeit(build)
+        print(f'players tab, {len(joined_df)} rows: {seconds:.2f}s, '
+              f'document {len(doc_json) / 1e3:.1f}kB')
+
+
+def benchmark_rounds_slider(n_seasons=10):
+    """Prints time of every tab's update after rounds slider moves,
+    on the app's data repeated over several seasons."""
+    from bokeh.document import Document
+
+    from data_scraping.scripts import data_layer
+    from scripts.rounds_slider import create_rounds_slider
+    from scripts.basic_team_stats import basic_teams_stats_tab
+    from scripts.attacks_origin import attacks_origin_tab
+    from scripts.players_performances import players_performance_tab
+
+    data = data_layer.get_data()
+    seasons = {name: pd.concat(
+        [df.assign(season=f'{i:02d}/{i + 1:02d}') for i in range(n_seasons)],
+        ignore_index=True) for name, df in data.items()
+        if name in ('team_stats', 'joined_players')}
+    rounds = data_funcs.get_rounds(seasons['team_stats'])
+    n = len(rounds)
+
+    for name, create_tab in [
+            ('teams stats', lambda slider: basic_teams_stats_tab(
+                seasons['team_stats'], rounds, slider)),
+            ('attacks origin', lambda slider: attacks_origin_tab(
+                seasons['team_stats'], rounds, slider)),
+            ('players', lambda slider: players_performance_tab(
+                data['players_info'], data['players_stats'],
+                data['results'], seasons['joined_players'], rounds,
+                slider))]:
+        rounds_slider = create_rounds_slider(rounds)
+        doc = Document()
+        doc.add_root(create_tab(rounds_slider))
+        times = []
+        # drags of one end, a window move, a full reset
+        for value in [(1, n - 1), (2, n - 1), (n // 2, n), (n // 2 + 5, n),
+                      (n // 4, n // 2), (n // 4 + 1, n // 2 + 1), (1, n)]:
+            old = rounds_slider.value
+            rounds_slider.value = value
+            seconds, _ = timeit(rounds_slider.trigger, 'value_throttled',
+                                old, value)
+            times.append(seconds * 1e3)
+        print(f'rounds slider, {name}, {n} rounds: '
+              f'mean {np.mean(times):.1f}ms, max {max(times):.1f}ms')
+
+
+def benchmark_attacks_origin(n_seasons=10):
+    """Prints time of attacks origin cube building, team switches and
+    a team's per round origin shares, on synthetic seasons."""
+    from bokeh.document import Document
+    from bokeh.models.widgets import Select
+
+    from scripts.attacks_origin import attacks_origin_tab, \
+        create_attacks_cube, get_origin_shares
+
+    frames = synthetic_data.to_frames(
+        synthetic_data.create_dataset(n_seasons))
+    team_stats_df = data_funcs.add_match_info(
+        frames['teams_stats_by_gw'], frames['matches_results'],
+        columns=['Opponent'])
+    rounds = data_funcs.get_rounds(team_stats_df)
+
+    t_cube, (teams, cube) = timeit(create_attacks_cube, team_stats_df,
+                                   rounds)
+    t_trend, _ = timeit(get_origin_shares, cube[:, 0])
+    doc = Document()
+    doc.add_root(attacks_origin_tab(team_stats_df, rounds).child)
+    select_team = doc.select_one({'type': Select})
+    times = []
+    for team in teams:
+        seconds, _ = timeit(setattr, select_team, 'value', team)
+        times.append(seconds * 1e3)
+    print(f'attacks origin, {len(rounds)} rounds, {len(teams)} teams: '
+          f'cube {t_cube * 1e3:.1f}ms, team switch mean '
+          f'{np.mean(times[1:]):.2f}ms, team trend {t_trend * 1e3:.2f}ms')
+
+
+def benchmark_players_similarity(n_seasons=13, n_teams=20, n_players=40,
+                                 n_queries=200, k=10):
+    """Prints time of similarity index building and top-k queries, on
+    synthetic players seasons (10k+ by default).
+
+    Queries are compared with a loop of dot products over players
+    seasons, and checked against a full sort of the similarities.
+    """
+    from data_scraping.scripts import similarity
+
+    frames = synthetic_data.to_frames(synthetic_data.create_dataset(
+        n_seasons, n_teams=n_teams, n_players=n_players))
+    joined_df = data_funcs.optimize_dtypes(data_funcs.join_players_data(
+        frames['players_stats_by_gw'], frames['players_info'],
+        frames['matches_results']))
+
+    t_index, index = timeit(similarity.create_similarity_index, joined_df)
+    players, vectors = index['players'], index['vectors']
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(players), n_queries, replace=False)
+
+    times = []
+    for row in rows:
+        pid, season = players.loc[row, ['pid', 'season']]
+        seconds, similar = timeit(similarity.find_similar, index, pid,
+                                  season, k, exclude_self=False)
+        times.append(seconds)
+        # top-k of a full sort, ties aside
+        scores = vectors @ vectors[row]
+        assert np.allclose(similar['similarity'].to_numpy(),
+                           np.sort(scores)[::-1][:k])
+    t_matvec, _ = timeit(np.dot, vectors, vectors[rows[0]])
+
+    def loop(row):
+        return [float(np.dot(vector, vectors[row])) for vector in vectors]
+
+    t_loop, _ = timeit(loop, rows[0])
+    teams = list(players['team'].unique()[:5])
+    filtered = [timeit(similarity.find_similar, index,
+                       players.loc[row, 'pid'], k=k,
+                       positions=['Midfielder', 'Forward'],
+                       teams=teams)[0] for row in rows]
+    print(f'players similarity, {len(players)} players seasons x '
+          f'{vectors.shape[1]} stats ({vectors.nbytes / 1e6:.1f}MB): '
+          f'index {t_index:.2f}s, top-{k} query mean '
+          f'{np.mean(times) * 1e3:.2f}ms (matrix-vector product '
+          f'{t_matvec * 1e3:.2f}ms, loop {t_loop * 1e3:.0f}ms), '
+          f'filtered query mean {np.mean(filtered) * 1e3:.2f}ms')
+
+
+def benchmark_session_open():
+    """Prints time to open an app session, and to show every other
+    tab for the first time."""
+    import runpy
+    from bokeh.document import Document
+    from bokeh.io.doc import set_curdoc
+    from bokeh.models.widgets import Tabs
+
+    from data_scraping.scripts import data_layer
+
+    data_layer.get_data()   # loaded once per server process
+    doc = Document()
+    set_curdoc(doc)
+    seconds, _ = timeit(runpy.run_path, os.path.join(repo_dir, 'main.py'))
+    print(f'session open: {seconds * 1e3:.1f}ms')
+
+    tabs = list(doc.select({'type': Tabs}))[0]
+    for index, panel in enumerate(tabs.tabs[1:], start=1):
+        seconds, _ = timeit(setattr, tabs, 'active', index)
+        print(f'  first show of {panel.title}: {seconds * 1e3:.1f}ms')
+
+
+def create_scaled_db(db_path, scale=10):
+    """Writes a copy of the app's database with all tables repeated.
+
+    Every copy of the stats and results tables gets a different
+    season.
+
+    :param db_path: str. Path of the new database.
+    :param scale: int. Number of copies.
+    """
+    from data_scraping.scripts import data_layer
+
+    src = sqlite3.connect(data_layer.db_file_path)
+    dst = sqlite3.connect(db_path)
+    for table_name in snapshots.snapshot_tables:
+        df = pd.read_sql_query(f"""SELECT * FROM {table_name}""", src)
+        if 'season' in df:
+            df = pd.concat([df.assign(season=f'{i:02d}/{i + 1:02d}')
+                            for i in range(scale)], ignore_index=True)
+        df.to_sql(table_name, dst, index=False, if_exists='replace')
+    src.close()
+    dst.close()
+
+
+def benchmark_snapshot_loading(scale=10):
+    """Compares app tables loading from sqlite and from Arrow snapshots.
+
+    Every loader runs in a fresh process, to measure cold start time
+    and memory of a server worker (Linux only).
+    """
+    code = """
+import sqlite3, sys, time
+import pandas as pd
+from data_scraping.scripts import snapshots
+start = time.perf_counter()
+if sys.argv[1] == 'sqlite':
+    conn = sqlite3.connect(sys.argv[2])
+    dfs = [pd.read_sql_query(f'SELECT * FROM {t}', conn)
+           for t in snapshots.snapshot_tables]
+else:
+    dfs = [snapshots.load_snapshot(t, sys.argv[2])
+           for t in snapshots.snapshot_tables]
+run_time = time.perf_counter() - start
+status = dict(line.split(':') for line in open('/proc/self/status'))
+print(run_time, status['VmRSS'].split()[0], status['RssAnon'].split()[0])
+"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'ipl_data.db')
+        create_scaled_db(db_path, scale)
+        conn = sqlite3.connect(db_path)
+        snapshots.export_snapshots(conn, tmp_dir)
+        conn.close()
+
+        for source, path in (('sqlite', db_path), ('snapshots', tmp_dir)):
+            out = subprocess.run([sys.executable, '-c', code, source, path],
+                                 capture_output=True, text=True, check=True,
+                                 cwd=repo_dir).stdout.split()
+            # anonymous (private) memory can't be shared between workers,
+            # mapped file pages can.
+            print(f'tables loading, {scale}x data, {source}: '
+                  f'{float(out[0]):.3f}s, RSS {int(out[1]) / 1e3:.0f}MB '
+                  f'(private {int(out[2]) / 1e3:.0f}MB)')
+
+
+def create_player_page(p_info):
+    """Returns html of a player page, as parsed by
+    players_info.get_player_info()."""
+
+    positions = {'Defender': 'defenseman', 'Midfielder': 'mid-fielder',
+                 'GK': 'goalie', 'Forward': 'forward'}
+    details = (f"Team: {p_info['Team']} | "
+               f"Position: {positions[p_info['Position']]} | "
+               f"Date of birth: {p_info['Date of birth']:%d.%m.%y}")
+    return (f'<html><body><div class="player-page"><div>'
+            f"<div><div><div>{p_info['Name']} | {p_info['Shirt number']}"
+            f'</div></div></div>'
+            f'<div class="col-md-8 col-xs-12 player-right-side">'
+            f'<div class="player-details col-xs-12">{details}</div></div>'
+            f'</div></div></body></html>')
+
+
+class FakePlayerDriver:
+    """Webdriver stand-in serving player pages after a delay."""
+
+    def __init__(self, pages, latency):
+        self.pages = pages
+        self.latency = latency
+        self.pid = None
+
+    def get(self, url):
+        time.sleep(self.latency)
+        self.pid = int(url.rsplit('/', 1)[1])
+
+    @property
+    def page_source(self):
+        return self.pages[self.pid]
+
+    def close(self):
+        pass
+
+
+def benchmark_players_info_sync(n_teams=16, n_new=20, latency=0.02,
+                                pool_size=4):
+    """Compares players info sync before and after batching.
+
+    All stored players info is stale (a transfer window) and n_new
+    players are missing. Before: a query per player, sequential
+    fetching and a commit per insert. After: one set-difference
+    query, a pool of drivers and a single executemany.
+    Database is written to the temp directory, see TMPDIR.
+    """
+    dataset = synthetic_data.create_dataset(n_teams=n_teams)
+    pages = {p['pid']: create_player_page(p)
+             for p in dataset['players_info']}
+    record, html_cache.record = html_cache.record, False
+
+    def before(conn):
+        c = conn.cursor()
+        pids = [tup[0] for tup in c.execute(
+            """SELECT DISTINCT pid FROM players_stats_by_gw""").fetchall()]
+        missing = [pid for pid in pids
+                   if not c.execute("""SELECT * FROM players_info 
+                                       WHERE pid = :id""",
+                                    {'id': pid}).fetchall()]
+        # without a refresh, all players are collected again
+        driver = FakePlayerDriver(pages, latency)
+        for pid in missing + [pid for pid in pids if pid not in missing]:
+            p_info = players_info.get_player_info(driver, pid)
+            with conn:
+                c.execute("""INSERT OR REPLACE INTO players_info VALUES (
+                                 ?, ?, ?, ?, ?, ?, datetime('now'))""",
+                          [p_info['pid'], p_info['Name'],
+                           p_info['Shirt number'], p_info['Team'],
+                           p_info['Position'], p_info['Date of birth']])
+
+    def after(conn):
+        create_db.create_players_info_table(
+            conn, pool_size, driver_factory=lambda: FakePlayerDriver(
+                pages, latency))
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'ipl_data.db')
+            synthetic_data.write_db(dataset, db_path)
+            for name, sync in (('before', before), ('after', after)):
+                conn = sqlite3.connect(db_path)
+                with conn:
+                    conn.execute("""UPDATE players_info 
+                                    SET fetched_at = '2000-01-01'""")
+                    conn.execute(f"""DELETE FROM players_info WHERE pid IN (
+                                         SELECT pid FROM players_info 
+                                         LIMIT {n_new})""")
+                seconds, _ = timeit(sync, conn)
+                conn.close()
+                print(f'players info sync, {len(pages)} players, '
+                      f'{latency * 1e3:.0f}ms per page, {name}: '
+                      f'{seconds:.2f}s')
+    finally:
+        html_cache.record = record
+
+
+def benchmark_ingest(n_teams=8, n_players=18, read_interval=0.01):
+    """Compares write throughput of a database build, and latency of
+    reads running during it, with a rollback journal and
+    synchronous=FULL (sqlite's defaults) and with the WAL mode writer.
+
+    A reader thread reads the results and teams stats tables (as an
+    app session does) every read_interval seconds during the build.
+    Database is written to the temp directory, see TMPDIR - use a disk,
+    the commits cost is the point.
+    """
+    dataset = synthetic_data.create_dataset(n_teams=n_teams,
+                                            n_players=n_players)
+    n_rows = len(dataset['results']) + len(dataset['players_info']) + sum(
+        len(create_db.pivot_stats_data(data_tup)[1])
+        for data_tup in dataset['player_stats'] + dataset['team_stats'])
+    configs = [('rollback journal',
+                {'journal_mode': 'DELETE', 'synchronous': 'FULL'}),
+               ('WAL', db_writer.write_pragmas)]
+
+    def read(db_path, latencies, errors, done):
+        while not done.is_set():
+            start = time.perf_counter()
+            try:
+                conn = sqlite3.connect(db_path)
+                for table_name in ['matches_results', 'teams_stats_by_gw']:
+                    pd.read_sql_query(f"""SELECT * FROM {table_name}""",
+                                      conn)
+                conn.close()
+            except (sqlite3.OperationalError, pd.errors.DatabaseError):
+                errors.append(time.perf_counter() - start)
+            else:
+                latencies.append(time.perf_counter() - start)
+            time.sleep(read_interval)
+
+    for name, pragmas in configs:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'ipl_data.db')
+            conn = db_writer.connect_writer(db_path, pragmas)
+            create_db.migrate(conn)     # tables exist for the reader
+            conn.close()
+
+            latencies, errors, done = [], [], threading.Event()
+            reader = threading.Thread(target=read, args=(
+                db_path, latencies, errors, done))
+            reader.start()
+            seconds, _ = timeit(synthetic_data.write_db, dataset,
+                                db_path, pragmas)
+            done.set()
+            reader.join()
+        print(f'ingest, {n_rows} rows, {name}: {n_rows / seconds:.0f} '
+              f'rows/s ({seconds:.2f}s); {len(latencies)} reads, '
+              f'latency p50 {np.percentile(latencies, 50) * 1e3:.1f}ms, '
+              f'p99 {np.percentile(latencies, 99) * 1e3:.1f}ms, max '
+              f'{max(latencies) * 1e3:.1f}ms, {len(errors)} failed')
+
+
+def benchmark_stats_streaming(season_counts=(1, 5, 20), n_gws=26):
+    """Compares peak memory of stats collection of 1 to 20 seasons,
+    collected into a list before writing, and streamed a gameweek at a
+    time into the database.
+
+    Gameweeks are copies of a synthetic players gameweek, created as
+    they are collected. Database is written to the temp directory, see
+    TMPDIR.
+    """
+    template = synthetic_data.create_dataset(1)['player_stats'][0][0]
+
+    def collect(n_seasons):
+        for season in synthetic_data.get_seasons(n_seasons):
+            for gw in range(1, n_gws + 1):
+                yield ({stat: dict(values)
+                        for stat, values in template.items()}, season, gw)
+
+    def before(conn, n_seasons):
+        create_db.insert_data_to_stats_tables(conn, list(collect(n_seasons)),
+                                              'player')
+
+    def after(conn, n_seasons):
+        create_db.stream_stats_to_table(conn, collect(n_seasons), 'player')
+
+    for n_seasons in season_counts:
+        line = f'stats collection, {n_seasons * n_gws} gameweeks:'
+        for name, write in (('list', before), ('stream', after)):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                conn = db_writer.connect_writer(
+                    os.path.join(tmp_dir, 'ipl_data.db'))
+                create_db.migrate(conn)
+                seconds, peak, _ = measure(write, conn, n_seasons)
+                conn.close()
+            line += f' {name} {seconds:.2f}s, peak {peak / 1e6:.1f}MB;'
+        print(line.rstrip(';'))
+
+
+if __name__ == '__main__':
+    benchmark_match_info()
+    benchmark_stats_parsing()
+    benchmark_callbacks_payload()
+    benchmark_players_lod()
+    benchmark_rounds_slider()
+    benchmark_attacks_origin()
+    benchmark_players_similarity()
+    benchmark_session_open()
+    benchmark_snapshot_loading()
+    benchmark_players_info_sync()
+    benchmark_ingest()
+    benchmark_stats_streaming()
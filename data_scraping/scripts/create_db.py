@@ -3,9 +3,70 @@
 
 import sqlite3
 from sqlite3 import Error, OperationalError
+import argparse
 import os
 
-from data_scraping.scripts import matches_results, stats, players_info
+import pandas as pd
+
+from data_scraping.scripts import matches_results, stats, scraper_pool, \
+    html_cache, snapshots, db_writer
+from data_scraping.scripts.data_funcs import add_match_info, \
+    cumulative_stats, round_key
+
+stats_tables = {'player': 'players_stats_by_gw', 'team': 'teams_stats_by_gw'}
+cumulative_tables = {'player': 'players_stats_cumulative',
+                     'team': 'teams_stats_cumulative'}
+stats_id_cols = {'player': 'pid', 'team': 'team'}
+watermark_tables = {'stats': 'teams_stats_by_gw', 'results': 'matches_results',
+                    'cumulative': 'teams_stats_cumulative'}
+# last committed gameweek of a stats collection, while it runs
+checkpoint_items = {'player': 'players_stats_checkpoint',
+                    'team': 'teams_stats_checkpoint'}
+stats_id_types = {'player': 'integer', 'team': 'text'}
+stats_col_types = {'player': 'integer DEFAULT 0', 'team': 'real DEFAULT 0'}
+players_info_ttl_days = 30   # refresh older players info, None for never
+
+create_results_query = """CREATE TABLE IF NOT EXISTS matches_results (
+                              season text,
+                              gameweek integer,
+                              date text,
+                              day text,
+                              game_time text,
+                              home_team text,
+                              away_team text,
+                              home_score integer,
+                              away_score integer,
+                              winner text,
+                              stadium text
+                              )"""
+insert_result_query = """INSERT INTO matches_results VALUES (
+                             :season,
+                             :gameweek,
+                             :date,
+                             :day,
+                             :game_time,
+                             :home_team,
+                             :away_team,
+                             :home_score,
+                             :away_score,
+                             :winner,
+                             :stadium
+                             )"""
+create_players_info_query = """CREATE TABLE IF NOT EXISTS players_info (
+                                  pid integer PRIMARY KEY,
+                                  name text,
+                                  shirt_number integer,
+                                  team text,
+                                  position text,
+                                  date_of_birth text,
+                                  fetched_at text
+                                  )"""
+# players whose info was fetched, and removed by clean_data()
+create_players_excluded_query = """CREATE TABLE IF NOT EXISTS 
+                                     players_info_excluded (
+                                         pid integer PRIMARY KEY,
+                                         fetched_at text
+                                         )"""
 
 
 def create_connection(db_file_path):
@@ -60,35 +121,43 @@ def clear_table(conn, table_name):
         c.execute(f"""DELETE FROM {table_name}""")
 
 
-def create_results_table(conn):
+def create_results_table(conn, incremental=False):
     """Create matches results table
 
     :param conn: Connection to db object.
+    :param incremental: bool. If True, keep stored results and only
+    insert rounds from the last stored one onwards.
     """
     driver = matches_results.initiate_driver()
-    c = conn.cursor
-    create_table_query = """CREATE TABLE IF NOT EXISTS matches_results (
-                                season text,
-                                gameweek integer,
-                                date text,
-                                day text,
-                                game_time text,
-                                home_team text,
-                                away_team text,
-                                home_score integer,
-                                away_score integer,
-                                winner text,
-                                stadium text
-                                )"""
-    create_table(conn, create_table_query)
-    # clear table so we can use this function
-    # as 'update' function as well - just re-collect
-    # all matches results.
-    clear_table(conn, 'matches_results')
-    # insert matches results data
+    create_table(conn, create_results_query)
     results = matches_results.get_results(driver)
-    for r in results:
-        insert_result(conn, r)
+    driver.close()
+
+    last_round = get_watermark(conn, 'results') if incremental else None
+    if last_round is not None:
+        # last stored round may have been partially played - re-collect it.
+        results = [r for r in results
+                   if round_key(r['Season'], r['Gameweek']) >=
+                   round_key(*last_round)]
+
+    # delete and insert in one transaction, so readers never see an
+    # empty or partial table.
+    with conn:
+        if last_round is None:
+            # clear table so we can use this function
+            # as 'update' function as well - just re-collect
+            # all matches results.
+            conn.execute("""DELETE FROM matches_results""")
+        else:
+            conn.execute("""DELETE FROM matches_results 
+                            WHERE season = :season AND gameweek >= :gw""",
+                         {'season': last_round[0], 'gw': last_round[1]})
+        insert_results(conn, results)
+
+    if results:
+        last = max(results,
+                   key=lambda r: round_key(r['Season'], r['Gameweek']))
+        set_watermark(conn, 'results', last['Season'], last['Gameweek'])
 
 
 def insert_result(conn, result):
@@ -97,29 +166,28 @@ def insert_result(conn, result):
     :param conn: connection object to sqlite db.
     :param result: dict. Match data.
     """
-    c = conn.cursor()
     with conn:
-        c.execute("""INSERT INTO matches_results VALUES (
-                        :season,
-                        :gameweek,
-                        :date,
-                        :day,
-                        :game_time,
-                        :home_team,
-                        :away_team,
-                        :home_score,
-                        :away_score,
-                        :winner,
-                        :stadium
-                        )""",
-                  {'season': result['Season'], 'gameweek': result['Gameweek'],
-                   'date': result['Date'], 'day': result['Day'],
-                   'game_time': result['Game time'],
-                   'home_team': result['Home team'],
-                   'away_team': result['Away team'],
-                   'home_score': result['Home team score'],
-                   'away_score': result['Away team score'],
-                   'winner': result['Winner'], 'stadium': result['Stadium']})
+        insert_results(conn, [result])
+
+
+def insert_results(conn, results):
+    """Insert matches results data to table, as part of the open
+    transaction - not committed.
+
+    :param conn: connection object to sqlite db.
+    :param results: iterable of dicts. Matches data.
+    """
+    conn.executemany(
+        insert_result_query,
+        ({'season': result['Season'], 'gameweek': result['Gameweek'],
+          'date': result['Date'], 'day': result['Day'],
+          'game_time': result['Game time'],
+          'home_team': result['Home team'],
+          'away_team': result['Away team'],
+          'home_score': result['Home team score'],
+          'away_score': result['Away team score'],
+          'winner': result['Winner'], 'stadium': result['Stadium']}
+         for result in results))
 
 
 def modify_column_name(col_name):
@@ -127,153 +195,754 @@ def modify_column_name(col_name):
     return col_name.lower().replace(' ', '_')
 
 
-def create_stats_tables(conn):
-    """Create stats tables in sqlite database."""
+def create_watermark_table(conn):
+    """Create table of the last ingested round per data item."""
+    create_table(conn, """CREATE TABLE IF NOT EXISTS ingest_watermarks (
+                              item text PRIMARY KEY,
+                              season text,
+                              gameweek integer,
+                              updated_at text
+                              )""")
+
+
+def get_watermark(conn, item):
+    """Returns last ingested (season, gameweek) of item, or None.
+
+    If no watermark was recorded yet, falls back to the last round
+    stored in the item's table.
+
+    :param conn: db connection object.
+    :param item: str. One of ['stats', 'results'].
+    """
+    create_watermark_table(conn)
+    c = conn.cursor()
+    row = c.execute("""SELECT season, gameweek FROM ingest_watermarks 
+                       WHERE item = :item""", {'item': item}).fetchone()
+    if row:
+        return tuple(row)
+
+    try:
+        rounds = c.execute(f"""SELECT DISTINCT season, gameweek 
+                               FROM {watermark_tables[item]}""").fetchall()
+    except OperationalError:
+        return None
+    return max(rounds, key=lambda r: round_key(*r)) if rounds else None
+
+
+def set_watermark(conn, item, season, gameweek):
+    """Record last ingested (season, gameweek) of item."""
+    create_watermark_table(conn)
+    with conn:
+        write_watermark(conn, item, season, gameweek)
+
+
+def write_watermark(conn, item, season, gameweek):
+    """Record last ingested (season, gameweek) of item, as part of the
+    open transaction - not committed."""
+    conn.execute("""INSERT INTO ingest_watermarks VALUES (
+                        :item, :season, :gw, datetime('now'))
+                    ON CONFLICT (item) DO UPDATE SET 
+                        season = excluded.season, 
+                        gameweek = excluded.gameweek, 
+                        updated_at = excluded.updated_at""",
+                 {'item': item, 'season': season, 'gw': int(gameweek)})
+
+
+def get_checkpoint(conn, item_type):
+    """Returns last committed (season, gameweek) of an interrupted stats
+    collection, or None if the last collection completed.
+
+    :param conn: db connection object.
+    :param item_type: str. One of ['player', 'team']
+    """
+    create_watermark_table(conn)
+    c = conn.cursor()
+    row = c.execute("""SELECT season, gameweek FROM ingest_watermarks 
+                       WHERE item = :item""",
+                    {'item': checkpoint_items[item_type]}).fetchone()
+    return tuple(row) if row else None
+
+
+def get_new_rounds(conn, last_round=None, include_last=False):
+    """Returns sorted played rounds newer than last_round.
+
+    :param conn: db connection object.
+    :param last_round: tuple (season, gameweek) or None for all rounds.
+    :param include_last: bool. Include last_round itself.
+    :return: list of (season, gameweek) tuples from matches_results.
+    """
+    c = conn.cursor()
+    rounds = c.execute("""SELECT DISTINCT season, gameweek 
+                          FROM matches_results""").fetchall()
+    if last_round is not None:
+        rounds = [r for r in rounds
+                  if round_key(*r) > round_key(*last_round) or
+                  (include_last and round_key(*r) == round_key(*last_round))]
+    return sorted(rounds, key=lambda r: round_key(*r))
+
+
+def collect_stats(item_type, rounds, pool_size=1):
+    """Collects stats of rounds, yields them a gameweek at a time.
+
+    :param item_type: str. One of ['player', 'team']
+    :param rounds: list of (season, gameweek) tuples to collect.
+    :param pool_size: int. Number of browsers scraping in parallel.
+    :returns generator of tuples in the form of
+    (data (dict), season (str), gameweek (str)), in rounds order. data
+    is None for a round that could not be collected.
+    """
+    if pool_size > 1:
+        yield from scraper_pool.iter_stats_per_game_parallel(
+            item_type, rounds, pool_size)
+        return
 
-    # create table in db
-    create_players_stats_query = """CREATE TABLE IF NOT EXISTS 
-                                        players_stats_by_gw (
-                                            pid integer,
-                                            season text,
-                                            gameweek integer
-                                            )"""
-    create_teams_stats_query = """CREATE TABLE IF NOT EXISTS 
-                                        teams_stats_by_gw (
-                                            team text,
-                                            season text,
-                                            gameweek integer
-                                            )"""
-    create_table(conn, create_players_stats_query)
-    create_table(conn, create_teams_stats_query)
-
-    # collect data.
-    driver = stats.initiate_driver()
-    # players data.
-    p_data = stats.stats_per_game_wrapper(driver, 'player')
-    # Initiate drive
-    driver.close()
     driver = stats.initiate_driver()
-    # teams data
-    t_data = stats.stats_per_game_wrapper(driver, 'team')
+    try:
+        yield from stats.iter_stats_per_game(driver, item_type, rounds)
+    finally:
+        driver.close()
+
+
+def create_stats_tables(conn, incremental=False, pool_size=1):
+    """Create stats tables in sqlite database.
+
+    Gameweeks are written as they are collected, see
+    stream_stats_to_table(). If the last run was interrupted, or
+    failed to collect some gameweeks, the next run collects again from
+    the first gameweek that was not committed.
+
+    :param conn: db connection object.
+    :param incremental: bool. If True, only collect rounds from
+    matches_results from the last stored round onwards.
+    :param pool_size: int. Number of browsers scraping in parallel.
+    :return: tuple (season, gameweek) of the first round that was not
+    committed, or None if the collection completed.
+    """
+
+    # create table in db
+    create_table(conn, create_stats_table_query('player'))
+    create_table(conn, create_stats_table_query('team'))
+
+    if incremental:
+        # last stored round may have been partially played - re-collect
+        # it, rows are upserted.
+        rounds = get_new_rounds(conn, get_watermark(conn, 'stats'),
+                                include_last=True)
+    else:
+        rounds = stats.default_rounds()
+    if not rounds:
+        return None
+
+    # players data, then teams data.
+    pending = None
+    for item_type in ['player', 'team']:
+        item_rounds = rounds
+        checkpoint = get_checkpoint(conn, item_type)
+        if checkpoint is not None:
+            # resume after the last committed gameweek
+            item_rounds = [r for r in rounds
+                           if round_key(*r) > round_key(*checkpoint)]
+            print(f'{item_type} stats: resuming after season '
+                  f'{checkpoint[0]} gameweek {checkpoint[1]}')
+        last, failed = None, []
+        if item_rounds:
+            last, failed = stream_stats_to_table(
+                conn, collect_stats(item_type, item_rounds, pool_size),
+                item_type)
+        last = last or checkpoint
+        if failed:
+            if pending is None or \
+                    round_key(*failed[0]) < round_key(*pending):
+                pending = failed[0]
+            print(f'{item_type} stats: failed to collect {failed}, they '
+                  f'are collected again on the next run')
+    if pending is not None:
+        # keep the checkpoints, and the watermark before the failed rounds
+        return pending
+
+    # collection completed - drop the checkpoints
+    with conn:
+        if last is not None:
+            write_watermark(conn, 'stats', last[0], last[1])
+        conn.executemany("""DELETE FROM ingest_watermarks 
+                            WHERE item = ?""",
+                         [(item,) for item in checkpoint_items.values()])
+    return None
+
 
-    # Populate tables with data.
-    insert_data_to_stats_tables(conn, p_data, 'player')
-    insert_data_to_stats_tables(conn, t_data, 'team')
+def create_stats_table_query(item_type, stat_cols=()):
+    """Returns query creating a stats table keyed by (id, season, gw).
+
+    :param item_type: str. One of ['player', 'team']
+    :param stat_cols: list of str. Stats columns to create.
+    """
+    id_col = stats_id_cols[item_type]
+    cols = ''.join(f""",
+                   {col} {stats_col_types[item_type]}""" for col in stat_cols)
+    return f"""CREATE TABLE IF NOT EXISTS {stats_tables[item_type]} (
+                   {id_col} {stats_id_types[item_type]},
+                   season text,
+                   gameweek integer{cols},
+                   PRIMARY KEY ({id_col}, season, gameweek)
+                   )"""
+
+
+def migrate_keys_and_indexes(conn):
+    """Schema version 1.
+
+    Rebuild stats tables with a (id, season, gameweek) primary key and
+    typed stats columns, add indexes by round and team, and a
+    stat_definitions table of stats columns labels.
+    """
+    c = conn.cursor()
+    for item_type, table_name in stats_tables.items():
+        id_col = stats_id_cols[item_type]
+        cols = get_table_columns(conn, table_name)
+        stat_cols = [col for col in cols
+                     if col not in [id_col, 'season', 'gameweek']]
+        if cols:
+            c.execute(f"""DROP INDEX IF EXISTS {table_name}_key""")
+            c.execute(f"""ALTER TABLE {table_name} 
+                          RENAME TO {table_name}_old""")
+        c.execute(create_stats_table_query(item_type, stat_cols))
+        if cols:
+            cols_str = ', '.join([id_col, 'season', 'gameweek'] + stat_cols)
+            c.execute(f"""INSERT OR REPLACE INTO {table_name} ({cols_str}) 
+                          SELECT {cols_str} FROM {table_name}_old""")
+            c.execute(f"""DROP TABLE {table_name}_old""")
+        c.execute(f"""CREATE INDEX IF NOT EXISTS {table_name}_round 
+                      ON {table_name} (season, gameweek)""")
+
+    c.execute(create_results_query)
+    c.execute("""CREATE INDEX IF NOT EXISTS matches_results_round 
+                 ON matches_results (season, gameweek)""")
+    c.execute("""CREATE INDEX IF NOT EXISTS matches_results_home 
+                 ON matches_results (home_team, season, gameweek)""")
+    c.execute("""CREATE INDEX IF NOT EXISTS matches_results_away 
+                 ON matches_results (away_team, season, gameweek)""")
+    c.execute(create_players_info_query)
+    c.execute("""CREATE INDEX IF NOT EXISTS players_info_team 
+                 ON players_info (team)""")
+
+    c.execute("""CREATE TABLE IF NOT EXISTS stat_definitions (
+                     table_name text,
+                     column_name text,
+                     label text,
+                     col_type text,
+                     PRIMARY KEY (table_name, column_name)
+                     )""")
+    for item_type, table_name in stats_tables.items():
+        id_col = stats_id_cols[item_type]
+        c.executemany("""INSERT OR IGNORE INTO stat_definitions VALUES (
+                             ?, ?, NULL, ?)""",
+                      [(table_name, col, stats_col_types[item_type].split()[0])
+                       for col in get_table_columns(conn, table_name)
+                       if col not in [id_col, 'season', 'gameweek']])
+
+
+def migrate_players_info_fetched_at(conn):
+    """Schema version 2.
+
+    Add a fetched_at column (UTC time) to players info, for refreshing
+    stale info. Rows stored before it have none, and are refreshed on
+    the next run.
+    """
+    c = conn.cursor()
+    if 'fetched_at' not in get_table_columns(conn, 'players_info'):
+        c.execute("""ALTER TABLE players_info ADD COLUMN fetched_at text""")
+
+
+def migrate_players_info_excluded(conn):
+    """Schema version 3.
+
+    Add a table of players whose info was removed by clean_data(), so
+    it isn't fetched again before it is stale.
+    """
+    conn.execute(create_players_excluded_query)
+
+
+# schema migrations, by version. Version of a database is kept in
+# PRAGMA user_version.
+migrations = [migrate_keys_and_indexes, migrate_players_info_fetched_at,
+              migrate_players_info_excluded]
+
+
+def migrate(conn):
+    """Bring database schema up to the latest version.
+
+    Each migration runs in its own transaction, with the version
+    update.
+    """
+    c = conn.cursor()
+    version = c.execute("""PRAGMA user_version""").fetchone()[0]
+    for new_version, migration in enumerate(migrations[version:],
+                                            start=version + 1):
+        with conn:
+            c.execute("""BEGIN""")
+            migration(conn)
+            c.execute(f"""PRAGMA user_version = {new_version}""")
+
+
+def get_table_columns(conn, table_name):
+    """Returns a list of the columns names of a table."""
+    c = conn.cursor()
+    return [r[1] for r in c.execute(f"""PRAGMA table_info({table_name})""")]
+
+
+def settle_stats_schema(conn, data, item_type):
+    """Add all stats columns needed for data, and record their labels.
+
+    Columns are added once per missing attribute, instead of once
+    per attribute of every gameweek.
+
+    :param conn: db connection object.
+    :param data: list of tuples in the form of
+    (data (dict), season (str), gameweek (str))
+    :param item_type: str. One of ['player', 'team']
+    """
+    migrate(conn)
+    table_name = stats_tables[item_type]
+    cur_cols = set(get_table_columns(conn, table_name))
+    labels = dict()
+    for data_tup in data:
+        for att in data_tup[0]:
+            labels[modify_column_name(att)] = att
+    for col in labels:
+        if col not in cur_cols:
+            add_col_to_table(conn, table_name, col,
+                             stats_col_types[item_type])
+
+    c = conn.cursor()
+    with conn:
+        c.executemany("""INSERT INTO stat_definitions VALUES (
+                             :table, :col, :label, :type)
+                         ON CONFLICT (table_name, column_name) 
+                         DO UPDATE SET label = excluded.label""",
+                      [{'table': table_name, 'col': col, 'label': label,
+                        'type': stats_col_types[item_type].split()[0]}
+                       for col, label in labels.items()])
+
+
+def pivot_stats_data(data_tup):
+    """Pivots a gameweek stats tuple into complete rows.
+
+    :param data_tup: tuple. (data (dict), season (str), gameweek (str)),
+    data is of the form {stat: {item_id: score}}.
+    :return: tuple of (list of column names, list of rows). Each row
+    is a tuple (item_id, season, gameweek, *stats values), stats
+    missing for an item are 0.
+    """
+    stats_data, season, gw = data_tup
+    atts = list(stats_data.keys())
+    cols = [modify_column_name(att) for att in atts]
+    item_ids = dict()   # ordered set
+    for values in stats_data.values():
+        item_ids.update(dict.fromkeys(values))
+
+    rows = [(item_id, season, gw) +
+            tuple(stats_data[att].get(item_id, 0) for att in atts)
+            for item_id in item_ids]
+    return cols, rows
 
 
 def insert_data_to_stats_tables(conn, data, item_type):
     """Insert stats to tables in database.
 
+    All rows are upserted on (id, season, gameweek) with executemany
+    inside a single transaction.
+
     :param conn: db connection object.
     :param data: list of tuples in the form of
     (data (dict), season (str), gameweek (str))
     :param item_type: str. One of ['player', 'team']
     """
-    c = conn.cursor()
-    table_name = {'player': 'players_stats_by_gw',
-                  'team': 'teams_stats_by_gw'}
-    id_col = {'player': 'pid', 'team': 'team'}
+    settle_stats_schema(conn, data, item_type)
+
+    with conn:
+        for data_tup in data:
+            cols, rows = pivot_stats_data(data_tup)
+            if rows:
+                conn.executemany(upsert_stats_query(item_type, cols), rows)
+
+
+def stream_stats_to_table(conn, data, item_type):
+    """Insert stats to tables in database as they are collected.
+
+    Every gameweek is committed in its own transaction, with a
+    checkpoint of it (see get_checkpoint()), so memory use doesn't
+    grow with the number of gameweeks, and an interrupted collection
+    loses at most the gameweek it was collecting. After a failed
+    gameweek, the following ones are still inserted but the checkpoint
+    stays before the failed one, so it is collected again.
+
+    :param conn: db connection object.
+    :param data: iterable of tuples in the form of
+    (data (dict), season (str), gameweek (str)), in rounds order, e.g.
+    as yielded by collect_stats(). data is None for a failed round.
+    :param item_type: str. One of ['player', 'team']
+    :return: tuple (last, failed). last is the (season, gameweek)
+    checkpoint - the last round before the first failed one, or None.
+    failed is a list of (season, gameweek) of the failed rounds.
+    """
+    create_watermark_table(conn)
+    last, failed = None, []
     for data_tup in data:
-        for att, values in data_tup[0].items():
-            att = modify_column_name(att)
-            add_col_to_table(conn, table_name[item_type], att,
-                             'real DEFAULT 0')
+        stats_data, season, gw = data_tup
+        if stats_data is None:
+            failed.append((season, gw))
+            continue
+        settle_stats_schema(conn, [data_tup], item_type)
+        cols, rows = pivot_stats_data(data_tup)
+        with conn:
+            if rows:
+                conn.executemany(upsert_stats_query(item_type, cols), rows)
+            if not failed:
+                write_watermark(conn, checkpoint_items[item_type], season,
+                                gw)
+        if not failed:
+            last = (season, gw)
+    return last, failed
+
+
+def upsert_stats_query(item_type, cols):
+    """Returns query upserting a stats row on (id, season, gameweek).
+
+    :param item_type: str. One of ['player', 'team']
+    :param cols: list of str. Stats columns of the row, after the id,
+    season and gameweek.
+    """
+    table_name = stats_tables[item_type]
+    id_col = stats_id_cols[item_type]
+    cols_str = ', '.join(cols)
+    placeholders = ', '.join(['?'] * (len(cols) + 3))
+    updates = ', '.join(f'{col} = excluded.{col}' for col in cols)
+    return f"""INSERT INTO {table_name} (
+                   {id_col}, season, gameweek, {cols_str})
+               VALUES ({placeholders})
+               ON CONFLICT ({id_col}, season, gameweek) 
+               DO UPDATE SET {updates}"""
+
+
+def get_players_to_fetch(conn, ttl_days=players_info_ttl_days):
+    """Returns ids of players whose info should be fetched.
+
+    :param conn: db connection object.
+    :param ttl_days: int. Stored info older than this is stale. None
+    for never.
+    :return: tuple of lists (missing pids, stale pids). Missing are
+    players with stats but without info, and not excluded from it (see
+    clean_data()).
+    """
+    c = conn.cursor()
+    missing = [tup[0] for tup in c.execute(
+        """SELECT pid FROM players_stats_by_gw 
+           EXCEPT SELECT pid FROM players_info 
+           EXCEPT SELECT pid FROM players_info_excluded""").fetchall()]
+    if ttl_days is None:
+        return missing, []
+    stale = [tup[0] for tup in c.execute(
+        """SELECT pid FROM (
+               SELECT pid, fetched_at FROM players_info 
+               UNION ALL SELECT pid, fetched_at FROM players_info_excluded
+               )
+           WHERE fetched_at IS NULL OR fetched_at < datetime('now', :age)""",
+        {'age': f'-{ttl_days} days'}).fetchall()]
+    return missing, stale
+
+
+def create_players_info_table(conn, pool_size=4,
+                              ttl_days=players_info_ttl_days,
+                              driver_factory=stats.initiate_driver):
+    """Create players info table in db, insert missing players and
+    refresh stale ones.
+
+    Refreshed info (e.g. of a player who moved to another team)
+    replaces the stored one. Stored info of players that could not be
+    fetched is kept.
+
+    :param conn: db connection object.
+    :param pool_size: int. Number of browsers scraping in parallel.
+    :param ttl_days: int. Refresh info fetched more than ttl_days ago.
+    None for never. Not refreshed in replay mode.
+    :param driver_factory: function that returns a new webdriver.
+    """
+    create_table(conn, create_players_info_query)
+    if html_cache.replay:
+        ttl_days = None
+    missing, stale = get_players_to_fetch(conn, ttl_days)
+    pids = missing + stale
+    if not pids:
+        return
+
+    p_infos = scraper_pool.players_info_parallel(
+        pids, pool_size, driver_factory=driver_factory)
+    insert_players_info(conn, p_infos)
+    print(f'players info: {len(missing)} new, {len(stale)} refreshed, '
+          f'{len(pids) - len(p_infos)} failed')
+
+
+def insert_players_info(conn, p_infos):
+    """Insert or update players info in table, in batch transactions.
+
+    :param conn: db connection object.
+    :param p_infos: list of dicts, as returned by
+    players_info.get_player_info(). None items are skipped.
+    """
+    rows = ({'pid': p_info['pid'], 'name': p_info['Name'],
+             'shirt': p_info['Shirt number'], 'team': p_info['Team'],
+             'pos': p_info['Position'], 'dob': p_info['Date of birth']}
+            for p_info in p_infos if p_info)
+    with db_writer.BatchWriter(conn) as writer:
+        writer.executemany("""INSERT INTO players_info VALUES (
+                                  :pid, :name, :shirt, :team, :pos, :dob, 
+                                  datetime('now')
+                                  )
+                              ON CONFLICT (pid) DO UPDATE SET 
+                                  name = excluded.name, 
+                                  shirt_number = excluded.shirt_number, 
+                                  team = excluded.team, 
+                                  position = excluded.position, 
+                                  date_of_birth = excluded.date_of_birth, 
+                                  fetched_at = excluded.fetched_at""",
+                           rows)
+
+
+def create_cumulative_table_query(item_type, stat_cols=()):
+    """Returns query creating a running sums table of stats.
+
+    Keyed by (id, season, result, gameweek), see
+    data_funcs.cumulative_stats().
+
+    :param item_type: str. One of ['player', 'team']
+    :param stat_cols: list of str. Stats columns to create.
+    """
+    id_col = stats_id_cols[item_type]
+    cols = ''.join(f""",
+                   {col} real DEFAULT 0""" for col in stat_cols)
+    return f"""CREATE TABLE IF NOT EXISTS {cumulative_tables[item_type]} (
+                   {id_col} {stats_id_types[item_type]},
+                   season text,
+                   gameweek integer,
+                   result text,
+                   games integer DEFAULT 0{cols},
+                   PRIMARY KEY ({id_col}, season, result, gameweek)
+                   )"""
+
+
+def read_stats_with_results(conn, item_type, season, first_gw, results_df):
+    """Returns stats rows of a season from a gameweek on, with the
+    'result' (w/d/l) of each row's match.
+
+    Players' teams are taken from players_info, as in the app.
+    """
+    if item_type == 'player':
+        query = """SELECT s.*, i.team FROM players_stats_by_gw s
+                   JOIN players_info i ON i.pid = s.pid
+                   WHERE s.season = :season AND s.gameweek >= :gw"""
+    else:
+        query = """SELECT * FROM teams_stats_by_gw 
+                   WHERE season = :season AND gameweek >= :gw"""
+    stats_df = pd.read_sql_query(query, conn,
+                                 params={'season': season, 'gw': first_gw})
+    return add_match_info(stats_df, results_df, columns=['result'])
+
+
+def create_cumulative_tables(conn, incremental=False, pending=None):
+    """Create and update tables of stats running sums per gameweek.
+
+    The tables hold running sums and matches counts per team / player,
+    season and match result, so totals and averages of any gameweeks
+    window are the difference of two rows (see get_window_stats()).
+    Rounds from the last summed one onwards (its stats may have been
+    collected again) are added on top of the stored sums of the
+    gameweek before them.
+
+    Rounds from a round that failed to be collected onwards are not
+    summed, so the next run sums them once it is collected again.
+
+    :param conn: db connection object.
+    :param incremental: bool. If False, rebuild tables from all rounds.
+    :param pending: tuple (season, gameweek) of the first round that
+    was not committed, as returned by create_stats_tables(), or None.
+    """
+    last_round = get_watermark(conn, 'cumulative') if incremental else None
+    if last_round is None:
+        for table_name in cumulative_tables.values():
             with conn:
-                for item_id, stat in values.items():
-                    # check if pid/team already in table.
-                    # If so, update its value in new col
-                    # els, insert a new row
-                    pid_row = c.execute(
-                        f"""SELECT * FROM {table_name[item_type]} 
-                              WHERE {id_col[item_type]} = :id 
-                              AND season = :season 
-                              AND gameweek = :gw""",
-                        {'id': item_id, 'season': data_tup[1],
-                         'gw': data_tup[2]}
-                    ).fetchone()
-                    if pid_row:
-                        c.execute(
-                            f"""UPDATE {table_name[item_type]} 
-                                SET {att} = :value 
-                                WHERE {id_col[item_type]} = :id 
-                                AND season = :season 
-                                AND gameweek = :gw""",
-                            {'value': stat, 'id': item_id,
-                             'season': data_tup[1], 'gw': data_tup[2]})
-                    else:
-                        c.execute(
-                            f"""INSERT INTO {table_name[item_type]} (
-                                    {id_col[item_type]}, 
-                                    season, 
-                                    gameweek,
-                                    {att}) 
-                                VALUES (:id, :season, :gw, :value)""",
-                            {'id': item_id, 'season': data_tup[1],
-                             'gw': data_tup[2], 'value': stat})
-
-
-def create_players_info_table(conn):
-    """Create players info table in db and insert data."""
+                conn.execute(f"""DROP TABLE IF EXISTS {table_name}""")
+
+    # first gameweek to sum, per season
+    first_gws = dict()
+    for season, gw in get_new_rounds(conn, last_round, include_last=True):
+        if pending is not None and \
+                round_key(season, gw) >= round_key(*pending):
+            break
+        first_gws.setdefault(season, gw)
+    if not first_gws:
+        return
+
+    results_df = pd.read_sql_query("""SELECT * FROM matches_results""", conn)
+    last_summed = None
     c = conn.cursor()
-    driver = stats.initiate_driver()
-    create_table_query = """CREATE TABLE IF NOT EXISTS players_info (
-                                pid integer PRIMARY KEY,
-                                name text,
-                                shirt_number integer,
-                                team text,
-                                position text,
-                                date_of_birth text
-                                )"""
-    insert_player_query = """INSERT INTO players_info VALUES (
-                                :pid, :name, :shirt, :team, :pos, :dob
-                                )"""
-    create_table(conn, create_table_query)
-
-    get_pids_query = """SELECT DISTINCT pid FROM players_stats_by_gw"""
-    pids = [tup[0] for tup in c.execute(get_pids_query).fetchall()]
-    for pid in pids:
-        # check if player exists in table
-        if not c.execute("""SELECT * FROM players_info WHERE pid = :id""",
-                         {'id': pid}).fetchall():
-            # get player info
-            p_info = players_info.get_player_info(driver, pid)
-            if p_info:
-                with conn:
-                    c.execute(insert_player_query,
-                              {'pid': p_info['pid'],
-                               'name': p_info['Name'],
-                               'shirt': p_info['Shirt number'],
-                               'team': p_info['Team'],
-                               'pos': p_info['Position'],
-                               'dob': p_info['Date of birth']})
+    for item_type, table_name in cumulative_tables.items():
+        id_col = stats_id_cols[item_type]
+        stat_cols = [col for col in get_table_columns(conn,
+                                                      stats_tables[item_type])
+                     if col not in [id_col, 'season', 'gameweek']]
+        create_table(conn, create_cumulative_table_query(item_type, stat_cols))
+        create_table(conn, f"""CREATE INDEX IF NOT EXISTS {table_name}_round 
+                                ON {table_name} (season, gameweek)""")
+        cur_cols = get_table_columns(conn, table_name)
+        for col in stat_cols:
+            if col not in cur_cols:
+                add_col_to_table(conn, table_name, col, 'real DEFAULT 0')
+
+        for season, first_gw in first_gws.items():
+            stats_df = read_stats_with_results(conn, item_type, season,
+                                               first_gw, results_df)
+            if pending is not None and season == pending[0]:
+                stats_df = stats_df[stats_df['gameweek'] < int(pending[1])]
+            if stats_df.empty:
+                continue
+            base_df = pd.read_sql_query(
+                f"""SELECT * FROM {table_name} 
+                    WHERE season = :season AND gameweek = :gw""",
+                conn, params={'season': season, 'gw': first_gw - 1})
+            cum_df = cumulative_stats(stats_df, id_col, base_df)
+
+            cols_str = ', '.join(cum_df.columns)
+            placeholders = ', '.join(['?'] * len(cum_df.columns))
+            with conn:
+                c.execute(f"""DELETE FROM {table_name} 
+                              WHERE season = :season AND gameweek >= :gw""",
+                          {'season': season, 'gw': first_gw})
+                c.executemany(f"""INSERT INTO {table_name} ({cols_str}) 
+                                  VALUES ({placeholders})""",
+                              cum_df.itertuples(index=False, name=None))
+
+            if item_type == 'team':
+                summed = (season, int(stats_df['gameweek'].max()))
+                if last_summed is None or \
+                        round_key(*summed) > round_key(*last_summed):
+                    last_summed = summed
+
+    if last_summed is not None:
+        set_watermark(conn, 'cumulative', *last_summed)
+
+
+def get_window_stats(conn, item_type, season, first_gw, last_gw,
+                     by_result=False):
+    """Returns stats totals of a gameweeks window from running sums.
+
+    :param conn: db connection object.
+    :param item_type: str. One of ['player', 'team']
+    :param season: str.
+    :param first_gw: int. First gameweek of the window.
+    :param last_gw: int. Last gameweek of the window, not later than
+    the last summed one.
+    :param by_result: bool. If True, totals are per match result too.
+    :return: pd.DataFrame of 'games' and stats totals, indexed by id
+    (and result).
+    """
+    id_col = stats_id_cols[item_type]
+    table_name = cumulative_tables[item_type]
+    cols = [col for col in get_table_columns(conn, table_name)
+            if col not in [id_col, 'season', 'gameweek', 'result']]
+    diffs = ', '.join(f'e.{col} - COALESCE(s.{col}, 0) AS {col}'
+                      for col in cols)
+    df = pd.read_sql_query(
+        f"""SELECT e.{id_col}, e.result, {diffs} 
+            FROM {table_name} e LEFT JOIN {table_name} s 
+            ON s.{id_col} = e.{id_col} AND s.season = e.season 
+            AND s.result = e.result AND s.gameweek = :first_gw - 1
+            WHERE e.season = :season AND e.gameweek = :last_gw""",
+        conn, params={'season': season, 'first_gw': first_gw,
+                      'last_gw': last_gw})
+    if by_result:
+        return df.set_index([id_col, 'result'])
+    return df.drop(columns='result').groupby(id_col).sum()
 
 
 def clean_data(conn):
     """ Delete some rows from tables."""
     c = conn.cursor()
     with conn:
-        # delete rows of players from teams not in the league
+        # delete rows of players from teams not in the league, and keep
+        # their ids, so their info isn't fetched again until it is stale
+        c.execute("""DELETE FROM players_info_excluded 
+                     WHERE pid IN (SELECT pid FROM players_info)""")
+        c.execute("""INSERT OR REPLACE INTO players_info_excluded 
+                     SELECT pid, fetched_at FROM players_info 
+                     WHERE team NOT IN (
+                         SELECT DISTINCT team FROM teams_stats_by_gw
+                         )""")
         c.execute("""DELETE FROM players_info WHERE team NOT IN (
                          SElECT DISTINCT team from teams_stats_by_gw
                          )""")
 
 
-def main():
+def main(incremental=False, pool_size=1, players_pool_size=4,
+         players_ttl_days=players_info_ttl_days):
+    """Create and populate database tables.
+
+    :param incremental: bool. If True, only collect rounds newer than
+    the ones already stored and append them.
+    :param pool_size: int. Number of browsers scraping in parallel.
+    :param players_pool_size: int. Number of browsers scraping players
+    info in parallel.
+    :param players_ttl_days: int. Refresh players info older than this.
+    None for never.
+    """
     # connect to sqlite database
     data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
     db_file_path = os.path.join(data_dir, 'ipl_data.db')
 
-    conn = create_connection(db_file_path)
+    # WAL mode - the app keeps reading the database during the ingest
+    conn = db_writer.connect_writer(db_file_path)
+    migrate(conn)
+    if not html_cache.replay:
+        html_cache.evict(html_cache.max_bytes, html_cache.max_age_days)
 
     # create and populate tables in db.
-    create_stats_tables(conn)
-    create_players_info_table(conn)
-    create_results_table(conn)
+    # results first - they tell which rounds were played.
+    create_results_table(conn, incremental)
+    pending = create_stats_tables(conn, incremental, pool_size)
+    create_players_info_table(conn, players_pool_size, players_ttl_days)
 
     clean_data(conn)
+    create_cumulative_tables(conn, incremental, pending)
+
+    # the db file is not written after the checkpoint, so the snapshots
+    # are newer than it.
+    db_writer.checkpoint(conn)
+
+    # columnar snapshots for the app
+    if snapshots.pyarrow_installed():
+        snapshots.export_snapshots(conn)
+    else:
+        print('pyarrow is not installed - tables snapshots not exported.')
 
     conn.close()
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Create ipl_data.db.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only collect rounds newer than stored ones')
+    parser.add_argument('--pool-size', type=int, default=1,
+                        help='number of browsers scraping in parallel')
+    parser.add_argument('--players-pool-size', type=int, default=4,
+                        help='number of browsers scraping players info')
+    parser.add_argument('--players-ttl-days', type=int,
+                        default=players_info_ttl_days,
+                        help='refresh players info older than this')
+    parser.add_argument('--replay', action='store_true',
+                        help='rebuild from cached pages, without a browser')
+    parser.add_argument('--no-cache', action='store_true',
+                        help="don't store fetched pages in cache")
+    args = parser.parse_args()
+    html_cache.replay = args.replay
+    html_cache.record = not args.no_cache
+    main(incremental=args.incremental, pool_size=args.pool_size,
+         players_pool_size=args.players_pool_size,
+         players_ttl_days=args.players_ttl_days)
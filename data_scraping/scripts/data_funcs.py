@@ -1,6 +1,9 @@
 #! python 3
 # data_funcs.py - functions for data manipulating.
 
+import numpy as np
+import pandas as pd
+
 
 def get_gw_match_result(row, results_df):
     """Gets a row from team_stats df, returns 'w','d' or 'l'.
@@ -33,3 +36,255 @@ def get_opponent(row, results_df):
         return match_row['away_team']
     else:
         return match_row['home_team']
+
+
+def create_match_lookup(results_df):
+    """Returns a DataFrame with one row per team per match.
+
+    Columns: team, season, gameweek, Opponent, result ('w', 'd' or
+    'l'), venue ('home' or 'away'), goals_for, goals_against.
+
+    :param results_df: pd.DataFrame. Matches results table.
+    """
+    home = pd.DataFrame({'team': results_df['home_team'].values,
+                         'season': results_df['season'].values,
+                         'gameweek': results_df['gameweek'].values,
+                         'Opponent': results_df['away_team'].values,
+                         'venue': 'home',
+                         'goals_for': results_df['home_score'].values,
+                         'goals_against': results_df['away_score'].values})
+    away = pd.DataFrame({'team': results_df['away_team'].values,
+                         'season': results_df['season'].values,
+                         'gameweek': results_df['gameweek'].values,
+                         'Opponent': results_df['home_team'].values,
+                         'venue': 'away',
+                         'goals_for': results_df['away_score'].values,
+                         'goals_against': results_df['home_score'].values})
+    lookup = pd.concat([home, away], ignore_index=True)
+
+    diff = lookup['goals_for'] - lookup['goals_against']
+    lookup.insert(4, 'result', 'd')
+    lookup.loc[diff > 0, 'result'] = 'w'
+    lookup.loc[diff < 0, 'result'] = 'l'
+
+    # a team plays once per gameweek - keep the first match found,
+    # as get_opponent() and get_gw_match_result() do.
+    return lookup.drop_duplicates(subset=['team', 'season', 'gameweek'])
+
+
+def add_match_info(stats_df, results_df, columns=None, rename=None):
+    """Attaches match info to a player/team stats DataFrame.
+
+    Replaces row-wise apply of get_opponent() and
+    get_gw_match_result() with a single merge on
+    (team, season, gameweek).
+
+    :param stats_df: pd.DataFrame. Player/team stats with 'team',
+    'season' and 'gameweek' columns.
+    :param results_df: pd.DataFrame. Matches results table.
+    :param columns: list of str. Columns of create_match_lookup() to
+    attach. Default: all of them.
+    :param rename: dict. Mapping of attached columns to new names.
+    :return: pd.DataFrame. stats_df (same index) with match columns.
+    """
+    keys = ['team', 'season', 'gameweek']
+    lookup = create_match_lookup(results_df)
+    if columns is not None:
+        lookup = lookup[keys + list(columns)]
+    if rename:
+        lookup = lookup.rename(columns=rename)
+
+    df = stats_df.merge(lookup, how='left', on=keys)
+    df.index = stats_df.index
+    return df
+
+
+def join_players_data(players_stats_df, players_info_df, results_df):
+    """Returns players stats merged with players info and match info.
+
+    Adds 'Opponent' and 'result' (w/l/d) columns.
+    """
+    # Create merged dataFrame of players stats and info
+    joined_player_df = pd.merge(players_stats_df, players_info_df, on='pid',
+                                how='inner')
+    # Add columns: result (w/l/d), opponent
+    return add_match_info(joined_player_df, results_df,
+                          columns=['Opponent', 'result'])
+
+
+def cumulative_stats(stats_df, id_col, base_df=None):
+    """Returns running sums of stats per item, season and match result.
+
+    There is a row for every (id, result, gameweek) of a season, from
+    the first gameweek of the season in stats_df to the last, so the
+    total of a gameweeks window [g1, g2] is the difference of the
+    rows of g2 and g1 - 1. Rows without a match result are left out.
+
+    :param stats_df: pd.DataFrame. Player/team stats with id_col,
+    'season', 'gameweek' and 'result' columns.
+    :param id_col: str. 'pid' or 'team'.
+    :param base_df: pd.DataFrame. Running sums rows (id_col, 'season',
+    'result', 'games' and stats columns) of the gameweek before the
+    first one of stats_df, to continue from. Its items get rows even
+    if they have no stats in stats_df.
+    :return: pd.DataFrame with id_col, 'season', 'gameweek', 'result',
+    'games' (number of matches) and stats columns.
+    """
+    keys = [id_col, 'season', 'gameweek', 'result']
+    stat_cols = [col for col in stats_df.select_dtypes('number').columns
+                 if col not in keys]
+    cols = ['games'] + stat_cols
+    df = stats_df.loc[stats_df['result'].notna(), keys + stat_cols]
+    df = df.assign(games=1, result=df['result'].astype(str))
+
+    seasons = []
+    for season, season_df in df.groupby('season', observed=True):
+        sums = season_df.groupby([id_col, 'result', 'gameweek'],
+                                 observed=True)[cols].sum()
+        ids = list(season_df[id_col].unique())
+        if base_df is not None:
+            base = base_df[base_df['season'] == season].set_index(
+                [id_col, 'result'])[cols].fillna(0)
+            ids += [i for i in base.index.unique(id_col) if i not in ids]
+
+        gws = range(season_df['gameweek'].min(),
+                    season_df['gameweek'].max() + 1)
+        index = pd.MultiIndex.from_product(
+            [ids, ['w', 'd', 'l'], gws], names=[id_col, 'result', 'gameweek'])
+        cum = sums.reindex(index, fill_value=0).groupby(
+            level=[id_col, 'result']).cumsum()
+        if base_df is not None:
+            cum += base.reindex(cum.index.droplevel('gameweek'),
+                                fill_value=0).to_numpy()
+        seasons.append(cum.reset_index().assign(season=season))
+
+    if not seasons:
+        return pd.DataFrame(columns=keys + cols)
+    return pd.concat(seasons, ignore_index=True)[keys + cols]
+
+
+def round_key(season, gameweek):
+    """Returns a sortable key of a round.
+
+    :param season: str. Of the form '19/20'.
+    :param gameweek: int.
+    """
+    return int(season.split('/')[0]), int(gameweek)
+
+
+def get_rounds(df):
+    """Returns sorted list of (season, gameweek) rounds in df."""
+    rounds = df[['season', 'gameweek']].drop_duplicates()
+    return sorted(((str(season), int(gw)) for season, gw in
+                   rounds.itertuples(index=False, name=None)),
+                  key=lambda r: round_key(*r))
+
+
+def get_round_codes(df, rounds):
+    """Returns position in rounds of every row's round, -1 if missing.
+
+    :param df: pd.DataFrame with 'season' and 'gameweek' columns.
+    :param rounds: list of (season, gameweek) tuples.
+    :returns: np.array.
+    """
+    rows_rounds = pd.MultiIndex.from_arrays(
+        [df['season'].astype(str), df['gameweek'].astype(int)])
+    return pd.MultiIndex.from_tuples(rounds).get_indexer(rows_rounds)
+
+
+def round_partial_sums(df, group_cols, value_cols, rounds):
+    """Returns sums of columns per round and group.
+
+    :param df: pd.DataFrame with 'season', 'gameweek', group_cols and
+    value_cols columns.
+    :param group_cols: list of str. Rows with missing values in these
+    columns are kept in their own group.
+    :param value_cols: list of str.
+    :param rounds: list of (season, gameweek) tuples, see get_rounds().
+    :returns: tuple (groups, sums). groups is a pd.Index (a MultiIndex
+    for several group_cols), sums is a np.array of shape (rounds,
+    groups, value_cols).
+    """
+    grouped = df.groupby(group_cols, observed=True, dropna=False)
+    groups = grouped.size().index
+    group_codes = grouped.ngroup().to_numpy()
+    round_codes = get_round_codes(df, rounds)
+    in_rounds = round_codes >= 0
+
+    sums = np.zeros((len(rounds), len(groups), len(value_cols)))
+    np.add.at(sums, (round_codes[in_rounds], group_codes[in_rounds]),
+              df[value_cols].to_numpy(dtype=float)[in_rounds])
+    return groups, sums
+
+
+def window_sums(partial_sums, window, prev_window=None, prev_sums=None):
+    """Returns sums of partial sums over a window of rounds.
+
+    If the sums of a previous window are given, only the rounds that
+    entered or left the window are added or subtracted, when there are
+    fewer of them than rounds in the window.
+
+    :param partial_sums: np.array of shape (rounds, ...), see
+    round_partial_sums().
+    :param window: tuple (first, last). Positions of the window's
+    first and last rounds.
+    :param prev_window: tuple (first, last) of previous window.
+    :param prev_sums: np.array. Sums of previous window.
+    :returns: np.array.
+    """
+    first, last = window
+    if prev_sums is not None:
+        prev_first, prev_last = prev_window
+        entered = np.r_[first:min(last, prev_first - 1) + 1,
+                        max(first, prev_last + 1):last + 1]
+        left = np.r_[prev_first:min(prev_last, first - 1) + 1,
+                     max(prev_first, last + 1):prev_last + 1]
+        if len(entered) + len(left) < last - first + 1:
+            return (prev_sums + partial_sums[entered].sum(axis=0) -
+                    partial_sums[left].sum(axis=0))
+
+    return partial_sums[first:last + 1].sum(axis=0)
+
+
+# Columns stored as pandas Categoricals / as floats in optimize_dtypes()
+categorical_cols = ['team', 'season', 'position', 'result', 'Match result',
+                    'Opponent', 'home_team', 'away_team', 'winner']
+float_cols = ['ball_possession']
+
+
+def optimize_dtypes(df):
+    """Returns df with compact dtypes.
+
+    Repeated strings (categorical_cols) become Categoricals, whole
+    number columns are downcast to int16/int32 and other numeric
+    columns (and float_cols) to float32. Columns already in a compact
+    dtype are left as is.
+
+    :param df: pd.DataFrame. Player/team stats, players info or
+    matches results table.
+    """
+    df = df.copy(deep=False)
+    for col in df.columns:
+        series = df[col]
+        if col in categorical_cols:
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                df[col] = series.astype('category')
+        elif not pd.api.types.is_numeric_dtype(series) or \
+                pd.api.types.is_bool_dtype(series):
+            continue
+        elif col in float_cols or series.isna().any() or \
+                (series % 1 != 0).any():
+            if series.dtype != 'float32':
+                df[col] = series.astype('float32')
+        elif series.dtype not in ('int16', 'int32'):
+            int_series = pd.to_numeric(series, downcast='integer')
+            if int_series.dtype == 'int8':
+                int_series = int_series.astype('int16')
+            df[col] = int_series
+
+    return df
+
+
+def memory_usage(df):
+    """Returns memory usage of df in bytes, strings included."""
+    return df.memory_usage(deep=True).sum()
@@ -0,0 +1,143 @@
+#! python 3
+# data_layer.py - data of the app, shared by all sessions of a server
+# process. Loaded and enriched once, reloaded when the database changes.
+
+import os
+import threading
+
+import pandas as pd
+
+from data_scraping.scripts import snapshots, profiling
+from data_scraping.scripts.create_db import create_connection
+from data_scraping.scripts.data_funcs import add_match_info, \
+    join_players_data, optimize_dtypes, memory_usage
+from data_scraping.scripts.standings import compute_standings
+from data_scraping.scripts.similarity import create_similarity_index
+
+data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+db_file_path = os.path.join(data_dir, 'ipl_data.db')
+
+_lock = threading.Lock()
+_cache = {'version': None, 'data': None}
+
+
+def get_data_version(db_path=db_file_path):
+    """Returns a marker that changes whenever the database changes.
+
+    Made of modification times of the db file, its WAL file and the
+    tables snapshots.
+    """
+    version = []
+    paths = [db_path, f'{db_path}-wal'] + [
+        snapshots.snapshot_path(table_name)
+        for table_name in snapshots.snapshot_tables]
+    for path in paths:
+        try:
+            version.append(os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            version.append(None)
+    return tuple(version)
+
+
+def use_snapshots(db_path=db_file_path):
+    """Returns True if tables snapshots can be loaded.
+
+    Snapshots are used if pyarrow is installed and they are not older
+    than the database (or there is no database file).
+    """
+    if not snapshots.pyarrow_installed() or not snapshots.snapshots_exist():
+        return False
+    db_mtime = max((os.stat(path).st_mtime
+                    for path in (db_path, f'{db_path}-wal')
+                    if os.path.exists(path)), default=0)
+    return all(os.stat(snapshots.snapshot_path(table_name)).st_mtime >=
+               db_mtime for table_name in snapshots.snapshot_tables)
+
+
+def read_tables(db_path=db_file_path):
+    """Returns the four app tables, from snapshots when possible.
+
+    :return: tuple of DataFrames (teams stats, players stats, players
+    info, matches results).
+    """
+    if use_snapshots(db_path):
+        tables = []
+        for table_name in snapshots.snapshot_tables:
+            with profiling.span('data.load_snapshot', table=table_name):
+                tables.append(snapshots.load_snapshot(table_name))
+        return tuple(tables)
+
+    conn = create_connection(db_path)
+    tables = []
+    for table_name in snapshots.snapshot_tables:
+        with profiling.span('data.read_sql_query', table=table_name):
+            tables.append(pd.read_sql_query(
+                f"""SELECT * FROM {table_name}""", conn))
+    conn.close()
+    return tuple(tables)
+
+
+@profiling.traced('data.load_data')
+def load_data(db_path=db_file_path):
+    """Loads tables and enriches them.
+
+    :return: dict of DataFrames: 'team_stats' (with 'Match result' and
+    'Opponent' columns), 'players_stats', 'players_info', 'results'
+    'joined_players' (see data_funcs.join_players_data()) and
+    'standings' (see standings.compute_standings()), and the players
+    'similarity' index (see similarity.create_similarity_index()).
+    """
+    team_stats_df, players_stats_df, players_info_df, results_df = \
+        read_tables(db_path)
+
+    with profiling.span('data.enrich', table='team_stats'):
+        team_stats_df = add_match_info(team_stats_df, results_df,
+                                       columns=['result', 'Opponent'],
+                                       rename={'result': 'Match result'})
+    with profiling.span('data.enrich', table='joined_players'):
+        joined_players_df = join_players_data(players_stats_df,
+                                              players_info_df, results_df)
+    with profiling.span('data.enrich', table='standings'):
+        standings_df = compute_standings(results_df)
+
+    data = {'team_stats': team_stats_df,
+            'players_stats': players_stats_df,
+            'players_info': players_info_df,
+            'results': results_df,
+            'joined_players': joined_players_df,
+            'standings': standings_df}
+
+    # compact dtypes
+    for name, df in data.items():
+        before = memory_usage(df)
+        with profiling.span('data.optimize_dtypes', table=name):
+            data[name] = optimize_dtypes(df)
+        print(f'{name} memory: {before / 1e6:.2f}MB -> '
+              f'{memory_usage(data[name]) / 1e6:.2f}MB')
+
+    with profiling.span('data.similarity_index'):
+        data['similarity'] = create_similarity_index(
+            data['joined_players'])
+
+    return data
+
+
+def get_data():
+    """Returns the app data, shared by all sessions.
+
+    Data is loaded on first call, and reloaded only if the database
+    has changed since. Sessions get shallow copies of the DataFrames -
+    adding columns doesn't affect other sessions, but values must not
+    be modified in place. The similarity index is shared as is.
+
+    :return: dict, as returned by load_data().
+    """
+    version = get_data_version()
+    with _lock:
+        if _cache['data'] is None or _cache['version'] != version:
+            _cache['data'] = load_data()
+            _cache['version'] = version
+        data = _cache['data']
+
+    return {name: df.copy(deep=False) if isinstance(df, pd.DataFrame)
+            else df for name, df in data.items()}
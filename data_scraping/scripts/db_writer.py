@@ -0,0 +1,106 @@
+#! python 3
+# db_writer.py - write connection to the sqlite database, for ingest.
+#
+# The database runs in WAL mode, so the app's readers keep reading
+# the last committed data while ingest writes, instead of waiting for
+# its locks. With synchronous=NORMAL a commit doesn't wait for the
+# disk (the WAL is synced at checkpoints). Writes of independent rows
+# can be grouped in transactions of batch_size rows.
+
+import sqlite3
+from itertools import islice
+
+# Settings
+batch_size = 1000   # rows per transaction of BatchWriter
+write_pragmas = {'journal_mode': 'WAL',     # persistent in the db file
+                 'synchronous': 'NORMAL',
+                 'cache_size': -64 * 1024,  # KiB
+                 'temp_store': 'MEMORY',
+                 'busy_timeout': 30000}     # ms
+
+
+def connect_writer(db_file_path, pragmas=None):
+    """Returns a connection to sqlite db, set for bulk writes.
+
+    :param db_file_path: str.
+    :param pragmas: dict of {pragma: value}. Default: write_pragmas.
+    """
+    conn = sqlite3.connect(db_file_path)
+    for pragma, value in (write_pragmas if pragmas is None
+                          else pragmas).items():
+        conn.execute(f"""PRAGMA {pragma} = {value}""")
+    return conn
+
+
+def checkpoint(conn):
+    """Move the WAL into the db file, waiting for readers (up to
+    busy_timeout), and truncate it.
+
+    Run before exporting tables snapshots - the db file is not written
+    after it, so the snapshots are newer (see data_layer.use_snapshots()).
+    """
+    conn.execute("""PRAGMA optimize""")
+    conn.execute("""PRAGMA wal_checkpoint(TRUNCATE)""")
+
+
+def close_writer(conn):
+    """Checkpoint the WAL and close."""
+    checkpoint(conn)
+    conn.close()
+
+
+class BatchWriter:
+    """Writes rows in transactions of batch_size rows.
+
+    Rows of several statements share a transaction, committed once
+    batch_size rows were written, and when the writer is done. As a
+    context manager, the last transaction is committed at the end of
+    the block, or rolled back on an error.
+    """
+
+    def __init__(self, conn, size=None):
+        """
+        :param conn: db connection object.
+        :param size: int. Rows per transaction. Default: batch_size.
+        """
+        self.conn = conn
+        self.size = size or batch_size
+        self.pending = 0    # rows in the open transaction
+        self.rows = 0
+        self.commits = 0
+
+    def execute(self, query, params=()):
+        """Execute a statement, counted as one row."""
+        self.executemany(query, [params])
+
+    def executemany(self, query, rows):
+        """Execute a statement for every row of parameters.
+
+        :param query: str. Sql query.
+        :param rows: iterable of parameters tuples or dicts.
+        """
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.size - self.pending))
+            if not chunk:
+                return
+            self.conn.executemany(query, chunk)
+            self.pending += len(chunk)
+            self.rows += len(chunk)
+            if self.pending >= self.size:
+                self.commit()
+
+    def commit(self):
+        """Commit the open transaction."""
+        self.conn.commit()
+        self.pending = 0
+        self.commits += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.conn.rollback()
@@ -0,0 +1,185 @@
+#! python 3
+# html_cache.py - On-disk cache of raw web pages snapshots.
+# Pages are stored compressed and content-addressed (identical pages are
+# stored once), and indexed by (kind, season, gameweek, position, pid).
+
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# Settings
+cache_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data',
+                         'html_cache')
+record = True   # store fetched pages in cache
+replay = False  # serve pages from cache only, without a browser
+max_bytes = 500 * 1024 ** 2     # compressed size limit, None for no limit
+max_age_days = None             # age limit, None for no limit
+
+
+class NullDriver:
+    """Stand-in for a webdriver in replay mode.
+
+    Navigation calls do nothing, reading a page raises an error.
+    """
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    @property
+    def page_source(self):
+        raise RuntimeError('no browser in replay mode')
+
+
+def connect():
+    """Returns a connection to the cache index, creates it if needed."""
+    os.makedirs(os.path.join(cache_dir, 'blobs'), exist_ok=True)
+    conn = sqlite3.connect(os.path.join(cache_dir, 'index.db'), timeout=30)
+    with conn:
+        conn.execute("""CREATE TABLE IF NOT EXISTS snapshots (
+                            kind text,
+                            season text,
+                            gameweek text,
+                            position text,
+                            pid text,
+                            digest text,
+                            size integer,
+                            stored_at real,
+                            accessed_at real,
+                            PRIMARY KEY (kind, season, gameweek, position, pid)
+                            )""")
+    return conn
+
+
+def make_key(kind, season='', gameweek='', position='', pid=''):
+    """Returns index key of a page as a dict."""
+    return {'kind': kind, 'season': str(season), 'gameweek': str(gameweek),
+            'position': str(position), 'pid': str(pid)}
+
+
+def blob_path(digest):
+    """Returns file path of a page content by its digest."""
+    return os.path.join(cache_dir, 'blobs', digest[:2], f'{digest}.html.gz')
+
+
+def store(html, kind, **key):
+    """Store a page in cache.
+
+    :param html: str. Page source.
+    :param kind: str. Page kind ('player_stats', 'team_stats',
+    'player', 'results').
+    :param key: season, gameweek, position and pid of the page.
+    """
+    data = html.encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with gzip.open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    now = time.time()
+    conn = connect()
+    with conn:
+        conn.execute("""INSERT OR REPLACE INTO snapshots VALUES (
+                            :kind, :season, :gameweek, :position, :pid,
+                            :digest, :size, :now, :now)""",
+                     dict(make_key(kind, **key), digest=digest,
+                          size=os.path.getsize(path), now=now))
+    conn.close()
+    if max_bytes is not None and cache_size() > max_bytes:
+        evict(max_size=max_bytes)
+
+
+def cache_size():
+    """Returns total compressed size of cached pages in bytes."""
+    conn = connect()
+    size = conn.execute("""SELECT SUM(size) FROM (
+                               SELECT DISTINCT digest, size FROM snapshots
+                               )""").fetchone()[0]
+    conn.close()
+    return size or 0
+
+
+def load(kind, **key):
+    """Returns a cached page source, or None if not in cache.
+
+    :param kind: str. Page kind.
+    :param key: season, gameweek, position and pid of the page.
+    """
+    key = make_key(kind, **key)
+    conn = connect()
+    row = conn.execute("""SELECT digest FROM snapshots
+                          WHERE kind = :kind AND season = :season
+                          AND gameweek = :gameweek AND position = :position
+                          AND pid = :pid""", key).fetchone()
+    if row is None or not os.path.exists(blob_path(row[0])):
+        conn.close()
+        return None
+    with conn:
+        conn.execute("""UPDATE snapshots SET accessed_at = :now
+                        WHERE digest = :digest""",
+                     {'now': time.time(), 'digest': row[0]})
+    conn.close()
+    with gzip.open(blob_path(row[0]), 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+def fetch(get_html, kind, **key):
+    """Returns a page source, from cache in replay mode.
+
+    Otherwise the page is fetched with get_html() and, in record mode,
+    stored in cache.
+
+    :param get_html: function. Navigates the browser to the page and
+    returns its source.
+    :param kind: str. Page kind.
+    :param key: season, gameweek, position and pid of the page.
+    :return: str, or None if page is not in cache in replay mode.
+    """
+    if replay:
+        return load(kind, **key)
+
+    html = get_html()
+    if record:
+        store(html, kind, **key)
+    return html
+
+
+def evict(max_size=None, max_age=None):
+    """Delete old / least recently used pages from cache.
+
+    :param max_size: int. Max total compressed size in bytes.
+    :param max_age: float. Max age of a page in days.
+    """
+    conn = connect()
+    with conn:
+        if max_age is not None:
+            conn.execute("""DELETE FROM snapshots WHERE stored_at < :t""",
+                         {'t': time.time() - max_age * 24 * 3600})
+        if max_size is not None:
+            blobs = conn.execute("""SELECT digest, size, MAX(accessed_at)
+                                    FROM snapshots GROUP BY digest
+                                    ORDER BY MAX(accessed_at) DESC""")
+            total = 0
+            to_delete = []
+            for digest, size, _ in blobs.fetchall():
+                total += size
+                if total > max_size:
+                    to_delete.append((digest,))
+            conn.executemany("""DELETE FROM snapshots WHERE digest = ?""",
+                             to_delete)
+    digests = {r[0] for r in conn.execute("""SELECT digest FROM snapshots""")}
+    conn.close()
+
+    # delete unreferenced contents
+    blobs_dir = os.path.join(cache_dir, 'blobs')
+    for sub_dir in os.listdir(blobs_dir):
+        for file_name in os.listdir(os.path.join(blobs_dir, sub_dir)):
+            digest = file_name.split('.')[0]
+            if file_name.endswith('.html.gz') and digest not in digests:
+                os.remove(os.path.join(blobs_dir, sub_dir, file_name))
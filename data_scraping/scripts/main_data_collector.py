@@ -3,12 +3,19 @@
 # Verify that browsers' drivers are located in the same directory.
 
 import os
+import sys
 
 from data_scraping.scripts import stats, matches_results, players_info, \
     create_db
 
 data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
 
+# Incremental mode: only collect rounds newer than the last round stored
+# in the database, append them and exit.
+if '--incremental' in sys.argv:
+    create_db.main(incremental=True)
+    sys.exit()
+
 driver = stats.initiate_driver()
 
 # Collect data
@@ -7,12 +7,16 @@ import pandas as pd
 from selenium import webdriver
 from datetime import datetime
 
+from data_scraping.scripts import html_cache
+
 results_url = 'https://www.football.co.il/en/scores'
 
 
 def initiate_driver():
     """Creates and returns a webdriver opened on relevant url."""
 
+    if html_cache.replay:
+        return html_cache.NullDriver()
     driver = webdriver.Chrome()
     driver.get(results_url)
     return driver
@@ -37,13 +41,16 @@ def get_results(driver):
 
     :returns DataFrame.
     """
-    html = driver.page_source
+    season = '19/20'  # currently const. Not available for other seasons.
+    html = html_cache.fetch(lambda: driver.page_source, 'results',
+                            season=season)
+    if html is None:
+        return []
     soup = BeautifulSoup(html, features='lxml')
     gameweeks_elems = soup.select(
         'body > div.scores-page > div > '
         'div[class*="col-xs-12 games-round-container league-902"]')
     rows = []
-    season = '19/20'  # currently const. Not available for other seasons.
 
     for gw_elem in gameweeks_elems:
         matches_elems = gw_elem.select(
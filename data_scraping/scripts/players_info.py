@@ -8,6 +8,12 @@ from bs4 import BeautifulSoup
 import pandas as pd
 from datetime import datetime
 
+from data_scraping.scripts import html_cache
+
+players_info_csv = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                                'data', 'players_info.csv')
+_csv_cache = dict()     # {path: (modification time, DataFrame)}
+
 
 def get_player_info(driver, player_id):
     """Scrape player info from his own url. Returns dict."""
@@ -15,9 +21,16 @@ def get_player_info(driver, player_id):
     positions = {'defenseman': 'Defender', 'mid-fielder': 'Midfielder',
                  'goalie': 'GK', 'forward': 'Forward'}
 
-    try:
+    def get_html():
         driver.get(f'https://www.football.co.il/en/player/{player_id}')
-        player_html = driver.page_source
+        return driver.page_source
+
+    player_html = html_cache.fetch(get_html, 'player', pid=player_id)
+    if player_html is None:
+        print(f'error: player id: {player_id} not in cache')
+        return None
+
+    try:
         player_soup = BeautifulSoup(player_html, features='lxml')
         p_info = player_soup.select('body > div.player-page > div >'
                                     'div.col-md-8.col-xs-12.player-right-side '
@@ -59,25 +72,35 @@ def create_players_info_df(driver, p_ids):
     return p_info_df
 
 
+def read_players_info_csv(path=players_info_csv):
+    """Returns players info CSV as DataFrame.
+
+    The file is read again only if it was modified since the last
+    call. Raises FileNotFoundError if it does not exist.
+    """
+    mtime = os.path.getmtime(path)
+    cached = _csv_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        _csv_cache[path] = (mtime, pd.read_csv(path))
+    return _csv_cache[path][1]
+
+
 def update_player_info_df(driver, p_ids):
     """Gets a list of players ids, adds new rows if needed."""
 
     try:
-        temp_df = pd.read_csv(os.path.join(
-            os.path.dirname(os.path.dirname(__file__)),
-            'data', 'players_info.csv'))
-
+        temp_df = read_players_info_csv()
     except FileNotFoundError:
         return pd.DataFrame()   # empty Dataframe.
 
-    cur_pids = temp_df['pid'].unique()
-    p_ids_to_add = list(set(p_ids) - set(cur_pids))
-
+    p_ids_to_add = sorted(set(p_ids) - set(temp_df['pid']))
     rows_to_add = []
     for pid in p_ids_to_add:
-        rows_to_add.append(get_player_info(driver, pid))
-
-    temp_df = temp_df.append(rows_to_add, ignore_index=True)
-
-    return temp_df
+        row = get_player_info(driver, pid)
+        if row:
+            rows_to_add.append(row)
+    if not rows_to_add:
+        return temp_df.copy()
 
+    return pd.concat([temp_df, pd.DataFrame(rows_to_add)],
+                     ignore_index=True)
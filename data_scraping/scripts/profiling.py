@@ -0,0 +1,186 @@
+#! python 3
+# profiling.py - timing and allocation spans of the app.
+# Enabled by setting the IPL_PROFILE environment variable (to anything
+# but '0'). Spans are appended to a per-session JSON lines log in
+# profile_dir, and summed per span name for the /metrics endpoint
+# (see server_lifecycle.py).
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Settings
+enabled = os.environ.get('IPL_PROFILE', '0') != '0'
+profile_dir = os.environ.get('IPL_PROFILE_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), 'data', 'profiles'))
+metrics_port = int(os.environ.get('IPL_METRICS_PORT', 9464))
+
+_lock = threading.Lock()
+_local = threading.local()
+_totals = dict()    # {span name: {'count', 'seconds', 'alloc', 'peak'}}
+
+
+def get_session_id():
+    """Returns id of the current bokeh session, 'server' outside one."""
+    try:
+        from bokeh.io import curdoc
+    except ImportError:
+        return 'server'
+    context = curdoc().session_context
+    return context.id if context is not None else 'server'
+
+
+def record(entry):
+    """Add a finished span to the session log and to the totals.
+
+    :param entry: dict. With 'session', 'span', 'seconds', 'alloc'
+    and 'peak' keys.
+    """
+    with _lock:
+        totals = _totals.setdefault(entry['span'], {
+            'count': 0, 'seconds': 0.0, 'alloc': 0, 'peak': 0})
+        totals['count'] += 1
+        totals['seconds'] += entry['seconds']
+        totals['alloc'] += entry['alloc']
+        totals['peak'] = max(totals['peak'], entry['peak'])
+
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+            path = os.path.join(profile_dir, f"{entry['session']}.jsonl")
+            with open(path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+
+@contextmanager
+def span(name, **tags):
+    """Context manager timing a block, and its memory allocations.
+
+    Does nothing unless profiling is enabled. 'alloc' is the net
+    traced memory allocated in the block, 'peak' the highest traced
+    memory above the start.
+
+    :param name: str. Span name, e.g. 'data.read_tables'.
+    :param tags: extra fields of the log entry.
+    """
+    if not enabled:
+        yield
+        return
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+
+    start_mem, start_peak = tracemalloc.get_traced_memory()
+    if stack:
+        # keep the parent's peak before resetting it
+        stack[-1]['peak'] = max(stack[-1]['peak'], start_peak)
+    tracemalloc.reset_peak()
+    frame = {'peak': 0}
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        end_mem, end_peak = tracemalloc.get_traced_memory()
+        stack.pop()
+        peak = max(frame['peak'], end_peak)
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        record(dict(tags, session=get_session_id(), span=name,
+                    time=time.time(), seconds=round(seconds, 6),
+                    alloc=end_mem - start_mem, peak=peak - start_mem))
+
+
+def traced(name):
+    """Decorator running a function in a span, see span()."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def get_totals():
+    """Returns a copy of the per span totals."""
+    with _lock:
+        return {name: dict(totals) for name, totals in _totals.items()}
+
+
+def reset():
+    """Clear the per span totals."""
+    with _lock:
+        _totals.clear()
+
+
+def prometheus_text():
+    """Returns the per span totals in Prometheus text format."""
+    metrics = [('ipl_span_seconds', 'seconds', 'counter',
+                'Total time spent in span.'),
+               ('ipl_span_calls', 'count', 'counter',
+                'Number of finished spans.'),
+               ('ipl_span_alloc_bytes', 'alloc', 'counter',
+                'Net memory allocated in span.'),
+               ('ipl_span_peak_bytes', 'peak', 'gauge',
+                'Highest memory peak of a single span.')]
+    totals = get_totals()
+    lines = []
+    for metric, key, metric_type, help_text in metrics:
+        lines += [f'# HELP {metric} {help_text}',
+                  f'# TYPE {metric} {metric_type}']
+        lines += [f'{metric}{{span="{name}"}} {span_totals[key]}'
+                  for name, span_totals in sorted(totals.items())]
+    return '\n'.join(lines) + '\n'
+
+
+def report():
+    """Returns the per span totals as a text table, slowest first."""
+    lines = [f'{"span":<40}{"calls":>7}{"total ms":>11}{"mean ms":>10}'
+             f'{"alloc MB":>10}{"peak MB":>9}']
+    for name, totals in sorted(get_totals().items(),
+                               key=lambda item: -item[1]['seconds']):
+        lines.append(f'{name:<40}{totals["count"]:>7}'
+                     f'{totals["seconds"] * 1e3:>11.1f}'
+                     f'{totals["seconds"] * 1e3 / totals["count"]:>10.1f}'
+                     f'{totals["alloc"] / 1e6:>10.2f}'
+                     f'{totals["peak"] / 1e6:>9.2f}')
+    return '\n'.join(lines)
+
+
+def start_metrics_server(port=metrics_port):
+    """Serve prometheus_text() at /metrics on the current tornado
+    IOLoop, e.g. the bokeh server's.
+
+    Totals are per process - with 'bokeh serve --num-procs N', worker i
+    (from 0) serves its own at port + i.
+
+    :return: int. The port served, or None if it is in use.
+    """
+    from tornado.process import task_id
+    from tornado.web import Application, RequestHandler
+
+    worker = task_id()
+    if worker is not None:
+        port += worker
+
+    class MetricsHandler(RequestHandler):
+        def get(self):
+            self.set_header('Content-Type', 'text/plain; version=0.0.4')
+            self.write(prometheus_text())
+
+    try:
+        Application([(r'/metrics', MetricsHandler)]).listen(port)
+    except OSError as e:
+        print(f'metrics endpoint not served, port {port}: {e}')
+        return None
+    return port
@@ -0,0 +1,182 @@
+#! python 3
+# scraper_pool.py - Scrape data from IPL website with several browsers.
+# Verify that browsers' drivers are located in the same directory.
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from data_scraping.scripts import stats, players_info
+
+
+def iter_jobs(jobs, job_func, driver_factory, pool_size=4, retries=2):
+    """Runs jobs on a pool of webdrivers, yields results in jobs order.
+
+    Every worker thread owns a single driver, created lazily with
+    driver_factory. A job that raises is retried with a new driver
+    (the old one may be left on an unknown page) up to retries times,
+    after which its result is None. At most 2 * pool_size jobs are
+    submitted ahead of the consumer, so results of a slow consumer
+    don't pile up in memory.
+
+    :param jobs: iterable of jobs. Each one is passed to job_func.
+    :param job_func: function (driver, state, job) -> result. state is
+    a dict kept per driver, for job_func to track the page it left
+    the driver on.
+    :param driver_factory: function that returns a new webdriver.
+    :param pool_size: int. Number of drivers (and threads).
+    :param retries: int. Number of retries of a failed job.
+    """
+    local = threading.local()
+    drivers = []
+    lock = threading.Lock()
+
+    def get_driver():
+        if getattr(local, 'driver', None) is None:
+            local.driver = driver_factory()
+            local.state = dict()
+            with lock:
+                drivers.append(local.driver)
+        return local.driver, local.state
+
+    def reset_driver():
+        try:
+            local.driver.close()
+        except Exception:
+            pass
+        local.driver = None
+
+    def run(job):
+        for attempt in range(retries + 1):
+            driver, state = get_driver()
+            try:
+                return job_func(driver, state, job)
+            except Exception as e:
+                print(f'error: job {job}, attempt {attempt + 1}: {e!r}')
+                reset_driver()
+        return None
+
+    jobs = iter(jobs)
+    try:
+        with ThreadPoolExecutor(max_workers=pool_size) as executor:
+            futures = deque(executor.submit(run, job)
+                            for job in islice(jobs, 2 * pool_size))
+            try:
+                while futures:
+                    result = futures.popleft().result()
+                    for job in islice(jobs, 1):
+                        futures.append(executor.submit(run, job))
+                    yield result
+            finally:
+                # consumer stopped early - drop jobs not started yet
+                for future in futures:
+                    future.cancel()
+    finally:
+        for driver in drivers:
+            try:
+                driver.close()
+            except Exception:
+                pass
+
+
+def run_jobs(jobs, job_func, driver_factory, pool_size=4, retries=2):
+    """Runs jobs on a pool of webdrivers, returns results in jobs order.
+
+    See iter_jobs().
+    """
+    return list(iter_jobs(jobs, job_func, driver_factory, pool_size,
+                          retries))
+
+
+def stats_job(driver, state, job):
+    """Collects stats of a (season, gameweek, item_type) job.
+
+    Returns a tuple in the form of (data (dict), season (str),
+    gameweek (str)), as in stats.iter_stats_per_game().
+    """
+    season, gw, item_type = job
+    if state.get('item_type') != item_type:
+        if state:
+            # driver was prepared for other item type - start over.
+            driver.get(stats.stats_url)
+            state.clear()
+        stats.prepare_driver(driver, item_type)
+        state['item_type'] = item_type
+    if state.get('season') != season:
+        stats.select_season(driver, season)
+        state['season'] = season
+
+    return stats.scrape_gameweek(driver, item_type, gw, season), season, gw
+
+
+def players_info_job(driver, state, pids):
+    """Collects info of a batch of players. Returns list of dicts."""
+    rows = []
+    for pid in pids:
+        p_info = players_info.get_player_info(driver, pid)
+        if p_info:
+            rows.append(p_info)
+    return rows
+
+
+def iter_stats_per_game_parallel(item_type='player', rounds=None,
+                                 pool_size=4,
+                                 driver_factory=stats.initiate_driver,
+                                 retries=2):
+    """Collects stats of rounds on a pool of drivers, yields them a
+    gameweek at a time, in rounds order.
+
+    :param item_type: str. can one of ['player', 'team']
+    :param rounds: list of (season, gameweek) tuples to collect.
+    Default: all rounds of stats.default_seasons and stats.default_gws.
+    :param pool_size: int. Number of drivers.
+    :param driver_factory: function that returns a new webdriver
+    opened on 'stats' url.
+    :param retries: int. Number of retries of a failed gameweek.
+    :returns generator of tuples in the form of
+    (data (dict), season (str), gameweek (str)). data is None for a
+    round that failed after all retries.
+    """
+    if rounds is None:
+        rounds = stats.default_rounds()
+    rounds = list(rounds)
+    jobs = ((season, gw, item_type) for season, gw in rounds)
+    for (season, gw), data_tup in zip(rounds, iter_jobs(
+            jobs, stats_job, driver_factory, pool_size, retries)):
+        yield data_tup if data_tup is not None else (None, season, gw)
+
+
+def stats_per_game_parallel(item_type='player', rounds=None, pool_size=4,
+                            driver_factory=stats.initiate_driver,
+                            retries=2):
+    """Collects stats of rounds on a pool of drivers, see
+    iter_stats_per_game_parallel().
+
+    :returns list of tuples in the form of
+    (data (dict), season (str), gameweek (str)), failed rounds are
+    left out.
+    """
+    return [data_tup for data_tup in iter_stats_per_game_parallel(
+        item_type, rounds, pool_size, driver_factory, retries)
+        if data_tup[0] is not None]
+
+
+def players_info_parallel(pids, pool_size=4, batch_size=20,
+                          driver_factory=stats.initiate_driver, retries=2):
+    """Collects players info on a pool of drivers.
+
+    :param pids: list of players ids.
+    :param pool_size: int. Number of drivers.
+    :param batch_size: int. Number of players per job.
+    :param driver_factory: function that returns a new webdriver.
+    :param retries: int. Number of retries of a failed batch.
+    :returns list of dicts, as returned by
+    players_info.get_player_info().
+    """
+    pids = list(pids)
+    batches = [pids[i:i + batch_size]
+               for i in range(0, len(pids), batch_size)]
+    results = run_jobs(batches, players_info_job, driver_factory,
+                       pool_size, retries)
+    return [row for rows in results if rows for row in rows]
@@ -0,0 +1,113 @@
+#! python 3
+# similarity.py - find players with similar per 90 minutes stats.
+#
+# Every player's season is a vector of stats per 90 minutes,
+# standardized per stat and scaled to unit length, so the dot product
+# of two vectors is their cosine similarity. Top-k queries are a
+# single matrix-vector product over all vectors.
+
+import numpy as np
+import pandas as pd
+
+min_minutes = 270   # player seasons with fewer minutes are left out
+# counts of matches/minutes rather than of actions
+not_similarity_cols = ['pid', 'gameweek', 'minutes', 'shirt_number',
+                       'appearances', 'sub_in', 'sub_out', 'index']
+info_cols = ['pid', 'name', 'season', 'team', 'position', 'minutes']
+
+
+def create_similarity_index(joined_player_df, min_minutes=min_minutes):
+    """Returns a similarity index of players seasons.
+
+    :param joined_player_df: pd.DataFrame. Players stats per gameweek
+    joined with players info, see data_funcs.join_players_data().
+    :param min_minutes: int. Minimal minutes of a player season.
+    :return: dict with 'players' (pd.DataFrame of info_cols, a row per
+    player season), 'columns' (list of stats), 'per90' (np.array of
+    stats per 90 minutes, a row per player season) and 'vectors'
+    (contiguous float32 np.array of per90 standardized to unit rows).
+    """
+    stat_cols = [col for col in joined_player_df.select_dtypes(
+        'number').columns if col not in not_similarity_cols]
+    grouped = joined_player_df.groupby(['pid', 'season'], observed=True,
+                                       sort=True)
+    sums = grouped[['minutes'] + stat_cols].sum()
+    info = joined_player_df.drop_duplicates(['pid', 'season']).set_index(
+        ['pid', 'season'])[['name', 'team', 'position']].reindex(sums.index)
+    played = (sums['minutes'] >= max(min_minutes, 1)).to_numpy()
+
+    players = info[played].assign(minutes=sums['minutes'][played])
+    players = players.reset_index()[info_cols]
+    for col in ['season', 'team', 'position']:
+        players[col] = players[col].astype(str)
+    per90 = (sums[stat_cols].to_numpy(dtype=np.float64)[played] /
+             sums['minutes'].to_numpy()[played, np.newaxis] * 90)
+
+    std = per90.std(axis=0)
+    vectors = (per90 - per90.mean(axis=0)) / np.where(std > 0, std, 1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = np.divide(vectors, norms, out=np.zeros_like(vectors),
+                        where=norms > 0)
+
+    return {'players': players, 'columns': stat_cols,
+            'per90': per90.astype(np.float32),
+            'vectors': np.ascontiguousarray(vectors, dtype=np.float32)}
+
+
+def get_player_row(index, pid, season=None):
+    """Returns position of a player season in the index.
+
+    :param index: dict. As returned by create_similarity_index().
+    :param pid: int. Player id.
+    :param season: str. Default: the player's last season in index.
+    :return: int, or None if not in index.
+    """
+    players = index['players']
+    rows = np.flatnonzero(players['pid'].to_numpy() == pid)
+    if season is not None:
+        rows = rows[players['season'].to_numpy()[rows] == season]
+    return int(rows[-1]) if len(rows) else None
+
+
+def find_similar(index, pid, season=None, k=10, positions=None, teams=None,
+                 exclude_self=True):
+    """Returns the players seasons most similar to a player season.
+
+    :param index: dict. As returned by create_similarity_index().
+    :param pid: int. Player id.
+    :param season: str. Default: the player's last season in index.
+    :param k: int. Number of players seasons to return.
+    :param positions: list of str. Only players of these positions.
+    Default: all positions.
+    :param teams: list of str. Only players of these teams. Default:
+    all teams.
+    :param exclude_self: bool. Leave out all seasons of the player.
+    :return: pd.DataFrame of info_cols, 'similarity' (cosine, -1 to 1)
+    and the stats per 90 minutes, most similar first. Empty if the
+    player season is not in index.
+    """
+    players = index['players']
+    row = get_player_row(index, pid, season)
+    if row is None:
+        return pd.DataFrame(columns=info_cols + ['similarity'] +
+                            index['columns'])
+
+    scores = index['vectors'] @ index['vectors'][row]
+    mask = np.ones(len(players), dtype=bool)
+    if positions is not None:
+        mask &= players['position'].isin(positions).to_numpy()
+    if teams is not None:
+        mask &= players['team'].isin(teams).to_numpy()
+    if exclude_self:
+        mask &= players['pid'].to_numpy() != pid
+    candidates = np.flatnonzero(mask)
+
+    k = min(k, len(candidates))
+    top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]] \
+        if k else candidates
+    top = top[np.argsort(-scores[top], kind='stable')]
+
+    per90 = pd.DataFrame(index['per90'][top], columns=index['columns'])
+    return pd.concat([players.iloc[top].reset_index(drop=True),
+                      pd.Series(scores[top], name='similarity'), per90],
+                     axis=1)
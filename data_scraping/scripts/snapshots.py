@@ -0,0 +1,70 @@
+#! python 3
+# snapshots.py - columnar snapshots of database tables for the app.
+# Tables are exported to uncompressed Arrow (Feather v2) files after
+# each ingest, and loaded memory-mapped, so several server processes
+# share the same pages. Requires pyarrow.
+
+import os
+from importlib.util import find_spec
+
+import pandas as pd
+
+from data_scraping.scripts.data_funcs import optimize_dtypes
+
+data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+snapshots_dir = os.path.join(data_dir, 'snapshots')
+
+snapshot_tables = ['teams_stats_by_gw', 'players_stats_by_gw',
+                   'players_info', 'matches_results']
+
+
+def pyarrow_installed():
+    """Returns True if pyarrow can be imported."""
+    return find_spec('pyarrow') is not None
+
+
+def snapshot_path(table_name, out_dir=snapshots_dir):
+    """Returns file path of a table's snapshot."""
+    return os.path.join(out_dir, f'{table_name}.arrow')
+
+
+def export_snapshots(conn, out_dir=snapshots_dir):
+    """Export database tables to Arrow files.
+
+    Files are written to temporary paths and then renamed, so readers
+    never see a partial snapshot.
+
+    :param conn: db connection object.
+    :param out_dir: str. Snapshots directory.
+    """
+    import pyarrow as pa
+    from pyarrow import feather
+
+    os.makedirs(out_dir, exist_ok=True)
+    for table_name in snapshot_tables:
+        df = optimize_dtypes(
+            pd.read_sql_query(f"""SELECT * FROM {table_name}""", conn))
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        path = snapshot_path(table_name, out_dir)
+        feather.write_feather(table, f'{path}.tmp',
+                              compression='uncompressed')
+        os.replace(f'{path}.tmp', path)
+
+
+def snapshots_exist(out_dir=snapshots_dir):
+    """Returns True if snapshots of all tables exist."""
+    return all(os.path.exists(snapshot_path(table_name, out_dir))
+               for table_name in snapshot_tables)
+
+
+def load_snapshot(table_name, out_dir=snapshots_dir, memory_map=True):
+    """Returns a table snapshot as a DataFrame.
+
+    With memory_map, numeric columns are not copied from the mapped
+    file where possible.
+    """
+    from pyarrow import feather
+
+    table = feather.read_table(snapshot_path(table_name, out_dir),
+                               memory_map=memory_map)
+    return table.to_pandas(split_blocks=True)
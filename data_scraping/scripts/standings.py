@@ -0,0 +1,141 @@
+#! python 3
+# standings.py - league tables after every gameweek, computed from
+# matches results.
+
+import numpy as np
+import pandas as pd
+
+from data_scraping.scripts.data_funcs import create_match_lookup, round_key
+
+form_length = 5     # number of last matches in form strings
+points_per_result = {'w': 3, 'd': 1, 'l': 0}
+# summed per team over the season's gameweeks so far
+count_cols = ['played', 'won', 'drawn', 'lost', 'goals_for',
+              'goals_against', 'points', 'home_played', 'home_points',
+              'away_played', 'away_points']
+standings_cols = ['season', 'gameweek', 'rank', 'team'] + count_cols + \
+                 ['goal_diff', 'form']
+
+
+def get_form(results, n=form_length):
+    """Returns form strings of teams after every gameweek.
+
+    :param results: np.array of shape (gameweeks, teams). Results of
+    the teams' matches ('W', 'D' or 'L'), '' where a team didn't play.
+    :param n: int. Number of last matches in a form string.
+    :return: np.array of shape (gameweeks, teams), strings of the
+    last n results, most recent last.
+    """
+    n_gws, n_teams = results.shape
+    played = results != ''
+    n_played = played.cumsum(axis=0)
+
+    # results of every team in the order played
+    gw_codes, team_codes = np.nonzero(played)
+    matches = np.full((n_teams, n_gws), '', dtype='<U1')
+    matches[team_codes, n_played[gw_codes, team_codes] - 1] = \
+        results[gw_codes, team_codes]
+
+    n_form = np.minimum(n_played, n)[..., np.newaxis]
+    offsets = np.arange(n)
+    in_form = offsets < n_form
+    positions = np.where(in_form, n_played[..., np.newaxis] - n_form +
+                         offsets, 0)
+    chars = np.where(in_form, matches[np.arange(n_teams)[:, np.newaxis],
+                                      positions], '')
+    return np.ascontiguousarray(chars).view(f'<U{n}')[..., 0]
+
+
+def season_standings(matches, n_form=form_length):
+    """Returns league tables of a season after each of its gameweeks.
+
+    Teams are ranked by points, goal difference, goals scored and
+    name.
+
+    :param matches: pd.DataFrame. Matches of a season, a row per team
+    per match, see data_funcs.create_match_lookup().
+    :param n_form: int. Number of last matches in form strings.
+    :return: pd.DataFrame with a row per gameweek and team, with
+    standings_cols columns but 'season'.
+    """
+    teams = np.sort(matches['team'].unique())
+    gameweeks = np.sort(matches['gameweek'].unique())
+    team_codes = np.searchsorted(teams, matches['team'].to_numpy())
+    gw_codes = np.searchsorted(gameweeks, matches['gameweek'].to_numpy())
+
+    result = matches['result'].to_numpy().astype('<U1')
+    home = (matches['venue'] == 'home').to_numpy()
+    points = np.select([result == r for r in points_per_result],
+                       list(points_per_result.values()))
+    values = {'played': 1, 'won': result == 'w', 'drawn': result == 'd',
+              'lost': result == 'l',
+              'goals_for': matches['goals_for'].to_numpy(),
+              'goals_against': matches['goals_against'].to_numpy(),
+              'points': points, 'home_played': home,
+              'home_points': points * home, 'away_played': ~home,
+              'away_points': points * ~home}
+    values = np.column_stack([np.broadcast_to(values[col], len(matches))
+                              for col in count_cols]).astype(int)
+
+    # sums per gameweek, then over the season so far
+    counts = np.zeros((len(gameweeks), len(teams), len(count_cols)),
+                      dtype=int)
+    np.add.at(counts, (gw_codes, team_codes), values)
+    counts = counts.cumsum(axis=0)
+    col = {name: counts[..., i] for i, name in enumerate(count_cols)}
+    goal_diff = col['goals_for'] - col['goals_against']
+
+    # lexsort sorts by the last key first
+    order = np.lexsort((np.broadcast_to(np.arange(len(teams)),
+                                        goal_diff.shape),
+                        -col['goals_for'], -goal_diff, -col['points']))
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(1, len(teams) + 1)[
+        np.newaxis].repeat(len(gameweeks), axis=0), axis=1)
+
+    results = np.full((len(gameweeks), len(teams)), '', dtype='<U1')
+    results[gw_codes, team_codes] = np.char.upper(result)
+
+    table = pd.DataFrame(
+        {'gameweek': np.repeat(gameweeks, len(teams)),
+         'rank': rank.ravel(), 'team': np.tile(teams, len(gameweeks)),
+         **{name: col[name].ravel() for name in count_cols},
+         'goal_diff': goal_diff.ravel(),
+         'form': get_form(results, n_form).ravel()})
+    return table.sort_values(['gameweek', 'rank'], ignore_index=True)
+
+
+def compute_standings(results_df, n_form=form_length):
+    """Returns league tables after every gameweek of every season.
+
+    :param results_df: pd.DataFrame. Matches results table.
+    :param n_form: int. Number of last matches in form strings.
+    :return: pd.DataFrame with standings_cols columns, a row per
+    season, gameweek and team, sorted by round and rank.
+    """
+    matches = create_match_lookup(results_df)
+    seasons = sorted(matches['season'].astype(str).unique(),
+                     key=lambda season: round_key(season, 0))
+    tables = [season_standings(matches[matches['season'] == season],
+                               n_form).assign(season=season)
+              for season in seasons]
+    if not tables:
+        return pd.DataFrame(columns=standings_cols)
+    return pd.concat(tables, ignore_index=True)[standings_cols]
+
+
+def get_round_slices(standings_df):
+    """Returns positions of every round's rows in standings_df.
+
+    :param standings_df: pd.DataFrame. As returned by
+    compute_standings(), sorted by round.
+    :return: dict of {(season, gameweek): slice}, in rounds order.
+    """
+    seasons = standings_df['season'].astype(str).to_numpy()
+    gameweeks = standings_df['gameweek'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, (seasons[1:] != seasons[:-1]) |
+                                  (gameweeks[1:] != gameweeks[:-1])])
+    stops = np.r_[starts[1:], len(standings_df)]
+    return {(seasons[start], int(gameweeks[start])): slice(start, stop)
+            for start, stop in zip(starts, stops)}
+
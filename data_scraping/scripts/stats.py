@@ -3,6 +3,7 @@
 # Verify that browsers' drivers are located in the same directory.
 
 from bs4 import BeautifulSoup
+import lxml.html
 import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.support.ui import WebDriverWait
@@ -10,6 +11,8 @@ from selenium.webdriver.support import expected_conditions as ec
 from selenium.common import exceptions
 from selenium.webdriver.common.keys import Keys
 
+from data_scraping.scripts import html_cache
+
 # from datetime import datetime
 
 # import time
@@ -17,10 +20,21 @@ from selenium.webdriver.common.keys import Keys
 base_url = 'https://www.football.co.il'
 stats_url = 'https://www.football.co.il/en/stats'
 
+# rounds collected by default (full rebuild)
+default_seasons = ['19/20']
+default_gws = range(1, 18)
+
+
+def default_rounds():
+    """Returns all (season, gameweek) rounds collected by default."""
+    return [(season, gw) for season in default_seasons for gw in default_gws]
+
 
 def initiate_driver():
     """Creates and returns a webdriver opened on relevant url."""
 
+    if html_cache.replay:
+        return html_cache.NullDriver()
     driver = webdriver.Chrome()
     driver.get(stats_url)
     return driver
@@ -210,51 +224,181 @@ def create_stats_df(items_stats, season, gw, item_type='player'):
     return df
 
 
-def stats_per_game_wrapper(driver, item_type='player'):
-    """Collects stats and returns them in a Dataframe.
+def prepare_driver(driver, item_type):
+    """Select item type and unfold all hidden items on web page.
 
     :param driver: Webdriver object. Opened on 'stats' url.
     :param item_type: str. can one of ['player', 'team']
-    :returns a Dataframe with per match stats.
     """
-
-    seasons = ['19/20']
-    gws = range(1, 18)
-    df = pd.DataFrame()
+    if html_cache.replay:
+        return
     select_item_type(driver, item_type)
 
     # unfold hidden items on web page
     unfold_stats(driver)
     unfold_players(driver)
 
-    # for sqlite db
-    data_tuples = []
-
-    for season in seasons:
-        select_season(driver, season)
-        for gw in gws:
-            select_gameweek(driver, gw)
-            soup = BeautifulSoup(driver.page_source, features='lxml')
-            poi = soup.select('#stats-page-widget-react > div > div',
-                              recursive=False)
-            if item_type == 'player':
-                # get gk stats
-                select_position(driver, 'goalie')
-                unfold_players(driver)
-                soup = BeautifulSoup(driver.page_source, features='lxml')
-                poi = poi + soup.select('#stats-page-widget-react > div > div',
-                                        recursive=False)
-                # reset position selection
-                select_position(driver, 'all')
-
-            scraped_stats = stats_scraper(poi, item_type)
-            # temp_df = create_stats_df(scraped_stats, season, gw, item_type)
-            # df = df.append(temp_df, ignore_index=True, sort=False)
-
-            # for sqlite db
-            data_tuples.append((scraped_stats, season, gw))
-
-    return data_tuples  # df
+
+def get_gameweek_pages(driver, item_type, season, gw):
+    """Returns list of page sources of a gameweek's stats.
+
+    Pages are served from html_cache in replay mode.
+
+    :param driver: Webdriver object. Prepared with prepare_driver().
+    :param item_type: str. can one of ['player', 'team']
+    :param season: str. Selected season.
+    :param gw: int. Gameweek.
+    """
+
+    def get_html():
+        select_gameweek(driver, gw)
+        return driver.page_source
+
+    def get_goalie_html():
+        select_position(driver, 'goalie')
+        unfold_players(driver)
+        html = driver.page_source
+        # reset position selection
+        select_position(driver, 'all')
+        return html
+
+    kind = f'{item_type}_stats'
+    pages = [html_cache.fetch(get_html, kind, season=season, gameweek=gw,
+                              position='all')]
+    if item_type == 'player':
+        # get gk stats
+        pages.append(html_cache.fetch(get_goalie_html, kind, season=season,
+                                      gameweek=gw, position='goalie'))
+    if None in pages:
+        raise KeyError(f'{kind} {season} gameweek {gw} not in cache')
+    return pages
+
+
+def get_contents(elem):
+    """Returns children of lxml element, text nodes included.
+
+    Same as BeautifulSoup's .contents of the element.
+    """
+    contents = [elem.text] if elem.text else []
+    for child in elem:
+        contents.append(child)
+        if child.tail:
+            contents.append(child.tail)
+    return contents
+
+
+def get_text(node):
+    """Returns text of an lxml element or text node."""
+    return node if isinstance(node, str) else node.text_content()
+
+
+def stats_scraper_lxml(stats, item_type='player'):
+    """Same as stats_scraper(), for a list of lxml elements.
+
+    :param stats: List of lxml elements of stats tables
+    :param item_type: str. Available inputs: 'player' or 'team'.
+    :returns nested dict of the form {stat: {player_id: score}}
+    """
+
+    items_stats = dict()
+    for stat in stats:
+        label = get_text(get_contents(stat.find('div'))[1])
+        if (label not in items_stats) and (label not in ['SubIn', 'SubOut']):
+            items_score = dict()
+            for item in stat.iter('li'):
+                contents = get_contents(item)
+                if item_type == 'player':
+                    item_id = int(contents[0].get('href').split('player/')[1])
+                    items_score[item_id] = int(get_text(contents[2]))
+                elif item_type == 'team':
+                    item_id = get_text(contents[1])
+                    items_score[item_id] = float(get_text(contents[2]))
+            items_stats[label] = items_score
+
+    return items_stats
+
+
+def parse_gameweek_pages(pages, item_type, backend='lxml'):
+    """Returns stats of a gameweek from its pages sources.
+
+    :param pages: list of str. Pages sources.
+    :param item_type: str. can one of ['player', 'team']
+    :param backend: str. 'lxml' parses pages with lxml and reads
+    only the stats widget with XPath. 'bs4' builds a full
+    BeautifulSoup tree of every page.
+    :returns nested dict of the form {stat: {item_id: score}}
+    """
+    poi = []
+    if backend == 'lxml':
+        for html in pages:
+            tree = lxml.html.fromstring(html)
+            poi = poi + tree.xpath(
+                '//*[@id="stats-page-widget-react"]/div/div')
+        return stats_scraper_lxml(poi, item_type)
+
+    for html in pages:
+        soup = BeautifulSoup(html, features='lxml')
+        poi = poi + soup.select('#stats-page-widget-react > div > div',
+                                recursive=False)
+    return stats_scraper(poi, item_type)
+
+
+def scrape_gameweek(driver, item_type, gw, season=None):
+    """Collects stats of a single gameweek of the selected season.
+
+    :param driver: Webdriver object. Prepared with prepare_driver().
+    :param item_type: str. can one of ['player', 'team']
+    :param gw: int. Gameweek.
+    :param season: str. Selected season.
+    :returns nested dict of the form {stat: {item_id: score}}
+    """
+    pages = get_gameweek_pages(driver, item_type, season, gw)
+    return parse_gameweek_pages(pages, item_type)
+
+
+def iter_stats_per_game(driver, item_type='player', rounds=None):
+    """Collects stats, yields them a gameweek at a time.
+
+    :param driver: Webdriver object. Opened on 'stats' url.
+    :param item_type: str. can one of ['player', 'team']
+    :param rounds: list of (season, gameweek) tuples to collect.
+    Default: all rounds of default_seasons and default_gws.
+    :returns generator of tuples in the form of
+    (data (dict), season (str), gameweek (str)), in rounds order. data
+    is None for a round that could not be collected.
+    """
+
+    if rounds is None:
+        rounds = default_rounds()
+    prepare_driver(driver, item_type)
+
+    cur_season = None
+    for season, gw in rounds:
+        if season != cur_season and not html_cache.replay:
+            select_season(driver, season)
+            cur_season = season
+        try:
+            scraped_stats = scrape_gameweek(driver, item_type, gw, season)
+        except KeyError as e:
+            # page missing from cache in replay mode
+            print(f'error: {e}')
+            yield None, season, gw
+            continue
+
+        # for sqlite db
+        yield scraped_stats, season, gw
+
+
+def stats_per_game_wrapper(driver, item_type='player', rounds=None):
+    """Collects stats of all rounds, see iter_stats_per_game().
+
+    :returns list of tuples in the form of
+    (data (dict), season (str), gameweek (str)), failed rounds are
+    left out.
+    """
+    return [data_tup for data_tup in
+            iter_stats_per_game(driver, item_type, rounds)
+            if data_tup[0] is not None]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,416 @@
+#! python 3
+# synthetic_data.py - deterministic synthetic league data, in the
+# schemas of the scraped data, of ipl_data.db and of the csv files.
+# Used for benchmarks at scales larger than the real data. Run from
+# the repository root, e.g.:
+# python -m data_scraping.scripts.synthetic_data --seasons 5 --db out.db
+
+import argparse
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_scraping.scripts import create_db, db_writer
+
+# Stats labels, as scraped, and their mean per match (per appearance of
+# a player), as in season 19/20.
+team_stats_means = {
+    'Goal': 1.19, 'Ball Possession': 50.0, 'Attempt on Goal': 11.93,
+    'On Target': 4.42, 'Attempts inside the Box': 6.11,
+    'Attempts outside the Box': 5.82, 'Penalty Goal': 0.11, 'Corner': 4.85,
+    'Cross': 12.59, 'Passes': 444.85, 'Key Pass': 5.54,
+    'Accurate Key Passes': 2.5, 'Accurate Passes': 368.6,
+    'Attacking Passes': 306.44, 'Air Challenge': 33.54,
+    'Won Air Challenge': 16.77, 'Ground Challenges': 109.32,
+    'Won Ground Challenges': 54.66, 'Dribbles': 25.26,
+    'Successful Dribbles': 13.81, 'Successful Tackles': 32.99,
+    'Ball Recoveries': 48.92, 'Ball Recoveries in Opponents Half': 8.29,
+    'Ball Recoveries in Own Half': 40.63, 'Blocked Attempts on Goal': 2.77,
+    'Lost Ball': 67.68, 'Lost Ball own half': 13.04, 'Penalty Miss': 0.04,
+    'Yellow Card': 2.6, 'Red Card': 0.2, 'Foul': 12.43, 'Offside': 1.64,
+    'Opponent Fouls': 11.63, 'Assists': 0.74, 'Left Flank Attacks': 26.26,
+    'Right Flank Attacks': 29.81, 'Center Flank Attacks': 17.23,
+    'Left Flank Attacks With Shot': 3.21,
+    'Right Flank Attacks With Shot': 3.55,
+    'Center Flank Attacks With Shot': 1.79}
+player_stats_means = {
+    'Minutes': 76.96, 'Goals': 0.08, 'Assists': 0.06, 'Attempt on Goal': 0.86,
+    'Key Pass': 0.4, 'Accurate Key Passes': 0.18, 'On Target': 0.32,
+    'Attempts inside the Box': 0.44, 'Attempts outside the Box': 0.17,
+    'Attempts Off Target': 0.33, 'Cross': 0.9, 'Passes': 31.88,
+    'Accurate Passes': 26.42, 'Air Challange': 2.4, 'Won Air Challange': 1.2,
+    'Ground Challenges': 7.85, 'Won Ground Challenges': 3.92,
+    'Dribbles': 1.82, 'Successful Dribbles': 0.99, 'Tackles': 2.36,
+    'Successful Tackles': 1.37, 'Ball Recoveries': 3.54,
+    'Ball Recoveries in Opponents Half': 0.6,
+    'Ball Recoveries in Own Half': 2.94, 'Blocked Attempts on Goal': 0.2,
+    'Lost Ball': 4.86, 'Lost Ball own half': 0.94, 'Own Goal': 0.0,
+    'Penalty Miss': 0.0, 'Yellow Card': 0.19, 'Red Card': 0.01,
+    'Fouls': 0.89, 'Opponent Fouls': 0.84, 'Offside': 0.12,
+    'Appearances': 1.0, 'Sub Out': 0.21, 'Sub In': 0.21, 'Coped Goals': 0.09,
+    'Stops': 0.09, 'Clean Net': 0.0, 'Threat Denied by Goalkeeper': 0.0,
+    'Goalie Mistake': 0.01, 'Penalty Goals': 0.01, 'Penalties Coped': 0.01}
+
+# Stats that are a successful part of another stat: {stat: base stat}
+team_derived_stats = {
+    'On Target': 'Attempt on Goal', 'Accurate Key Passes': 'Key Pass',
+    'Accurate Passes': 'Passes', 'Won Air Challenge': 'Air Challenge',
+    'Won Ground Challenges': 'Ground Challenges',
+    'Successful Dribbles': 'Dribbles',
+    'Left Flank Attacks With Shot': 'Left Flank Attacks',
+    'Right Flank Attacks With Shot': 'Right Flank Attacks',
+    'Center Flank Attacks With Shot': 'Center Flank Attacks'}
+player_derived_stats = {
+    'Accurate Key Passes': 'Key Pass', 'Accurate Passes': 'Passes',
+    'Won Air Challange': 'Air Challange',
+    'Won Ground Challenges': 'Ground Challenges',
+    'Successful Dribbles': 'Dribbles', 'Successful Tackles': 'Tackles'}
+# Stats of the goalkeepers page only
+goalie_stats = ['Coped Goals', 'Stops', 'Clean Net',
+                'Threat Denied by Goalkeeper', 'Goalie Mistake',
+                'Penalties Coped']
+
+positions = ['GK', 'Defender', 'Midfielder', 'Forward']
+lineup = {'GK': 1, 'Defender': 4, 'Midfielder': 4, 'Forward': 2}
+n_subs = 3
+scorer_weights = {'GK': 0.0, 'Defender': 0.5, 'Midfielder': 1.5,
+                  'Forward': 3.0}
+
+
+def get_seasons(n_seasons, last_season_start=2019):
+    """Returns n_seasons season names, the last one starting in
+    last_season_start, e.g. ['18/19', '19/20']."""
+    years = range(last_season_start - n_seasons + 1, last_season_start + 1)
+    return [f'{year % 100:02d}/{(year + 1) % 100:02d}' for year in years]
+
+
+def create_players(teams, n_players, rng):
+    """Returns players info of every team's squad.
+
+    :param teams: list of str.
+    :param n_players: int. Players per team, at least 16.
+    :param rng: np.random.Generator.
+    :return: list of dicts, as returned by
+    players_info.get_player_info().
+    """
+    if n_players < 16:
+        raise ValueError('n_players must be at least 16')
+    n_gk = max(2, round(0.1 * n_players))
+    n_def = round(0.3 * n_players)
+    n_fwd = round(0.2 * n_players)
+    squad = (['GK'] * n_gk + ['Defender'] * n_def +
+             ['Midfielder'] * (n_players - n_gk - n_def - n_fwd) +
+             ['Forward'] * n_fwd)
+
+    players = []
+    for t, team in enumerate(teams):
+        for i, position in enumerate(squad):
+            pid = 100000 + t * 1000 + i
+            birth = datetime.datetime(1985, 1, 1) + datetime.timedelta(
+                days=int(rng.integers(0, 15 * 365)))
+            players.append({'pid': pid, 'Name': f'Player {pid}',
+                            'Shirt number': str(i + 1), 'Team': team,
+                            'Position': position, 'Date of birth': birth})
+    return players
+
+
+def create_results(teams, seasons, rng):
+    """Returns matches results of double round robin seasons.
+
+    :param teams: list of str. Even number of teams.
+    :param seasons: list of str.
+    :param rng: np.random.Generator.
+    :return: list of dicts, as returned by matches_results.get_results().
+    """
+    n_teams = len(teams)
+    game_times = ['18:00', '19:00', '20:30']
+    results = []
+    for season in seasons:
+        start = datetime.date(2000 + int(season.split('/')[0]), 8, 24)
+        # circle method for round robin pairings
+        rotation = list(range(n_teams))
+        for gw in range(1, 2 * (n_teams - 1) + 1):
+            date = start + datetime.timedelta(weeks=gw - 1)
+            for i in range(n_teams // 2):
+                home, away = rotation[i], rotation[n_teams - 1 - i]
+                if gw > n_teams - 1:
+                    home, away = away, home
+                home_score, away_score = (int(goals) for goals in
+                                          rng.poisson(1.3, size=2))
+                if home_score > away_score:
+                    winner = teams[home]
+                elif away_score > home_score:
+                    winner = teams[away]
+                else:
+                    winner = 'Draw'
+                results.append({'Season': season, 'Gameweek': gw,
+                                'Date': date.isoformat(),
+                                'Day': date.strftime('%a'),
+                                'Game time': game_times[i % 3],
+                                'Home team': teams[home],
+                                'Away team': teams[away],
+                                'Home team score': home_score,
+                                'Away team score': away_score,
+                                'Winner': winner,
+                                'Stadium': f'{teams[home]} Stadium'})
+            rotation = [rotation[0]] + [rotation[-1]] + rotation[1:-1]
+
+    return results
+
+
+def draw_stats(means, derived, scale, rng):
+    """Returns random stats of several items.
+
+    :param means: dict. {stat: mean}.
+    :param derived: dict. {stat: base stat} of stats drawn as a
+    successful part of their base stat.
+    :param scale: np.array. Factor of the means, per item.
+    :param rng: np.random.Generator.
+    :return: dict of {stat: np.array}.
+    """
+    values = {stat: rng.poisson(mean * scale)
+              for stat, mean in means.items() if stat not in derived}
+    for stat, base in derived.items():
+        ratio = means[stat] / means[base] if means[base] else 0
+        values[stat] = rng.binomial(values[base], min(ratio, 1))
+    return values
+
+
+def create_match_stats(result, squads, rng):
+    """Returns stats of both teams, and of their players, in a match.
+
+    :param result: dict. As returned by create_results().
+    :param squads: dict. {team: (np.array of pids, np.array of
+    positions)}.
+    :param rng: np.random.Generator.
+    :return: tuple (teams stats, players stats, goalies stats), each
+    a dict of {stat: {item id: value}}.
+    """
+    teams = [result['Home team'], result['Away team']]
+    goals = [result['Home team score'], result['Away team score']]
+    team_stats = {stat: dict() for stat in team_stats_means}
+    player_stats = {stat: dict() for stat in player_stats_means
+                    if stat not in goalie_stats}
+    goalie = {stat: dict() for stat in goalie_stats}
+
+    possession = round(float(np.clip(rng.normal(50, 8), 25, 75)), 2)
+    for side, team in enumerate(teams):
+        pids, squad_positions = squads[team]
+
+        # lineup, and substitutes replacing some of it
+        on_pitch = np.concatenate([
+            rng.choice(np.flatnonzero(squad_positions == position), n,
+                       replace=False)
+            for position, n in lineup.items()])
+        bench = np.setdiff1d(np.flatnonzero(squad_positions != 'GK'),
+                             on_pitch)
+        subs_in = rng.choice(bench, n_subs, replace=False)
+        subs_out = rng.choice(on_pitch[1:], n_subs, replace=False)
+        played = np.concatenate([on_pitch, subs_in])
+        minutes = rng.integers(90, 98, len(played))
+        sub_minute = rng.integers(55, 90, n_subs)
+        minutes[np.isin(on_pitch, subs_out).nonzero()[0]] = sub_minute
+        minutes[len(on_pitch):] = minutes[0] - sub_minute
+
+        values = draw_stats({stat: mean for stat, mean in
+                             player_stats_means.items()
+                             if stat in player_stats},
+                            player_derived_stats, minutes / 76.96, rng)
+        values['Minutes'] = minutes
+        values['Appearances'] = np.ones(len(played), int)
+        values['Sub In'] = np.isin(played, subs_in).astype(int)
+        values['Sub Out'] = np.isin(played, subs_out).astype(int)
+        # goals and assists of the team's score
+        weights = np.array([scorer_weights[position] for position in
+                            squad_positions[played]]) * minutes
+        values['Goals'] = np.bincount(
+            rng.choice(len(played), goals[side], p=weights / weights.sum()),
+            minlength=len(played))
+        values['Penalty Goals'] = rng.binomial(values['Goals'], 0.1)
+        values['Assists'] = np.bincount(
+            rng.choice(len(played), rng.binomial(goals[side], 0.6),
+                       p=weights / weights.sum()), minlength=len(played))
+        played_pids = pids[played].tolist()
+        for stat, stat_values in values.items():
+            player_stats[stat].update(zip(played_pids, stat_values.tolist()))
+
+        # goalkeeper
+        conceded = goals[1 - side]
+        goalie_values = {'Coped Goals': conceded,
+                         'Stops': int(rng.poisson(1.3)),
+                         'Clean Net': int(conceded == 0),
+                         'Threat Denied by Goalkeeper': 0,
+                         'Goalie Mistake': int(rng.poisson(0.1)),
+                         'Penalties Coped': int(rng.poisson(0.1))}
+        for stat, value in goalie_values.items():
+            goalie[stat][played_pids[0]] = value
+
+        # team
+        team_values = draw_stats(team_stats_means, team_derived_stats,
+                                 np.ones(1), rng)
+        team_values['Goal'] = [goals[side]]
+        team_values['Penalty Goal'] = [int(values['Penalty Goals'].sum())]
+        team_values['Assists'] = [int(values['Assists'].sum())]
+        team_values['Ball Possession'] = [possession if side == 0 else
+                                          round(100 - possession, 2)]
+        for stat, value in team_values.items():
+            team_stats[stat][team] = float(value[0])
+
+    return team_stats, player_stats, goalie
+
+
+def create_dataset(n_seasons=1, n_teams=14, n_players=20, seed=0):
+    """Returns a synthetic league dataset, in the scraped data form.
+
+    Same arguments always give the same dataset.
+
+    :param n_seasons: int. Number of seasons, the last one is 19/20.
+    :param n_teams: int. Even number of teams.
+    :param n_players: int. Players per team.
+    :param seed: int. Random seed.
+    :return: dict with 'results' and 'players_info' (lists of dicts,
+    as scraped), 'team_stats' and 'player_stats' (lists of (data,
+    season, gameweek) tuples, as returned by
+    stats.stats_per_game_wrapper()).
+    """
+    rng = np.random.default_rng(seed)
+    teams = [f'Team {i:02d}' for i in range(n_teams)]
+    players = create_players(teams, n_players, rng)
+    results = create_results(teams, get_seasons(n_seasons), rng)
+
+    squads = dict()
+    for team in teams:
+        squad = [p for p in players if p['Team'] == team]
+        squads[team] = (np.array([p['pid'] for p in squad]),
+                        np.array([p['Position'] for p in squad]))
+
+    team_data = []
+    player_data = []
+    rounds = dict()
+    for result in results:
+        rounds.setdefault((result['Season'], result['Gameweek']),
+                          []).append(result)
+    for (season, gw), round_results in rounds.items():
+        team_stats = {stat: dict() for stat in team_stats_means}
+        player_stats = {stat: dict() for stat in player_stats_means}
+        for result in round_results:
+            match_stats = create_match_stats(result, squads, rng)
+            for stat, values in match_stats[0].items():
+                team_stats[stat].update(values)
+            for stats_dict in match_stats[1:]:
+                for stat, values in stats_dict.items():
+                    player_stats[stat].update(values)
+        team_data.append((team_stats, season, str(gw)))
+        player_data.append((player_stats, season, str(gw)))
+
+    return {'results': results, 'players_info': players,
+            'team_stats': team_data, 'player_stats': player_data}
+
+
+def stats_frame(data, id_col):
+    """Returns stats tuples as a DataFrame with scraped labels."""
+    frames = []
+    for stats_data, season, gw in data:
+        df = pd.DataFrame(stats_data).fillna(0)
+        df.index.name = id_col
+        frames.append(df.reset_index().assign(Season=season,
+                                              Gameweek=int(gw)))
+    return pd.concat(frames, ignore_index=True)
+
+
+def to_frames(dataset):
+    """Returns dataset as DataFrames of ipl_data.db tables.
+
+    :return: dict of {table name: DataFrame}.
+    """
+    frames = dict()
+    for item_type, key in (('team', 'team_stats'), ('player', 'player_stats')):
+        id_col = create_db.stats_id_cols[item_type]
+        df = stats_frame(dataset[key], id_col)
+        df.columns = [create_db.modify_column_name(col) for col in df.columns]
+        frames[create_db.stats_tables[item_type]] = df[
+            [id_col, 'season', 'gameweek'] +
+            [col for col in df.columns
+             if col not in [id_col, 'season', 'gameweek']]]
+
+    results_df = pd.DataFrame(dataset['results'])
+    results_df.columns = [create_db.modify_column_name(col).replace(
+        '_team_score', '_score') for col in results_df.columns]
+    frames['matches_results'] = results_df
+
+    info_df = pd.DataFrame(dataset['players_info'])
+    info_df['Date of birth'] = info_df['Date of birth'].astype(str)
+    info_df['Shirt number'] = info_df['Shirt number'].astype(int)
+    info_df.columns = [create_db.modify_column_name(col)
+                       for col in info_df.columns]
+    frames['players_info'] = info_df
+    return frames
+
+
+def write_db(dataset, db_path, pragmas=None):
+    """Creates a database of dataset, as create_db.main() does.
+
+    :param dataset: dict. As returned by create_dataset().
+    :param db_path: str. Path of the new database.
+    :param pragmas: dict of {pragma: value} of the write connection.
+    Default: db_writer.write_pragmas.
+    """
+    conn = db_writer.connect_writer(db_path, pragmas)
+    create_db.migrate(conn)
+    create_db.create_table(conn, create_db.create_results_query)
+    with conn:
+        create_db.insert_results(conn, dataset['results'])
+    create_db.insert_data_to_stats_tables(conn, dataset['player_stats'],
+                                          'player')
+    create_db.insert_data_to_stats_tables(conn, dataset['team_stats'], 'team')
+    create_db.insert_players_info(conn, dataset['players_info'])
+    create_db.clean_data(conn)
+    create_db.create_cumulative_tables(conn)
+    db_writer.close_writer(conn)
+
+
+def write_csvs(dataset, out_dir):
+    """Writes dataset to csv files, as main_data_collector.py does.
+
+    :param dataset: dict. As returned by create_dataset().
+    :param out_dir: str. Directory of the files.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    team_df = stats_frame(dataset['team_stats'], 'Team')
+    team_df.to_csv(os.path.join(out_dir, 'teams_stats_by_gw.csv'),
+                   index=False)
+    player_df = stats_frame(dataset['player_stats'], 'pid')
+    player_df.reset_index().to_csv(
+        os.path.join(out_dir, 'players_stats_by_gw.csv'), index=False)
+
+    info_df = pd.DataFrame(dataset['players_info'])[
+        ['Date of birth', 'Name', 'Position', 'Shirt number', 'Team', 'pid']]
+    info_df['Shirt number'] = info_df['Shirt number'].astype(float)
+    info_df['pid'] = info_df['pid'].astype(float)
+    info_df['0'] = None     # column left by scraping errors
+    info_df.reset_index().to_csv(os.path.join(out_dir, 'players_info.csv'),
+                                 index=False)
+    pd.DataFrame(dataset['results']).to_csv(
+        os.path.join(out_dir, 'matches_results.csv'), index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Create a synthetic league dataset.')
+    parser.add_argument('--seasons', type=int, default=1)
+    parser.add_argument('--teams', type=int, default=14)
+    parser.add_argument('--players', type=int, default=20,
+                        help='players per team')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db', help='path of a database to create')
+    parser.add_argument('--csv-dir', help='directory of csv files to write')
+    args = parser.parse_args()
+
+    dataset = create_dataset(args.seasons, args.teams, args.players,
+                             args.seed)
+    if args.db:
+        write_db(dataset, args.db)
+    if args.csv_dir:
+        write_csvs(dataset, args.csv_dir)
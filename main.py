@@ -1,54 +1,50 @@
 #! python3
 # main.py - main script of the app.
 
-import os
-
-import pandas as pd
-
 # Bokeh imports
 from bokeh.io import curdoc
-from bokeh.models.widgets import Tabs
+from bokeh.layouts import column
 
-from data_scraping.scripts.data_funcs import get_gw_match_result, get_opponent
-from data_scraping.scripts.create_db import create_connection
+from data_scraping.scripts import data_layer
+from data_scraping.scripts.data_funcs import get_rounds
+from scripts.rounds_slider import create_rounds_slider
+from scripts.lazy_tabs import lazy_tabs
 from scripts.basic_team_stats import basic_teams_stats_tab
 from scripts.attacks_origin import attacks_origin_tab
 from scripts.players_performances import players_performance_tab
-
-# Import data and create dataFrames
-data_dir = os.path.join(os.path.dirname(__file__),
-                        os.path.join('data_scraping', 'data'))
-# connect to database
-db_file_path = os.path.join(data_dir, 'ipl_data.db')
-conn = create_connection(db_file_path)
-
-team_stats_df = pd.read_sql_query("""SELECT * FROM teams_stats_by_gw""", conn)
-players_stats_df = pd.read_sql_query(
-    """SELECT * FROM PLAYERS_stats_by_gw""", conn)
-players_info_df = pd.read_sql_query("""SELECT * FROM players_info""", conn)
-results_df = pd.read_sql_query("""SELECT * FROM matches_results""", conn)
-
-# import data from csv files
-# team_stats_df = pd.read_csv(os.path.join(data_dir, 'teams_stats_by_gw.csv'))
-# players_stats_df = pd.read_csv(os.path.join(data_dir,
-#                                             'players_stats_by_gw.csv'))
-# players_info_df = pd.read_csv(os.path.join(data_dir, 'players_info.csv'))
-# results_df = pd.read_csv(os.path.join(data_dir, 'matches_results.csv'))
-
-team_stats_df['Match result'] = team_stats_df.apply(
-    get_gw_match_result, args=(results_df,), axis=1)
-team_stats_df['Opponent'] = team_stats_df.apply(
-    get_opponent, args=(results_df,), axis=1)
-
-
-# Creates tabs
-tab1 = basic_teams_stats_tab(team_stats_df)
-tab2 = attacks_origin_tab(team_stats_df)
-tab3 = players_performance_tab(players_info_df, players_stats_df, results_df)
-
-tabs = Tabs(tabs=[tab1, tab2, tab3])
-
-curdoc().add_root(tabs)
+from scripts.league_table import league_table_tab
+from scripts.players_similarity import players_similarity_tab
+
+# Get data - loaded once per server process and shared by sessions.
+data = data_layer.get_data()
+team_stats_df = data['team_stats']
+players_stats_df = data['players_stats']
+players_info_df = data['players_info']
+results_df = data['results']
+
+
+# Seasons/gameweeks filter, shared by all tabs
+rounds = get_rounds(team_stats_df)
+rounds_slider = create_rounds_slider(rounds)
+
+# Creates tabs - each one is built when first shown.
+tab_factories = [
+    ('Basic Teams Stats',
+     lambda: basic_teams_stats_tab(team_stats_df, rounds, rounds_slider)),
+    ('Attacks Origins',
+     lambda: attacks_origin_tab(team_stats_df, rounds, rounds_slider)),
+    ('Players Performances',
+     lambda: players_performance_tab(players_info_df, players_stats_df,
+                                     results_df, data['joined_players'],
+                                     rounds, rounds_slider)),
+    ('League Table', lambda: league_table_tab(data['standings'])),
+    ('Players Similarity',
+     lambda: players_similarity_tab(data['joined_players'],
+                                    data['similarity']))]
+
+tabs = lazy_tabs(tab_factories)
+
+curdoc().add_root(column(rounds_slider, tabs))
 
 
 
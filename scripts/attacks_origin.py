@@ -4,6 +4,10 @@
 
 from math import pi
 
+import numpy as np
+import pandas as pd
+
+from bokeh.core.properties import without_property_validation
 from bokeh.plotting import figure
 from bokeh.models import ColumnDataSource, Panel
 from bokeh.models.widgets import Select, Div
@@ -11,75 +15,102 @@ from bokeh.layouts import column, row
 from bokeh.palettes import Viridis
 from bokeh.transform import cumsum
 
-
-def attacks_origin_tab(team_stats_df):
-    """Tab with attacks origins plots."""
-
-    def create_ds_for_attacks_origin(team, with_shot=False,
-                                     opp_attacks=False):
-        """Collects stats about attack origins. Returns DataFrame.
+from data_scraping.scripts.data_funcs import get_rounds, get_round_codes, \
+    window_sums
+from data_scraping.scripts.profiling import traced
+from scripts.rounds_slider import get_window
+
+# ordered as the attacks cube's (with_shot, origin) axes
+attacks_cols = ['left_flank_attacks', 'right_flank_attacks',
+                'center_flank_attacks', 'left_flank_attacks_with_shot',
+                'right_flank_attacks_with_shot',
+                'center_flank_attacks_with_shot']
+origins = ['Left Field', 'Right Field', 'Center']
+
+
+def create_attacks_cube(team_stats_df, rounds):
+    """Returns attacks per round, team, side, shot and origin.
+
+    :param team_stats_df: pd.DataFrame with 'team', 'Opponent',
+    'season', 'gameweek' and attacks_cols columns.
+    :param rounds: list of (season, gameweek) tuples, see
+    data_funcs.get_rounds().
+    :return: tuple (teams, cube). teams is a sorted list of teams,
+    cube a np.array of shape (rounds, teams, 2, 2, 3): side (attacks
+    of the team, attacks against it), attacks (all, ended with a shot)
+    and origin (as in origins).
+    """
+    teams = sorted(team_stats_df['team'].unique())
+    cube = np.zeros((len(rounds), len(teams), 2, 2, len(origins)))
+    round_codes = get_round_codes(team_stats_df, rounds)
+    values = team_stats_df[attacks_cols].to_numpy(dtype=float).reshape(
+        -1, 2, len(origins))
+    for side, col in enumerate(['team', 'Opponent']):
+        team_codes = pd.Index(teams).get_indexer(team_stats_df[col])
+        rows = (round_codes >= 0) & (team_codes >= 0)
+        np.add.at(cube, (round_codes[rows], team_codes[rows], side),
+                  values[rows])
+    return teams, cube
+
+
+def get_origin_shares(attacks):
+    """Returns pie angles and percentages of attacks origins.
+
+    :param attacks: np.array with origins on the last axis, e.g. a
+    window's sums of the attacks cube, or the cube itself for the
+    shares of every round.
+    :return: tuple of np.arrays (angles in radians, percentages), of
+    attacks' shape. Zero where there are no attacks.
+    """
+    totals = attacks.sum(axis=-1, keepdims=True)
+    shares = np.divide(attacks, totals, out=np.zeros_like(attacks),
+                       where=totals > 0)
+    return shares * 2 * pi, shares * 100
+
+
+@traced('tab.attacks_origin')
+def attacks_origin_tab(team_stats_df, rounds=None, rounds_slider=None):
+    """Tab with attacks origins plots.
+
+    :param rounds: list of (season, gameweek) tuples. Default: rounds
+    of team_stats_df.
+    :param rounds_slider: RangeSlider of rounds, see
+    rounds_slider.create_rounds_slider(). Attacks are summed over the
+    selected rounds.
+    """
+
+    def get_sources_data(team, opp_attacks=False):
+        """Returns data dicts for the pie chart and bars sources.
 
         :param team: str.
-        :param with_shot: bool. If True, collects stats about attacks
-        ended with a shot.
         :param opp_attacks: bool. If True, collects stats of attacks
         against the given team.
-        :return: pd.DataFrame. Number of attacks segmented by origin
-        (left, right, center).
         """
-
-        if opp_attacks:
-            col_of_interest = 'Opponent'
-        else:
-            col_of_interest = 'team'
-
-        df = team_stats_df.groupby(by=col_of_interest).sum()
-        df.reset_index(inplace=True)
-
-        cols = {'total': ['left_flank_attacks',
-                          'right_flank_attacks',
-                          'center_flank_attacks'],
-                'with_shot': ['left_flank_attacks_with_shot',
-                              'right_flank_attacks_with_shot',
-                              'center_flank_attacks_with_shot']}
-        cols_map = {'left_flank_attacks': 'Left Field',
-                    'right_flank_attacks': 'Right Field',
-                    'center_flank_attacks': 'Center',
-                    'left_flank_attacks_with_shot': 'Left Field',
-                    'right_flank_attacks_with_shot': 'Right Field',
-                    'center_flank_attacks_with_shot': 'Center'}
-        if with_shot:
-            data = df[df[col_of_interest] == team][
-                cols['with_shot']].reset_index(drop=True)
-        else:
-            data = df[df[col_of_interest] == team][cols['total']].reset_index(
-                drop=True)
-
-        data.rename(mapper=cols_map, axis=1, inplace=True)
-        ds = data.transpose().rename(columns={0: 'value'})
-        ds['angle'] = ds['value'] / ds['value'].sum() * 2 * pi
-        ds['color'] = Viridis[len(ds)]
-        return ds
-
-    def plot_attacks_by_origin(team, opp_attacks=False):
+        index = (team_index[team], int(opp_attacks))
+        sums, angles, percents = (state['sums'][index],
+                                  state['angles'][index],
+                                  state['percents'][index])
+        return tuple({'index': origins, 'value': sums[with_shot],
+                      'angle': angles[with_shot],
+                      'percent': percents[with_shot], 'color': colors}
+                     for with_shot in (0, 1))
+
+    @traced('tab.attacks_origin.plot')
+    def plot_attacks_by_origin(source_pc, source):
         """Plots data of attacks segmented by origin of attack.
 
         Total num of attacks in a pie chart. Attacks ended with a shot
         in bars.
 
-        :param team: str.
-        :param opp_attacks: bool. If True, collects stats of attacks
-        against the given team.
+        :param source_pc: ColumnDataSource. Total attacks data.
+        :param source: ColumnDataSource. Attacks ended with a shot data.
         """
         # Plot attack in pie chart
-        data_pc = create_ds_for_attacks_origin(team, with_shot=False,
-                                               opp_attacks=opp_attacks)
-        #         print(data_pc.head(2))
-        source_pc = ColumnDataSource(data_pc)
 
         pc = figure(plot_height=300, plot_width=300, title="Attacks Origins",
                     toolbar_location=None, tools="hover",
-                    tooltips="@index: @value", x_range=(-0.5, 1))
+                    tooltips="@index: @value (@percent{0.0}%)",
+                    x_range=(-0.5, 1))
 
         pc.wedge(x=0, y=1, radius=0.4,
                  start_angle=cumsum('angle', include_zero=True),
@@ -91,15 +122,13 @@ def attacks_origin_tab(team_stats_df):
         pc.grid.grid_line_color = None
 
         # Plot attacks ended with a shot
-        data_with_shot = create_ds_for_attacks_origin(team, with_shot=True,
-                                                      opp_attacks=opp_attacks)
         attack_origin = ['Left Field', 'Center', 'Right Field']
-        source = ColumnDataSource(data_with_shot)
 
         p = figure(plot_height=300, plot_width=300,
                    title="Attacks Ended With a Shot",
                    toolbar_location=None, tools="hover",
-                   tooltips="@index: @value", x_range=attack_origin)
+                   tooltips="@index: @value (@percent{0.0}%)",
+                   x_range=attack_origin)
 
         p.vbar(x='index', top='value', fill_color='color', width=0.5,
                source=source)
@@ -112,15 +141,50 @@ def attacks_origin_tab(team_stats_df):
 
         return pc, p
 
+    def set_window(window):
+        """Sum attacks over a window of rounds, for all teams.
+
+        Sums of the previous window are updated with the rounds that
+        entered or left it.
+        """
+        state['sums'] = window_sums(cube, window, state.get('window'),
+                                    state.get('sums'))
+        state['angles'], state['percents'] = get_origin_shares(
+            state['sums'])
+        state['window'] = window
+
+    @traced('callback.attacks_origin.team')
+    @without_property_validation
     def update_team(atrrname, old, new):
         team = select_team.value
-        p1, p2 = plot_attacks_by_origin(team)
-        p3, p4 = plot_attacks_by_origin(team, opp_attacks=True)
-        layout.children[1::2] = [row(p1, p2), row(p3, p4)]
+        for opp_attacks in (False, True):
+            data_pc, data_with_shot = get_sources_data(team, opp_attacks)
+            sources[opp_attacks][0].data = data_pc
+            sources[opp_attacks][1].data = data_with_shot
+
+    @traced('callback.attacks_origin.rounds')
+    def update_rounds(attrname, old, new):
+        """Update plots data after rounds window changes."""
+        set_window(get_window(rounds_slider, rounds))
+        update_team(attrname, old, new)
+
+    # Attacks per round, of teams and of their opponents, summed over
+    # the selected rounds.
+    if rounds is None:
+        rounds = get_rounds(team_stats_df)
+    teams, cube = create_attacks_cube(team_stats_df, rounds)
+    team_index = {team: i for i, team in enumerate(teams)}
+    colors = Viridis[len(origins)]
+    state = dict()
+    set_window(get_window(rounds_slider, rounds))
+    if rounds_slider is not None:
+        rounds_slider.on_change('value_throttled', update_rounds)
 
     # Select-Team widget
-    teams = sorted(list(team_stats_df['team'].unique()))
-    select_team = Select(title='Select a Team', value='Beitar Jerusalem',
+    default_team = 'Beitar Jerusalem'
+    if default_team not in teams:
+        default_team = teams[0]
+    select_team = Select(title='Select a Team', value=default_team,
                          options=teams)
 
     team = select_team.value
@@ -131,8 +195,11 @@ def attacks_origin_tab(team_stats_df):
                              style={'font-size': '170%', 'color': 'grey'})
 
     # Arrange layout
-    p1, p2 = plot_attacks_by_origin(team)
-    p3, p4 = plot_attacks_by_origin(team, opp_attacks=True)
+    sources = {opp_attacks: [ColumnDataSource(data) for data in
+                             get_sources_data(team, opp_attacks)]
+               for opp_attacks in (False, True)}
+    p1, p2 = plot_attacks_by_origin(*sources[False])
+    p3, p4 = plot_attacks_by_origin(*sources[True])
     layout = column(row(select_team), row(p1, p2),
                     counter_attack_sep, row(p3, p4))
     tab = Panel(child=layout, title='Attacks Origins')
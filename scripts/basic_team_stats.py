@@ -2,6 +2,11 @@
 # basic_team_stats.py - create tab for bokeh app
 # with basic teams statistics.
 
+from functools import lru_cache
+
+import pandas as pd
+
+from bokeh.core.properties import without_property_validation
 from bokeh.plotting import figure
 from bokeh.models import ColumnDataSource, HoverTool, Panel
 from bokeh.models.ranges import FactorRange
@@ -11,14 +16,71 @@ from bokeh.models import Legend
 from bokeh.layouts import column, row, widgetbox
 from bokeh.palettes import Spectral4
 
-
-def basic_teams_stats_tab(teams_stats_df):
-    """Tab with teams stats."""
-
+from data_scraping.scripts.data_funcs import get_rounds, \
+    round_partial_sums, window_sums
+from data_scraping.scripts.profiling import traced
+from scripts.rounds_slider import get_window
+
+
+def teams_partial_sums(teams_stats_df, rounds):
+    """Returns sums of all stats per round, team and match result.
+
+    :param teams_stats_df: pd.DataFrame. Teams stats with 'Match
+    result' column.
+    :param rounds: list of (season, gameweek) tuples.
+    :return: tuple (groups, sums, columns), see
+    data_funcs.round_partial_sums(). columns are 'games' (number of
+    matches) and the stats.
+    """
+    stat_cols = list(teams_stats_df.select_dtypes('number').columns)
+    df = teams_stats_df.assign(games=1)
+    groups, sums = round_partial_sums(df, ['team', 'Match result'],
+                                      ['games'] + stat_cols, rounds)
+    return groups, sums, ['games'] + stat_cols
+
+
+def aggregate_teams_stats(sums_df):
+    """Returns aggregates of all stats per team and per match result.
+
+    :param sums_df: pd.DataFrame. Sums of 'games' and stats, indexed
+    by (team, Match result), see teams_partial_sums().
+    :return: dict of the form {aggfunc: {'total': DataFrame indexed
+    by team, 'by_result': DataFrame indexed by team with (stat,
+    result) columns}} for aggfunc in ('mean', 'sum'). Aggregates of
+    teams without matches are NaN.
+    """
+    sums_df = sums_df.where(sums_df['games'] > 0, axis=0)
+    games = sums_df.pop('games')
+    total = sums_df.groupby(level='team', observed=True).sum(min_count=1)
+    total_games = games.groupby(level='team', observed=True).sum()
+    has_result = sums_df.index.get_level_values('Match result').notna()
+
+    aggregates = {'sum': (total, sums_df),
+                  'mean': (total.div(total_games, axis=0),
+                           sums_df.div(games, axis=0))}
+    return {aggfunc: {'total': total,
+                      'by_result': by_result[has_result].unstack(
+                          'Match result')}
+            for aggfunc, (total, by_result) in aggregates.items()}
+
+
+@traced('tab.basic_teams_stats')
+def basic_teams_stats_tab(teams_stats_df, rounds=None, rounds_slider=None):
+    """Tab with teams stats.
+
+    :param rounds: list of (season, gameweek) tuples. Default: rounds
+    of teams_stats_df.
+    :param rounds_slider: RangeSlider of rounds, see
+    rounds_slider.create_rounds_slider(). Stats are aggregated over
+    the selected rounds.
+    """
+
+    @lru_cache(maxsize=None)
     def create_data_source(comparison_stat, aggfunc):
         """Returns a pivoted table by teams and match result (w/d/l).
 
-        Values are index of comparison_stat.
+        Values are index of comparison_stat. Sliced from the
+        aggregates computed once on tab creation.
 
         :param comparison_stat: str. Statistic to show (goals, passes,
         etc.).
@@ -26,44 +88,30 @@ def basic_teams_stats_tab(teams_stats_df):
          or 'sum').
         """
 
-        def get_team_indexed_stat(team_row, stat, aggfunc):
-            """Returns aggregated team's stat.
-
-            :param team_row: pd.Series. A row from teams stat table.
-            :param stat: str. Statistic to calculate (goal, passes,
-            etc.)
-            :param aggfunc: str. Aggregate function to calculate by
-            ('mean' or 'sum')
-            """
+        df = aggregates[aggfunc]['by_result'][comparison_stat].copy()
+        df['Total'] = aggregates[aggfunc]['total'][comparison_stat]
 
-            if aggfunc == 'mean':
-                df = teams_stats_df.groupby(by='team').mean()
-            elif aggfunc == 'sum':
-                df = teams_stats_df.groupby(by='team').sum()
-            return df.loc[team_row.name, stat]
+        return df.sort_values(by='Total', ascending=False)
 
-        df = teams_stats_df.pivot_table(
-            index='team',
-            columns='Match result',
-            values=comparison_stat,
-            aggfunc=aggfunc)
+    def get_source_data(comparison_stat, agg_func):
+        """Returns data dict for the plots' ColumnDataSource.
 
-        df['Total'] = df.apply(get_team_indexed_stat,
-                               args=[comparison_stat, aggfunc], axis=1)
+        :param comparison_stat: str. Statistic to plot.
+        :param agg_func: int. Index of 'mean' or 'sum'.
+        """
 
-        return df.sort_values(by='Total', ascending=False)
+        map_agg_func = ('mean', 'sum')
+        data = create_data_source(comparison_stat, map_agg_func[agg_func])
+        return ColumnDataSource.from_df(data)
 
-    def plot_team_stat(comparison_stat, agg_func):
+    @traced('tab.basic_teams_stats.plot')
+    def plot_team_stat(source):
         """Creates figures with bars plots of teams stats.
 
-        :param comparison_stat: str. Statistic to plot.
-        :param agg_func: str. 'mean' or 'sum'.
+        :param source: ColumnDataSource. Plotted data.
         :return: bokeh figures.
         """
 
-        map_agg_func = ('mean', 'sum')
-        data = create_data_source(comparison_stat, map_agg_func[agg_func])
-        source = ColumnDataSource(data=data)
         teams = list(source.data['team'])
 
         # Plot avg stat per game
@@ -109,14 +157,50 @@ def basic_teams_stats_tab(teams_stats_df):
 
         return p_1, p_2
 
+    def set_window(window):
+        """Aggregate stats over a window of rounds.
+
+        Sums of the previous window are updated with the rounds that
+        entered or left it.
+        """
+        prev = state.get('window')
+        state['sums'] = window_sums(partial_sums, window, prev,
+                                    state.get('sums'))
+        state['window'] = window
+        aggregates.clear()
+        aggregates.update(aggregate_teams_stats(
+            pd.DataFrame(state['sums'], index=groups, columns=sums_cols)))
+        create_data_source.cache_clear()
+
     # Update plots on changes
 
+    @traced('callback.basic_teams_stats.update')
+    @without_property_validation
     def update(attrname, old, new):
-        """Update plots after widgets changes."""
+        """Update plots data after widgets changes."""
         stat = select_stat.value
         agg_func = choose_agg_func.active
-        p1, p2 = plot_team_stat(stat, agg_func)
-        layout.children[1:] = [p1, p2]
+        source.data = get_source_data(stat, agg_func)
+        teams = list(source.data['team'])
+        p1.x_range.factors = teams
+        p2.x_range.factors = teams
+
+    @traced('callback.basic_teams_stats.rounds')
+    def update_rounds(attrname, old, new):
+        """Update plots data after rounds window changes."""
+        set_window(get_window(rounds_slider, rounds))
+        update(attrname, old, new)
+
+    # Stats sums per round, aggregated over the selected rounds
+    if rounds is None:
+        rounds = get_rounds(teams_stats_df)
+    groups, partial_sums, sums_cols = teams_partial_sums(teams_stats_df,
+                                                         rounds)
+    state = dict()
+    aggregates = dict()
+    set_window(get_window(rounds_slider, rounds))
+    if rounds_slider is not None:
+        rounds_slider.on_change('value_throttled', update_rounds)
 
     # Widgets
     select_stat = Select(title="Select a Stat for Comparison:", value="goal",
@@ -134,7 +218,9 @@ def basic_teams_stats_tab(teams_stats_df):
     agg_func_state = choose_agg_func.active
 
     # Arrange layout
-    p1, p2 = plot_team_stat(comparison_stat, agg_func_state)
+    source = ColumnDataSource(data=get_source_data(comparison_stat,
+                                                   agg_func_state))
+    p1, p2 = plot_team_stat(source)
     layout = column(row(widgets), p1, p2)
     tab = Panel(child=layout, title='Basic Teams Stats')
 
@@ -0,0 +1,42 @@
+#! python 3
+# lazy_tabs.py - tabs of the bokeh app that are built on first view.
+
+from bokeh.models import Panel
+from bokeh.models.widgets import Tabs, Div
+
+from data_scraping.scripts.profiling import traced
+
+
+def lazy_tabs(tab_factories, active=0):
+    """Returns Tabs whose panels are built when first shown.
+
+    Only the active tab is built right away. The others show a
+    placeholder until they are selected, then the built panel's
+    content replaces it for the rest of the session.
+
+    :param tab_factories: list of (title, factory) tuples. factory is
+    a function with no arguments that returns a Panel.
+    :param active: int. Index of the tab shown first.
+    """
+
+    def build(index):
+        """Build a tab, unless it was already built."""
+        if index in built:
+            return
+        built.add(index)
+        _, factory = tab_factories[index]
+        panels[index].child = factory().child
+
+    @traced('callback.tabs.active')
+    def update(attrname, old, new):
+        build(new)
+
+    panels = [Panel(child=Div(text='Loading...'), title=title)
+              for title, _ in tab_factories]
+    built = set()
+    build(active)
+
+    tabs = Tabs(tabs=panels, active=active)
+    tabs.on_change('active', update)
+
+    return tabs
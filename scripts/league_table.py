@@ -0,0 +1,74 @@
+#! python 3
+# league_table.py - create tab for bokeh app
+# with the league table after a selected gameweek.
+
+from bokeh.core.properties import without_property_validation
+from bokeh.models import ColumnDataSource, Panel
+from bokeh.models.widgets import DataTable, TableColumn, Slider
+from bokeh.layouts import column
+
+from data_scraping.scripts.standings import get_round_slices
+from data_scraping.scripts.profiling import traced
+
+# (field, title, width) of the table columns
+table_cols = [('rank', '#', 30), ('team', 'Team', 170), ('played', 'P', 40),
+              ('won', 'W', 40), ('drawn', 'D', 40), ('lost', 'L', 40),
+              ('goals_for', 'GF', 40), ('goals_against', 'GA', 40),
+              ('goal_diff', 'GD', 40), ('points', 'Pts', 50),
+              ('home_played', 'Home P', 60), ('home_points', 'Home Pts', 70),
+              ('away_played', 'Away P', 60), ('away_points', 'Away Pts', 70),
+              ('form', 'Form', 80)]
+
+
+@traced('tab.league_table')
+def league_table_tab(standings_df):
+    """Tab with the league table after a gameweek.
+
+    Tables of all gameweeks are prepared when the tab is created, so
+    moving the gameweek slider only looks one up.
+
+    :param standings_df: pd.DataFrame. As returned by
+    standings.compute_standings().
+    """
+
+    def get_title(index):
+        season, gw = rounds[index]
+        return f'League table after: {season} GW {gw}'
+
+    @traced('callback.league_table.gameweek')
+    @without_property_validation
+    def update(attrname, old, new):
+        index = min(int(round(gameweek_slider.value)), len(rounds)) - 1
+        source.data = tables_data[rounds[index]]
+        gameweek_slider.title = get_title(index)
+
+    # Data of the table after every round - views of the columns
+    columns = {field: standings_df[field].to_numpy()
+               for field, _, _ in table_cols}
+    columns['team'] = standings_df['team'].astype(str).to_numpy()
+    tables_data = {round_: {field: values[rows]
+                            for field, values in columns.items()}
+                   for round_, rows in get_round_slices(standings_df).items()}
+    rounds = list(tables_data)
+    if not rounds:
+        return Panel(child=column(), title='League Table')
+    n_teams = max(len(data['team']) for data in tables_data.values())
+
+    # Gameweek slider, on the last round
+    gameweek_slider = Slider(start=1, end=max(len(rounds), 2), step=1,
+                             value=len(rounds), width=700,
+                             title=get_title(len(rounds) - 1))
+    gameweek_slider.on_change('value', update)
+
+    source = ColumnDataSource(data=tables_data[rounds[-1]])
+    table = DataTable(source=source, index_position=None,
+                      width=sum(width for _, _, width in table_cols),
+                      height=(n_teams + 1) * 25 + 5,
+                      columns=[TableColumn(field=field, title=title,
+                                           width=width)
+                               for field, title, width in table_cols])
+
+    layout = column(gameweek_slider, table)
+    tab = Panel(child=layout, title='League Table')
+
+    return tab
@@ -2,119 +2,328 @@
 # players_performances.py - create tab for bokeh app
 # with players performances data.
 
+from functools import lru_cache
+
 import pandas as pd
 import numpy as np
 
+from bokeh.core.properties import without_property_validation
+from bokeh.events import RangesUpdate
 from bokeh.plotting import figure
-from bokeh.models import ColumnDataSource, HoverTool, Panel
+from bokeh.models import ColumnDataSource, HoverTool, Panel, \
+    LinearColorMapper
 from bokeh.models.widgets import Select, CheckboxButtonGroup
 from bokeh.layouts import row, widgetbox
-from bokeh.palettes import Category20_20
-
-from data_scraping.scripts.data_funcs import get_opponent, get_gw_match_result
-
-
-def players_performance_tab(player_info_df, player_stats_df, results_df):
-
-    def create_ds(team, positions):
-        """Returns DataFrame filtered team and positions.
-
-        :param team: str. If 'None' is passed, all teams are selected.
-        :param positions: list of str.
-        :returns: DataFrame.
+from bokeh.palettes import Category20_20, Viridis256
+
+from data_scraping.scripts.data_funcs import join_players_data, \
+    get_rounds, get_round_codes
+from data_scraping.scripts.profiling import traced
+from scripts.rounds_slider import get_window
+
+
+@traced('tab.players_performance')
+def players_performance_tab(player_info_df, player_stats_df, results_df,
+                            joined_player_df=None, rounds=None,
+                            rounds_slider=None):
+    """Tab with players performances scatter plot.
+
+    :param joined_player_df: pd.DataFrame. Result of
+    join_players_data(), computed from the other frames if not given.
+    :param rounds: list of (season, gameweek) tuples. Default: rounds
+    of joined_player_df.
+    :param rounds_slider: RangeSlider of rounds, see
+    rounds_slider.create_rounds_slider(). Only performances of the
+    selected rounds are plotted.
+    """
+
+    # Default Values
+    SIZE = 8
+    SIZES = [s for s in range(5, 38, 4)]
+    COLOR = 'blueviolet'
+    MAX_COLORS = len(Category20_20)
+    MAX_POINTS = 5000   # above it, density tiles are plotted instead
+    DENSITY_BINS = 60
+
+    def get_column(col):
+        """Returns values of a column of joined_player_df as an array."""
+        if col not in columns_values:
+            columns_values[col] = joined_player_df[col].to_numpy()
+        return columns_values[col]
+
+    @lru_cache(maxsize=None)
+    def query_rows(team, positions):
+        """Returns positions of rows of given team and positions.
+
+        :param team: str. If 'All' is passed, all teams are selected.
+        :param positions: tuple of str.
+        :returns: np.array, sorted.
         """
+        rows = [rows_index['position'][pos] for pos in positions
+                if pos in rows_index['position']]
+        rows = np.sort(np.concatenate(rows)) if rows else np.array([], int)
+        if team != 'All':
+            rows = np.intersect1d(rows, rows_index['team'].get(team, []),
+                                  assume_unique=True)
+        return rows
+
+    @lru_cache(maxsize=None)
+    def get_groups(col, team, positions, n_groups):
+        """Returns groups of a column's values, in given filter.
+
+        Quantile bins if the column has more than n_groups distinct
+        values, else the distinct values.
+
+        :returns: tuple ('bins', bin edges) or ('values', sorted
+        distinct values). Missing values are left out.
+        """
+        values = get_column(col)[query_rows(team, positions)]
+        values = values[pd.notna(values)]
+        distinct = np.unique(values)
+        if len(distinct) > n_groups:
+            _, edges = pd.qcut(values, n_groups, retbins=True,
+                               duplicates='drop')
+            return 'bins', edges
+        return 'values', distinct
+
+    def get_group_codes(col, team, positions, n_groups):
+        """Returns group index of each row in given filter, -1 for
+        missing values."""
+        values = get_column(col)[query_rows(team, positions)]
+        kind, groups = get_groups(col, team, positions, n_groups)
+        valid = pd.notna(values)
+        codes = np.full(len(values), -1)
+        if kind == 'bins':
+            codes[valid] = np.clip(np.searchsorted(groups, values[valid]) - 1,
+                                   0, None)
+        else:
+            codes[valid] = np.searchsorted(groups, values[valid])
+        return codes
 
-        # Default Values
-        SIZE = 8
-        SIZES = [s for s in range(5, 38, 4)]
-        COLOR = 'blueviolet'
-        MAX_COLORS = len(Category20_20)
+    def get_view_rows(team, positions, bounds=None):
+        """Returns rows of given filter in the selected rounds and
+        inside the plot's viewport.
 
-        if team == 'All':
-            ds = pd.DataFrame(joined_player_df[
-                                  joined_player_df['position'].isin(
-                                      positions)])
-        else:
-            ds = pd.DataFrame(joined_player_df[
-                                  (joined_player_df['position'].isin(
-                                      positions)) &
-                                  (joined_player_df['team'] == team)])
+        :param bounds: tuple (x0, x1, y0, y1) of the viewport, None
+        for all rows of the filter.
+        :returns: tuple of (rows positions, mask of the filter's rows).
+        """
+        rows = query_rows(team, positions)
+        first, last = get_window(rounds_slider, rounds)
+        mask = np.ones(len(rows), bool)
+        if (first, last) != (0, len(rounds) - 1):
+            rows_rounds = rounds_codes[rows]
+            mask &= (rows_rounds >= first) & (rows_rounds <= last)
+        if bounds is not None:
+            x0, x1, y0, y1 = bounds
+            xs = get_column(x.value)[rows]
+            ys = get_column(y.value)[rows]
+            mask &= (xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)
+        return rows[mask], mask
+
+    def create_ds(team, positions, rows, mask):
+        """Returns data of rows filtered by team and positions.
+
+        Only columns of plotted stats are returned, named 'x', 'y',
+        'size_value' and 'color_value', plus hover info, 'Size' and
+        'Color'. Sizes and colors groups are of the whole filter, not
+        only the given rows.
+
+        :param team: str. If 'All' is passed, all teams are selected.
+        :param positions: tuple of str.
+        :param rows: np.array. Rows positions, see get_view_rows().
+        :param mask: mask of the filter's rows, see get_view_rows().
+        :returns: dict of column arrays.
+        """
+        ds = {col: get_column(col)[rows]
+              for col in ['name', 'team', 'Opponent']}
+        ds['x'] = get_column(x.value)[rows]
+        ds['y'] = get_column(y.value)[rows]
 
         # Add sizes
         if size.value != 'None':
-            if len(ds[size.value].unique()) > len(SIZES):
-                groups = pd.qcut(ds[size.value].values,
-                                 len(SIZES), duplicates='drop')
-            else:
-                groups = pd.Categorical(ds[size.value].values)
-
-            ds['Size'] = np.array([SIZES[x] for x in groups.codes])
+            ds['size_value'] = get_column(size.value)[rows]
+            codes = get_group_codes(size.value, team, positions, len(SIZES))
+            ds['Size'] = np.array(SIZES)[codes[mask]]
 
         else:
-            ds['Size'] = SIZE
+            ds['Size'] = np.full(len(rows), SIZE)
 
         # Add colors
         if color.value != 'None':
-            if len(ds[color.value].unique()) > MAX_COLORS:
-                groups = pd.qcut(ds[color.value].values,
-                                 MAX_COLORS, duplicates='drop')
-            else:
-                groups = pd.Categorical(ds[color.value].values)
-
-            ds['Color'] = np.array([Category20_20[x] for x in groups.codes])
+            ds['color_value'] = get_column(color.value)[rows]
+            codes = get_group_codes(color.value, team, positions,
+                                    MAX_COLORS)
+            ds['Color'] = np.array(Category20_20)[codes[mask]]
 
         else:
-            ds['Color'] = COLOR
+            ds['Color'] = np.full(len(rows), COLOR)
 
         return ds
 
-    def plot_stats():
-        """Creates and returns a figure."""
+    def create_density_ds(rows, bounds=None):
+        """Returns density tiles of rows' x and y values.
+
+        :param rows: np.array. Rows positions.
+        :param bounds: tuple (x0, x1, y0, y1) of the tiled area, the
+        extent of the values if None.
+        :returns: dict of column arrays of non empty tiles: 'x', 'y'
+        (centers), 'width', 'height' and 'counts'.
+        """
+        xs = get_column(x.value)[rows]
+        ys = get_column(y.value)[rows]
+        if bounds is None:
+            bounds = (np.nanmin(xs), np.nanmax(xs),
+                      np.nanmin(ys), np.nanmax(ys))
+        x0, x1, y0, y1 = bounds
+        if x1 <= x0:
+            x0, x1 = x0 - 0.5, x1 + 0.5
+        if y1 <= y0:
+            y0, y1 = y0 - 0.5, y1 + 0.5
+
+        counts, x_edges, y_edges = np.histogram2d(
+            xs, ys, bins=DENSITY_BINS, range=[[x0, x1], [y0, y1]])
+        i, j = np.nonzero(counts)
+        width = x_edges[1] - x_edges[0]
+        height = y_edges[1] - y_edges[0]
+        return {'x': x_edges[i] + width / 2,
+                'y': y_edges[j] + height / 2,
+                'width': np.full(len(i), width),
+                'height': np.full(len(i), height),
+                'counts': counts[i, j].astype(int)}
+
+    def get_filter():
+        """Returns selected team and positions."""
+        return (select_team.value,
+                tuple(positions[i] for i in select_position.active))
+
+    def get_source_data(bounds=None):
+        """Returns data dicts of the plot's points and density sources.
+
+        Points are returned if there are at most MAX_POINTS rows in
+        the viewport, else density tiles, and the other dict is empty.
+
+        :param bounds: tuple (x0, x1, y0, y1) of the viewport, None
+        for all rows of the filter.
+        :returns: tuple (points data, density data, number of rows).
+        """
+        team, pos = get_filter()
+        rows, mask = get_view_rows(team, pos, bounds)
+        if len(rows) > MAX_POINTS:
+            points_ds = {col: [] for col in ['name', 'team', 'Opponent', 'x',
+                                             'y', 'Size', 'Color']}
+            return points_ds, create_density_ds(rows, bounds), len(rows)
+
+        density_ds = {col: [] for col in ['x', 'y', 'width', 'height',
+                                          'counts']}
+        return create_ds(team, pos, rows, mask), density_ds, len(rows)
+
+    def get_title(n_rows=0):
+        """Returns plot title, noting if density tiles are plotted."""
+        title = f'{x.value} vs {y.value}'
+        if n_rows > MAX_POINTS:
+            title += f' - density of {n_rows} points, zoom in for details'
+        return title
+
+    def get_tooltips():
+        """Returns hover tooltips of plotted stats."""
+
+        tooltips = [('Player', '@name'),
+                    ('Team', '@team'),
+                    (f'{x.value}', '@x'),
+                    (f'{y.value}', '@y'),
+                    (f'Opponent', f'@Opponent')]
+
+        if size.value != 'None':
+            tooltips.append((f'{size.value}', '@size_value'))
+        if color.value != 'None':
+            tooltips.append((f'{color.value}', '@color_value'))
+        return tooltips
+
+    @traced('tab.players_performance.plot')
+    def plot_stats(source, density_source):
+        """Creates and returns a figure and its hover tool.
 
-        pos = [positions[i] for i in select_position.active]
-        team = select_team.value
-        ds = create_ds(team, pos)
-        source = ColumnDataSource(ds)
+        :param source: ColumnDataSource. Plotted points.
+        :param density_source: ColumnDataSource. Plotted density tiles.
+        """
 
         p = figure(plot_height=600, plot_width=800,
-                   title=f'{x.value} vs {y.value}',
+                   title=get_title(n_rows),
                    tools='pan,box_zoom,reset')
 
-        p.circle(x=x.value, y=y.value, size='Size', color='Color',
-                 alpha=0.5, source=source, hover_color='navy')
-
-        hover = HoverTool(tooltips=[('Player', '@name'),
-                                    ('Team', '@team'),
-                                    (f'{x.value}', f'@{{{x.value}}}'),
-                                    (f'{y.value}', f'@{{{y.value}}}'),
-                                    (f'Opponent', f'@Opponent')])
+        tiles = p.rect(x='x', y='y', width='width', height='height',
+                       fill_color={'field': 'counts',
+                                   'transform': density_mapper},
+                       line_color=None, source=density_source)
+        points = p.circle(x='x', y='y', size='Size', color='Color',
+                          alpha=0.5, source=source, hover_color='navy')
 
-        if size.value != 'None':
-            hover.tooltips.append((f'{size.value}', f'@{{{size.value}}}'))
-        if color.value != 'None':
-            hover.tooltips.append((f'{color.value}', f'@{{{color.value}}}'))
+        hover = HoverTool(tooltips=get_tooltips(), renderers=[points])
         hover.point_policy = 'follow_mouse'
 
-        p.add_tools(hover)
+        p.add_tools(hover, HoverTool(tooltips=[('Performances', '@counts')],
+                                     renderers=[tiles]))
         p.xaxis.axis_label = x.value
         p.yaxis.axis_label = y.value
 
-        return p
+        return p, hover
 
+    # data was built from validated frames - skip bokeh's per element
+    # validation of the new columns.
+    @without_property_validation
+    def refresh():
+        """Update plotted points or density tiles of the viewport."""
+        source.data, density_source.data, n = get_source_data(view['bounds'])
+        if n > MAX_POINTS:
+            density_mapper.high = density_source.data['counts'].max()
+        p.title.text = get_title(n)
+
+    @traced('callback.players_performance.update')
     def update(atrrname, old, new):
-        layout.children[1] = plot_stats()
-
-    # Create merged dataFrame of players stats and info
-    joined_player_df = pd.merge(player_stats_df, player_info_df, on='pid',
-                                how='inner')
-    # joined_player_df.drop(columns=['index_x'], inplace=True)
-    # Add columns: result (w/l/d), opponent
-    joined_player_df['Opponent'] = joined_player_df.apply(get_opponent,
-                                                          args=(results_df,),
-                                                          axis=1)
-    joined_player_df['result'] = joined_player_df.apply(get_gw_match_result,
-                                                        args=(results_df,),
-                                                        axis=1)
+        """Update plotted data after filter/size/color changes."""
+        refresh()
+        hover.tooltips = get_tooltips()
+
+    @traced('callback.players_performance.axes')
+    @without_property_validation
+    def update_axes(atrrname, old, new):
+        """Update plotted stats after x/y changes.
+
+        The viewport is reset. If all rows are plotted as points, only
+        the x and y columns of the data are replaced.
+        """
+        rows, _ = get_view_rows(*get_filter())
+        if view['bounds'] is None and len(rows) <= MAX_POINTS:
+            source.data['x'] = get_column(x.value)[rows]
+            source.data['y'] = get_column(y.value)[rows]
+            p.title.text = get_title(len(rows))
+        else:
+            view['bounds'] = None
+            refresh()
+        hover.tooltips = get_tooltips()
+        p.xaxis.axis_label = x.value
+        p.yaxis.axis_label = y.value
+
+    @traced('callback.players_performance.view')
+    def update_view(event):
+        """Update plotted data after pan/zoom/reset of the plot."""
+        bounds = (event.x0, event.x1, event.y0, event.y1)
+        view['bounds'] = None if None in bounds else bounds
+        refresh()
+
+    if joined_player_df is None:
+        joined_player_df = join_players_data(player_stats_df, player_info_df,
+                                             results_df)
+
+    # Query index: rows positions by team and by position, and rounds
+    # of rows.
+    rows_index = {col: joined_player_df.groupby(col, observed=True).indices
+                  for col in ['team', 'position']}
+    columns_values = dict()
+    if rounds is None:
+        rounds = get_rounds(joined_player_df)
+    rounds_codes = get_round_codes(joined_player_df, rounds)
 
     # Data filtering widgets by Team and Position
     teams = ['All'] + sorted(list(player_info_df['team'].unique()))
@@ -130,9 +339,9 @@ def players_performance_tab(player_info_df, player_stats_df, results_df):
     columns = [x for x in sorted(player_stats_df.columns)
                if x not in ['index', 'pid', 'gameweek', 'season']]
     x = Select(title='X Axis', value='minutes', options=columns)
-    x.on_change('value', update)
+    x.on_change('value', update_axes)
     y = Select(title='Y Axis', value='passes', options=columns)
-    y.on_change('value', update)
+    y.on_change('value', update_axes)
     size = Select(title='Add Size Dimension', value='None',
                   options=['None'] + columns)
     size.on_change('value', update)
@@ -142,7 +351,20 @@ def players_performance_tab(player_info_df, player_stats_df, results_df):
 
     widgets = widgetbox([select_team, select_position, x, y, size, color])
 
-    layout = row(widgets, plot_stats())
+    # Plotted data - points of the viewport if not too many, else their
+    # density tiles.
+    view = {'bounds': None}
+    points_data, density_data, n_rows = get_source_data()
+    source = ColumnDataSource(data=points_data)
+    density_source = ColumnDataSource(data=density_data)
+    density_mapper = LinearColorMapper(
+        palette=Viridis256, low=1,
+        high=max(density_data['counts'], default=1))
+    p, hover = plot_stats(source, density_source)
+    p.on_event(RangesUpdate, update_view)
+    if rounds_slider is not None:
+        rounds_slider.on_change('value_throttled', update)
+    layout = row(widgets, p)
     tab = Panel(child=layout, title='Players Performances')
 
     return tab
@@ -0,0 +1,137 @@
+#! python 3
+# players_similarity.py - create tab for bokeh app
+# with the players most similar to a selected player.
+
+from bokeh.core.properties import without_property_validation
+from bokeh.models import ColumnDataSource, Panel
+from bokeh.models.widgets import Select, CheckboxButtonGroup, Div, \
+    AutocompleteInput, DataTable, TableColumn, NumberFormatter
+from bokeh.layouts import column, row, widgetbox
+
+from data_scraping.scripts.data_funcs import round_key
+from data_scraping.scripts.similarity import create_similarity_index, \
+    find_similar
+from data_scraping.scripts.profiling import traced
+
+# (field, title, width) of the table columns. Stats are per 90 minutes.
+info_table_cols = [('name', 'Player', 150), ('season', 'Season', 60),
+                   ('team', 'Team', 140), ('position', 'Position', 80),
+                   ('minutes', 'Minutes', 60)]
+stats_table_cols = [('goals', 'Goals', 60), ('assists', 'Assists', 60),
+                    ('key_pass', 'Key Passes', 70), ('passes', 'Passes', 60),
+                    ('successful_dribbles', 'Dribbles', 60),
+                    ('successful_tackles', 'Tackles', 60),
+                    ('ball_recoveries', 'Recoveries', 70)]
+
+
+@traced('tab.players_similarity')
+def players_similarity_tab(joined_player_df, index=None):
+    """Tab with the players seasons most similar to a player season,
+    by stats per 90 minutes.
+
+    :param joined_player_df: pd.DataFrame. Players stats joined with
+    players info, see data_funcs.join_players_data().
+    :param index: dict. Similarity index of joined_player_df, see
+    similarity.create_similarity_index(). Created if not given.
+    """
+
+    def get_pid():
+        """Returns id of the selected player - the one who played most,
+        if several players have the selected name."""
+        return pids_by_name.get(select_player.value)
+
+    def get_table_data():
+        """Returns data dict of the similar players table."""
+        pid = get_pid()
+        positions = [select_position.labels[i]
+                     for i in select_position.active]
+        teams = None if select_team.value == 'All' else [select_team.value]
+        similar = find_similar(index, pid, select_season.value,
+                               k=int(select_k.value), positions=positions,
+                               teams=teams)
+        return {field: similar[field].to_numpy() for field in
+                [field for field, _, _ in table_cols] + ['similarity']}
+
+    @traced('callback.players_similarity.update')
+    @without_property_validation
+    def update(attrname, old, new):
+        source.data = get_table_data()
+
+    @traced('callback.players_similarity.player')
+    @without_property_validation
+    def update_player(attrname, old, new):
+        """Select the last season of a newly selected player."""
+        pid = get_pid()
+        if pid is None:
+            return
+        seasons = seasons_by_pid[pid]
+        select_season.options = seasons
+        if select_season.value != seasons[-1]:
+            select_season.value = seasons[-1]   # triggers update
+        else:
+            update(attrname, old, new)
+
+    if index is None:
+        index = create_similarity_index(joined_player_df)
+    players = index['players']
+    if players.empty:
+        return Panel(child=Div(text='Not enough data.'),
+                     title='Players Similarity')
+    stat_cols = [col for col in stats_table_cols
+                 if col[0] in index['columns']]
+    table_cols = info_table_cols + stat_cols
+    seasons_by_pid = {pid: sorted(seasons,
+                                  key=lambda season: round_key(season, 0))
+                      for pid, seasons in
+                      players.groupby('pid')['season'].agg(list).items()}
+    totals = players.groupby('pid').agg(
+        name=('name', 'first'), minutes=('minutes', 'sum')).sort_values(
+        'minutes')
+    pids_by_name = dict(zip(totals['name'], totals.index))
+
+    # Default: the player season with most minutes in the last season
+    last_season = max(players['season'].unique(),
+                      key=lambda season: round_key(season, 0))
+    last = players[players['season'] == last_season]
+    default = last.loc[last['minutes'].idxmax()]
+
+    select_player = AutocompleteInput(title='Player',
+                                      completions=sorted(pids_by_name),
+                                      value=default['name'],
+                                      case_sensitive=False)
+    select_player.on_change('value', update_player)
+    select_season = Select(title='Season', value=default['season'],
+                           options=seasons_by_pid[default['pid']])
+    select_season.on_change('value', update)
+
+    teams = ['All'] + sorted(players['team'].unique())
+    select_team = Select(title='Filter by Team', value='All', options=teams)
+    select_team.on_change('value', update)
+    positions = ['GK', 'Defender', 'Midfielder', 'Forward']
+    select_position = CheckboxButtonGroup(labels=positions,
+                                          active=[0, 1, 2, 3])
+    select_position.on_change('active', update)
+    select_k = Select(title='Number of Players', value='10',
+                      options=['5', '10', '20', '50'])
+    select_k.on_change('value', update)
+
+    source = ColumnDataSource(data=get_table_data())
+    columns = [TableColumn(field='similarity', title='Similarity', width=70,
+                           formatter=NumberFormatter(format='0.000'))]
+    columns += [TableColumn(field=field, title=title, width=width)
+                for field, title, width in info_table_cols]
+    columns += [TableColumn(field=field, title=title, width=width,
+                            formatter=NumberFormatter(format='0.00'))
+                for field, title, width in stat_cols]
+    table = DataTable(source=source, columns=columns, index_position=None,
+                      width=sum(col.width for col in columns),
+                      height=600)
+    note = Div(text='Similarity of stats per 90 minutes (cosine), of '
+                    'players seasons with enough minutes.')
+
+    widgets = widgetbox([select_player, select_season, select_team,
+                         select_position, select_k])
+    layout = row(widgets, column(note, table))
+    tab = Panel(child=layout, title='Players Similarity')
+
+    return tab
@@ -0,0 +1,110 @@
+#! python 3
+# replay_session.py - replay widget changes on the app without a
+# browser, and print a profile of data loading, tabs building and
+# callbacks. Run from the app's directory:
+# python -m scripts.replay_session [steps.json]
+#
+# A steps file is a JSON list of widget changes, for example:
+# [{"widget": "Tabs", "attr": "active", "value": 2},
+#  {"widget": "Filter by Team", "attr": "value", "value": "Maccabi Haifa"}]
+# Widgets are found by title, or by type name for widgets without one.
+
+import argparse
+import json
+import os
+import runpy
+import time
+
+from data_scraping.scripts import profiling
+
+app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+default_steps = [
+    {'widget': 'Select a Stat for Comparison:', 'attr': 'value',
+     'value': 'passes'},
+    {'widget': 'RadioButtonGroup', 'attr': 'active', 'value': 1},
+    {'widget': 'RangeSlider', 'attr': 'value', 'value': [3, 9]},
+    {'widget': 'Tabs', 'attr': 'active', 'value': 1},
+    {'widget': 'Select a Team', 'attr': 'value', 'value': 'Maccabi Haifa'},
+    {'widget': 'Tabs', 'attr': 'active', 'value': 2},
+    {'widget': 'Filter by Team', 'attr': 'value', 'value': 'Maccabi Haifa'},
+    {'widget': 'CheckboxButtonGroup', 'attr': 'active', 'value': [1, 2]},
+    {'widget': 'X Axis', 'attr': 'value', 'value': 'goals'},
+    {'widget': 'Add Size Dimension', 'attr': 'value', 'value': 'goals'},
+    {'widget': 'Add Color Segmentation', 'attr': 'value', 'value': 'result'},
+    {'widget': 'RangeSlider', 'attr': 'value', 'value': [1, 17]},
+    {'widget': 'Tabs', 'attr': 'active', 'value': 3},
+    {'widget': 'Slider', 'attr': 'value', 'value': 5},
+    {'widget': 'Tabs', 'attr': 'active', 'value': 4},
+    {'widget': 'Player', 'attr': 'value', 'value': 'Dan Mori'},
+    {'widget': 'Number of Players', 'attr': 'value', 'value': '20'}]
+
+
+def find_widget(doc, name):
+    """Returns a widget of the document by title or by type name.
+
+    Tables columns are not widgets, though they have titles.
+    """
+    from bokeh.models.widgets import TableColumn
+
+    for model in doc.select({}):
+        if isinstance(model, TableColumn):
+            continue
+        if getattr(model, 'title', None) == name:
+            return model
+        if type(model).__name__ == name:
+            return model
+    raise KeyError(f'no widget {name!r} in document')
+
+
+def replay(steps):
+    """Opens an app session and applies widget changes to it.
+
+    As in a browser, a slider's 'value_throttled' follows its 'value'.
+
+    :param steps: list of dicts with 'widget', 'attr' and 'value' keys.
+    :return: Document of the session.
+    """
+    from bokeh.document import Document
+    from bokeh.io.doc import set_curdoc
+
+    doc = Document()
+    set_curdoc(doc)
+    with profiling.span('session.open'):
+        runpy.run_path(os.path.join(app_dir, 'main.py'))
+
+    for step in steps:
+        widget = find_widget(doc, step['widget'])
+        value = step['value']
+        if isinstance(value, list) and step['attr'] == 'value':
+            value = tuple(value)
+        start = time.perf_counter()
+        old = getattr(widget, step['attr'])
+        setattr(widget, step['attr'], value)
+        if step['attr'] == 'value' and 'value_throttled' in \
+                widget.properties():
+            widget.trigger('value_throttled', old, value)
+        print(f"{step['widget']}.{step['attr']} = {value!r}: "
+              f'{(time.perf_counter() - start) * 1e3:.1f}ms')
+
+    return doc
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Replay widget changes and print a profile.')
+    parser.add_argument('steps', nargs='?',
+                        help='JSON file of steps, default: a tour of all '
+                             'tabs')
+    args = parser.parse_args()
+
+    steps = default_steps
+    if args.steps:
+        with open(args.steps) as f:
+            steps = json.load(f)
+
+    profiling.enabled = True
+    profiling.profile_dir = None    # report only, no session log
+    replay(steps)
+    print()
+    print(profiling.report())
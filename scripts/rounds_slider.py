@@ -0,0 +1,58 @@
+#! python 3
+# rounds_slider.py - seasons/gameweeks range slider, shared by the
+# app's tabs.
+
+from bokeh.models.widgets import RangeSlider
+
+from data_scraping.scripts.profiling import traced
+
+
+def get_rounds_label(rounds, window):
+    """Returns slider title of a window of rounds.
+
+    :param rounds: list of (season, gameweek) tuples.
+    :param window: tuple (first, last). Positions in rounds.
+    """
+    (first_season, first_gw), (last_season, last_gw) = \
+        rounds[window[0]], rounds[window[1]]
+    return (f'Rounds: {first_season} GW {first_gw} - '
+            f'{last_season} GW {last_gw}')
+
+
+def get_window(rounds_slider, rounds):
+    """Returns selected window of rounds as (first, last) positions.
+
+    :param rounds_slider: RangeSlider, as returned by
+    create_rounds_slider(), or None for all rounds.
+    :param rounds: list of (season, gameweek) tuples.
+    """
+    if rounds_slider is None:
+        return 0, len(rounds) - 1
+    first, last = rounds_slider.value
+    return (min(int(round(first)), len(rounds)) - 1,
+            min(int(round(last)), len(rounds)) - 1)
+
+
+def create_rounds_slider(rounds):
+    """Returns a range slider of rounds.
+
+    Values are 1-based positions in rounds. Tabs should update on
+    'value_throttled' changes - sent when a drag ends - rather than
+    on every intermediate 'value'.
+
+    :param rounds: list of (season, gameweek) tuples, see
+    data_funcs.get_rounds().
+    """
+
+    @traced('callback.rounds_slider.title')
+    def update_title(attrname, old, new):
+        rounds_slider.title = get_rounds_label(
+            rounds, get_window(rounds_slider, rounds))
+
+    rounds_slider = RangeSlider(start=1, end=max(len(rounds), 2), step=1,
+                                value=(1, len(rounds)), width=700,
+                                title=get_rounds_label(
+                                    rounds, (0, len(rounds) - 1)))
+    rounds_slider.on_change('value', update_title)
+
+    return rounds_slider
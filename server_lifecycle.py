@@ -0,0 +1,16 @@
+#! python3
+# server_lifecycle.py - hooks of the bokeh server running the app.
+
+from data_scraping.scripts import data_layer, profiling
+
+
+def on_server_loaded(server_context):
+    """Load app data once, before the first session is opened.
+
+    With profiling enabled, spans totals are served at
+    http://localhost:<IPL_METRICS_PORT>/metrics (a port per worker
+    process, see profiling.start_metrics_server()).
+    """
+    if profiling.enabled:
+        profiling.start_metrics_server()
+    data_layer.get_data()
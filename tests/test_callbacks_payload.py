@@ -0,0 +1,131 @@
+#! python 3
+# test_callbacks_payload.py - tests of the document patches sent to the
+# browser by the tabs' callbacks, on synthetic data.
+# Run from the repository root: python -m unittest discover tests
+
+import tempfile
+import unittest
+
+from bokeh.core.json_encoder import serialize_json
+from bokeh.document import Document
+from bokeh.document.events import ModelChangedEvent, ColumnDataChangedEvent
+from bokeh.layouts import column
+from bokeh.models import ColumnDataSource, Range, Title, Axis, HoverTool
+from bokeh.models.widgets import Tabs, Select, RadioButtonGroup, \
+    CheckboxButtonGroup, Slider, RangeSlider
+from bokeh.protocol import Protocol
+
+from data_scraping.scripts import benchmark_suite
+from data_scraping.scripts.data_funcs import get_rounds
+from scripts.rounds_slider import create_rounds_slider
+from scripts.basic_team_stats import basic_teams_stats_tab
+from scripts.attacks_origin import attacks_origin_tab
+from scripts.players_performances import players_performance_tab
+from scripts.league_table import league_table_tab
+
+max_patch_bytes = 50 * 1024     # per callback, at the 'small' scale
+# properties a callback may change: data, ranges, and labels
+allowed_changes = [(ColumnDataSource, 'data'), (Range, 'start'),
+                   (Range, 'end'), (Range, 'factors'), (Title, 'text'),
+                   (Axis, 'axis_label'), (HoverTool, 'tooltips'),
+                   (Slider, 'title'), (RangeSlider, 'title')]
+
+
+class CallbacksPayloadTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.work_dir = tempfile.TemporaryDirectory()
+        cls.data = data = benchmark_suite.prepare('small',
+                                                  cls.work_dir.name)['data']
+        team_stats_df = data['team_stats']
+        rounds = get_rounds(team_stats_df)
+        rounds_slider = create_rounds_slider(rounds)
+        cls.doc = Document()
+        cls.doc.add_root(column(rounds_slider, Tabs(tabs=[
+            basic_teams_stats_tab(team_stats_df, rounds, rounds_slider),
+            attacks_origin_tab(team_stats_df, rounds, rounds_slider),
+            players_performance_tab(data['players_info'],
+                                    data['players_stats'], data['results'],
+                                    data['joined_players'], rounds,
+                                    rounds_slider),
+            league_table_tab(data['standings'])])))
+        cls.events = []
+        cls.doc.on_change(cls.events.append)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.work_dir.cleanup()
+
+    def get_widget(self, model_type, title=None):
+        return next(model for model in self.doc.select({'type': model_type})
+                    if title is None or model.title == title)
+
+    def get_patch(self, widget, attr, value):
+        """Changes a widget as a browser would, returns the events and
+        the serialized PATCH-DOC message sent back to it."""
+        self.events.clear()
+        old = getattr(widget, attr)
+        setattr(widget, attr, value)
+        if isinstance(widget, RangeSlider):
+            widget.trigger('value_throttled', old, value)
+        # the widget change itself comes from the browser
+        events = [event for event in self.events
+                  if not (getattr(event, 'model', None) is widget and
+                          getattr(event, 'attr', None) in
+                          [attr, 'value_throttled'])]
+        msg = Protocol().create('PATCH-DOC', events)
+        return events, msg
+
+    def assert_patch(self, widget, attr, value):
+        events, msg = self.get_patch(widget, attr, value)
+        name = getattr(widget, 'title', None) or type(widget).__name__
+        with self.subTest(widget=name):
+            self.assertTrue(events)
+            self.assertEqual(msg.content['references'], [])
+            for event in events:
+                self.assertIsInstance(event, (ModelChangedEvent,
+                                              ColumnDataChangedEvent))
+                self.assertTrue(
+                    any(isinstance(event.model, model_type) and
+                        event.attr == allowed_attr
+                        for model_type, allowed_attr in allowed_changes),
+                    f'{type(event.model).__name__}.{event.attr} changed')
+            self.assertLess(len(serialize_json(msg.content)),
+                            max_patch_bytes)
+
+    def test_callbacks_patches(self):
+        teams = self.get_widget(Select, 'Select a Team').options
+        changes = [
+            (self.get_widget(Select, 'Select a Stat for Comparison:'),
+             'value', 'passes'),
+            (self.get_widget(RadioButtonGroup), 'active', 1),
+            (self.get_widget(Select, 'Select a Team'), 'value', teams[1]),
+            (self.get_widget(Select, 'Filter by Team'), 'value', teams[2]),
+            (self.get_widget(CheckboxButtonGroup), 'active', [1, 2]),
+            (self.get_widget(Select, 'X Axis'), 'value', 'goals'),
+            (self.get_widget(Select, 'Add Size Dimension'), 'value', 'goals'),
+            (self.get_widget(Select, 'Add Color Segmentation'), 'value',
+             'result'),
+            (self.get_widget(RangeSlider), 'value', (3, 9)),
+            (self.get_widget(Slider), 'value', 5)]
+        for widget, attr, value in changes:
+            self.assert_patch(widget, attr, value)
+
+    def test_league_table_of_one_round(self):
+        standings_df = self.data['standings']
+        first = standings_df.iloc[0][['season', 'gameweek']]
+        tab = league_table_tab(standings_df[
+            (standings_df['season'] == first['season']) &
+            (standings_df['gameweek'] == first['gameweek'])])
+        slider = next(iter(tab.select({'type': Slider})))
+        source = next(iter(tab.select({'type': ColumnDataSource})))
+        data = source.data
+        slider.value = slider.end
+        self.assertIs(source.data, data)
+        self.assertIn(f"{first['season']} GW {first['gameweek']}",
+                      slider.title)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+#! python 3
+# test_create_db.py - tests of streaming stats into the database.
+# Run from the repository root: python -m unittest discover tests
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from data_scraping.scripts import create_db, db_writer, synthetic_data
+
+
+class StreamStatsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dataset = synthetic_data.create_dataset(n_teams=6, n_players=16)
+        cls.stats = {'player': cls.dataset['player_stats'],
+                     'team': cls.dataset['team_stats']}
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        db_path = os.path.join(tmp_dir.name, 'ipl_data.db')
+        synthetic_data.write_db(self.dataset, db_path)
+        self.conn = db_writer.connect_writer(db_path)
+        self.addCleanup(self.conn.close)
+        self.rounds = create_db.get_new_rounds(self.conn)
+
+        # stored stats up to the first round only
+        with self.conn:
+            for table_name in create_db.stats_tables.values():
+                self.conn.execute(f"""DELETE FROM {table_name}
+                                      WHERE gameweek > 1""")
+            self.conn.execute("""DELETE FROM ingest_watermarks""")
+        create_db.set_watermark(self.conn, 'stats', *self.rounds[0])
+        self.collected = []
+
+    def collect_stats(self, fail=(), stop=None):
+        """Returns a fake create_db.collect_stats(), collecting synthetic
+        stats. Rounds in fail fail, the stop-th gameweek raises
+        KeyboardInterrupt."""
+        count = [0]
+
+        def collect_stats(item_type, rounds, pool_size=1):
+            for data_tup in self.stats[item_type]:
+                round_ = (data_tup[1], int(data_tup[2]))
+                if round_ not in rounds:
+                    continue
+                if count[0] == stop:
+                    raise KeyboardInterrupt
+                count[0] += 1
+                self.collected.append((item_type, round_))
+                yield (None, *round_) if round_ in fail else data_tup
+
+        return collect_stats
+
+    def run_incremental(self, **kwargs):
+        with mock.patch.object(create_db, 'collect_stats',
+                               self.collect_stats(**kwargs)):
+            pending = create_db.create_stats_tables(self.conn,
+                                                    incremental=True)
+        create_db.create_cumulative_tables(self.conn, True, pending)
+        return pending
+
+    def read_cumulative_tables(self):
+        """Returns the running sums tables, without rows of zeros - a
+        rebuild adds them for gameweeks before an id's first match, and
+        get_window_stats() reads missing rows as zeros."""
+        tables = dict()
+        for item_type, table_name in create_db.cumulative_tables.items():
+            id_col = create_db.stats_id_cols[item_type]
+            df = pd.read_sql_query(f"""SELECT * FROM {table_name} 
+                                       ORDER BY {id_col}, season, result, 
+                                       gameweek""", self.conn)
+            values = df.drop(columns=[id_col, 'season', 'result',
+                                      'gameweek'])
+            tables[item_type] = df[(values != 0).any(axis=1)].reset_index(
+                drop=True)
+        return tables
+
+    def get_stored_rounds(self, item_type):
+        return set(self.conn.execute(
+            f"""SELECT DISTINCT season, gameweek
+                FROM {create_db.stats_tables[item_type]}""").fetchall())
+
+    def test_failed_round_is_collected_again(self):
+        failed = self.rounds[2]
+        self.run_incremental(fail=[failed])
+        self.assertNotIn(failed, self.get_stored_rounds('player'))
+        self.assertIn(self.rounds[3], self.get_stored_rounds('player'))
+        self.assertEqual(create_db.get_watermark(self.conn, 'stats'),
+                         self.rounds[0])
+        self.assertEqual(create_db.get_checkpoint(self.conn, 'player'),
+                         self.rounds[1])
+
+        self.collected.clear()
+        self.run_incremental()
+        self.assertEqual(self.collected,
+                         [(item_type, round_) for item_type in
+                          ['player', 'team'] for round_ in self.rounds[2:]])
+        for item_type in ['player', 'team']:
+            self.assertEqual(self.get_stored_rounds(item_type),
+                             set(self.rounds))
+            self.assertIsNone(create_db.get_checkpoint(self.conn, item_type))
+        self.assertEqual(create_db.get_watermark(self.conn, 'stats'),
+                         self.rounds[-1])
+
+    def test_cumulative_tables_after_failed_round(self):
+        create_db.create_cumulative_tables(self.conn)
+        failed = self.rounds[2]
+        self.assertEqual(self.run_incremental(fail=[failed]), failed)
+        self.assertEqual(create_db.get_watermark(self.conn, 'cumulative'),
+                         self.rounds[1])
+        self.assertIsNone(self.run_incremental())
+        incremental = self.read_cumulative_tables()
+
+        create_db.create_cumulative_tables(self.conn)
+        for item_type, df in self.read_cumulative_tables().items():
+            pd.testing.assert_frame_equal(incremental[item_type], df)
+
+    def test_interrupted_run_resumes(self):
+        # players stats complete, teams stats interrupted
+        stop = len(self.rounds) + 3
+        with self.assertRaises(KeyboardInterrupt):
+            self.run_incremental(stop=stop)
+        checkpoint = create_db.get_checkpoint(self.conn, 'team')
+        self.assertEqual(checkpoint, self.collected[-1][1])
+
+        self.collected.clear()
+        self.run_incremental()
+        self.assertEqual(self.collected,
+                         [('team', round_) for round_ in self.rounds
+                          if round_ > checkpoint])
+        self.assertEqual(self.get_stored_rounds('team'), set(self.rounds))
+        self.assertEqual(create_db.get_watermark(self.conn, 'stats'),
+                         self.rounds[-1])
+
+
+class PlayersToFetchTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        db_path = os.path.join(tmp_dir.name, 'ipl_data.db')
+        synthetic_data.write_db(synthetic_data.create_dataset(
+            n_teams=6, n_players=16), db_path)
+        self.conn = db_writer.connect_writer(db_path)
+        self.addCleanup(self.conn.close)
+
+    def set_team(self, pid, team, days_ago=0):
+        with self.conn:
+            self.conn.execute("""UPDATE players_info 
+                                 SET team = ?, 
+                                 fetched_at = datetime('now', ?) 
+                                 WHERE pid = ?""",
+                              (team, f'-{days_ago} days', pid))
+
+    def test_excluded_players_are_not_fetched(self):
+        pid, other_pid = [tup[0] for tup in self.conn.execute(
+            """SELECT pid FROM players_info LIMIT 2""").fetchall()]
+        self.assertEqual(create_db.get_players_to_fetch(self.conn, 30),
+                         ([], []))
+        self.set_team(pid, 'Not In League')
+        self.set_team(other_pid, 'Not In League', days_ago=40)
+        create_db.clean_data(self.conn)
+        self.assertEqual(create_db.get_players_to_fetch(self.conn, 30),
+                         ([], [other_pid]))
+
+        # fetched again, back in the league
+        create_db.insert_players_info(self.conn, [{
+            'pid': other_pid, 'Name': 'Name', 'Shirt number': 1,
+            'Team': self.conn.execute(
+                """SELECT team FROM teams_stats_by_gw""").fetchone()[0],
+            'Position': 'Defender', 'Date of birth': '01/01/2000'}])
+        create_db.clean_data(self.conn)
+        self.assertEqual(create_db.get_players_to_fetch(self.conn, 30),
+                         ([], []))
+        self.assertEqual(self.conn.execute(
+            """SELECT pid FROM players_info_excluded""").fetchall(),
+                         [(pid,)])
+
+
+if __name__ == '__main__':
+    unittest.main()
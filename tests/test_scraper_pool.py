@@ -0,0 +1,170 @@
+#! python 3
+# test_scraper_pool.py - tests of stats collection on a pool of drivers,
+# with fake drivers serving saved stats pages.
+# Run from the repository root: python -m unittest discover tests
+
+import re
+import threading
+import time
+import unittest
+from unittest import mock
+
+from selenium.common import exceptions
+from selenium.webdriver.common.keys import Keys
+
+from data_scraping.scripts import stats, scraper_pool, html_cache
+from data_scraping.scripts.benchmarks import create_synthetic_stats_page
+
+menus = {1: 'item_type', 2: 'position', 4: 'gameweek', 7: 'season'}
+
+
+class FakeElement:
+    """Web element of the stats page filters."""
+
+    def __init__(self, driver, xpath):
+        self.driver = driver
+        self.xpath = xpath
+
+    def click(self):
+        menu = re.search(r'/ul/li\[(\d)\]', self.xpath)
+        if 'selectPosition' in self.xpath:
+            self.driver.selection['position'] = 'all'
+        elif menu:
+            self.driver.menu = menus[int(menu.group(1))]
+
+    def send_keys(self, keys):
+        if keys != Keys.ENTER:
+            self.driver.selection[self.driver.menu] = str(keys)
+
+
+class FakeStatsDriver:
+    """Webdriver stand-in serving saved pages of the selected filters.
+
+    Pages of rounds in failures fail as many times as set there.
+    """
+
+    def __init__(self, pages, failures, latency=0.0):
+        """
+        :param pages: dict of {(item_type, season, gameweek, position):
+        page source}.
+        :param failures: dict of {(season, gameweek): number of failures},
+        shared by all drivers.
+        :param latency: float. Maximal page load time, in seconds.
+        """
+        self.pages = pages
+        self.failures = failures
+        self.latency = latency
+        self.selection = dict()
+        self.menu = None
+        self.closed = False
+
+    def get(self, url):
+        self.selection.clear()
+
+    def find_element_by_xpath(self, xpath):
+        return FakeElement(self, xpath)
+
+    def find_element(self, by, value):
+        # no 'show more' buttons - the saved pages are unfolded
+        raise exceptions.TimeoutException()
+
+    @property
+    def page_source(self):
+        season, gw = self.selection['season'], self.selection['gameweek']
+        time.sleep(self.latency * (hash((season, gw)) % 10) / 10)
+        if self.failures.get((season, int(gw)), 0) > 0:
+            self.failures[(season, int(gw))] -= 1
+            raise exceptions.WebDriverException('page failed to load')
+        return self.pages[(self.selection['item_type'], season, gw,
+                           self.selection.get('position', 'all'))]
+
+    def close(self):
+        self.closed = True
+
+
+class StatsPoolTest(unittest.TestCase):
+
+    rounds = [('18/19', 1), ('18/19', 2), ('18/19', 3), ('19/20', 1),
+              ('19/20', 2), ('19/20', 3), ('19/20', 4), ('19/20', 5)]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pages = dict()
+        cls.expected = {'player': [], 'team': []}
+        for i, (season, gw) in enumerate(cls.rounds):
+            for item_type, positions in [('player', ['all', 'goalie']),
+                                         ('team', ['all'])]:
+                pages = [create_synthetic_stats_page(
+                    n_stats=4, n_items=6, item_type=item_type,
+                    seed=i * 2 + j) for j, _ in enumerate(positions)]
+                for position, page in zip(positions, pages):
+                    cls.pages[(item_type, season, str(gw), position)] = page
+                cls.expected[item_type].append(
+                    (stats.parse_gameweek_pages(pages, item_type), season,
+                     gw))
+
+    def setUp(self):
+        patcher = mock.patch.multiple(html_cache, record=False, replay=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.failures = dict()
+        self.drivers = []
+        self.lock = threading.Lock()
+
+    def create_driver(self):
+        driver = FakeStatsDriver(self.pages, self.failures, latency=0.02)
+        with self.lock:
+            self.drivers.append(driver)
+        return driver
+
+    def collect(self, item_type='player', pool_size=3, retries=2):
+        return list(scraper_pool.iter_stats_per_game_parallel(
+            item_type, self.rounds, pool_size,
+            driver_factory=self.create_driver, retries=retries))
+
+    def test_rounds_order(self):
+        for item_type in ['player', 'team']:
+            self.assertEqual(self.collect(item_type), self.expected[item_type])
+        self.assertTrue(all(driver.closed for driver in self.drivers))
+
+    def test_single_driver(self):
+        driver = self.create_driver()
+        self.assertEqual(list(stats.iter_stats_per_game(driver, 'team',
+                                                        self.rounds)),
+                         self.expected['team'])
+
+    def test_failed_job_is_retried(self):
+        self.failures[('19/20', 2)] = 2
+        with mock.patch('builtins.print'):
+            data = self.collect(retries=2)
+        self.assertEqual(data, self.expected['player'])
+        # a failed job's driver is replaced by a new one
+        self.assertGreaterEqual(len(self.drivers), 2)
+        self.assertTrue(all(driver.closed for driver in self.drivers))
+
+    def test_permanently_failed_job(self):
+        failed = ('19/20', 2)
+        self.failures[failed] = 100
+        with mock.patch('builtins.print') as print_:
+            data = self.collect(retries=2)
+        index = self.rounds.index(failed)
+        self.assertEqual(data[index], (None, *failed))
+        self.assertEqual(data[:index] + data[index + 1:],
+                         self.expected['player'][:index] +
+                         self.expected['player'][index + 1:])
+        self.assertEqual(self.failures[failed], 100 - 3)    # 1 + retries
+        self.assertEqual(print_.call_count, 3)
+        self.assertTrue(all(driver.closed for driver in self.drivers))
+
+        # list version leaves the failed round out
+        self.failures[failed] = 100
+        with mock.patch('builtins.print'):
+            data = scraper_pool.stats_per_game_parallel(
+                'player', self.rounds, 3, driver_factory=self.create_driver)
+        self.assertEqual([data_tup[1:] for data_tup in data],
+                         [round_ for round_ in self.rounds
+                          if round_ != failed])
+
+
+if __name__ == '__main__':
+    unittest.main()